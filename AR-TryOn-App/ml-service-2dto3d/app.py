@@ -10,7 +10,7 @@ import json
 import base64
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -20,17 +20,31 @@ import shutil
 import urllib.request
 import json
 import base64
+import time
+import asyncio
+import threading
+import uuid
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, WebSocket, Header, Query, Body
+from fastapi.responses import FileResponse
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 # ---------------------------------------------------------------------------
 # Logging configuration
 # ---------------------------------------------------------------------------
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("AR-TryOn-ML")
+# For the startup log and /healthz uptime
+STARTED_AT = time.time()
+
+# ---------------------------------------------------------------------------
+# Thread budget (before numpy / torch / onnxruntime are imported)
+# ---------------------------------------------------------------------------
+from pipeline import thread_budget
+thread_budget.configure()
 
 # ---------------------------------------------------------------------------
 # Path setup
@@ -38,6 +52,13 @@ logger = logging.getLogger("AR-TryOn-ML")
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "mern-backend", "ml-output"))
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Pre-rendered impostor sprite atlases used for server-side compositing
+ATLAS_DIR = os.path.join(OUTPUT_DIR, "atlases")
+# Per-request profiles; kept outside OUTPUT_DIR so they are not publicly served
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+# Uploaded inputs (and their cleaned copies) while a job runs; private for the same reason
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(BASE_DIR, "uploads"))
+os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # Serve the generated GLB files statically
 app = FastAPI()
@@ -52,28 +73,98 @@ app.mount("/output", StaticFiles(directory=OUTPUT_DIR), name="output")
 # ---------------------------------------------------------------------------
 # External callback configuration (Node.js backend)
 # ---------------------------------------------------------------------------
-NODE_CALLBACK_URL = "http://127.0.0.1:5000/api/ml/callback"
-OUTPUT_BASE_URL = "http://localhost:5000/ml-output"
+# Overridable so load tests can point callbacks at a local stub receiver
+NODE_CALLBACK_URL = os.getenv("NODE_CALLBACK_URL", "http://127.0.0.1:5000/api/ml/callback")
+OUTPUT_BASE_URL = os.getenv("OUTPUT_BASE_URL", "http://localhost:5000/ml-output")
 
 # ---------------------------------------------------------------------------
 # Import ML pipeline components
 # ---------------------------------------------------------------------------
-from pipeline.image_cleaner import clean_image
-from pipeline.mesh_generator import MeshGenerator
+# Heavy libraries (torch, transformers, rembg, trimesh) are imported lazily by
+# these modules; models load in the background warm-up below.
+from pipeline.startup import Warmup, timed, import_breakdown
+with timed("pipeline.image_cleaner"):
+    from pipeline.image_cleaner import clean_image, get_rembg_session
+with timed("pipeline.mesh_generator"):
+    from pipeline import mesh_generator
+    from pipeline.mesh_generator import MeshGenerator
+with timed("pipeline.preview"):
+    from pipeline.preview import generate_preview
+with timed("pipeline.face_detector"):
+    from pipeline.face_detector import FaceDetectorPool, STREAM_POOL_SIZE
+    from pipeline.face_tracker import FaceTracker, TrackerSessions
+with timed("pipeline.try_on"):
+    from pipeline import try_on
+    from pipeline import impostor
+with timed("pipeline.service"):
+    from pipeline import metrics
+    from pipeline import profiler
+    from pipeline import admission
+    from pipeline.presets import PRESETS, DEFAULT_PRESET, get_preset
+    from pipeline.depth_estimator import get_depth_pipe
+    from pipeline import artifacts
+    from pipeline import materials
+    from pipeline import glb
 
-# Initialize MeshGenerator
+# Initialize MeshGenerator (cheap: MobileSAM loads in the warm-up)
 try:
-    generator = MeshGenerator(model_dir=os.path.join(BASE_DIR, "models"))
+    with timed("MeshGenerator()"):
+        generator = MeshGenerator(model_dir=os.path.join(BASE_DIR, "models"))
     logger.info("MeshGenerator successfully instantiated.")
 except Exception as e:
     logger.error(f"Failed to initialise MeshGenerator: {e}")
     generator = None
 
+# Long-lived face detectors for /ar/try-on (warmed at startup)
+face_pool = FaceDetectorPool()
+# Streams get their own detectors (built on demand), so open sockets never starve /ar/try-on
+stream_pool = FaceDetectorPool(size=STREAM_POOL_SIZE)
+# Per-client ROI trackers for /ar/try-on requests that send a session_id
+tracker_sessions = TrackerSessions()
+atlas_cache = impostor.AtlasCache(ATLAS_DIR)
+atlas_builder = impostor.AtlasBuilder(ATLAS_DIR, atlas_cache)
+# Bounded interactive/bulk queues in front of the pipeline workers
+pipeline_queue = admission.AdmissionController()
+
+# ---------------------------------------------------------------------------
+# Startup: background warm-up behind /readyz
+# ---------------------------------------------------------------------------
+# background: the port opens at once and /readyz turns 200 when models are warm
+# blocking:   startup waits for the warm-up (single-box deployments without probes)
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background").lower()
+
+def warm_sam():
+    if generator is None or generator.validator.load_sam() is None:
+        raise RuntimeError("MobileSAM unavailable; geometric validation only")
+
+warmup = Warmup()
+warmup.add("rembg", lambda: get_rembg_session(get_preset(DEFAULT_PRESET)["rembg_model"]))
+warmup.add("depth", get_depth_pipe)
+warmup.add("trimesh", lambda: mesh_generator.trimesh.Trimesh)
+warmup.add("sam", warm_sam, required=False)
+warmup.add("face_detectors", face_pool.warm, required=False)
+
+@app.on_event("startup")
+async def start_warmup():
+    logger.info(f"App module loaded in {time.time() - STARTED_AT:.2f} s; import breakdown: {import_breakdown()}")
+    if WARMUP_MODE == "blocking":
+        await run_in_threadpool(warmup.run)
+    else:
+        warmup.start()
+
+@app.on_event("shutdown")
+def close_face_pool():
+    face_pool.close()
+    stream_pool.close()
+    pipeline_queue.shutdown()
+    atlas_builder.shutdown()
+
 # ---------------------------------------------------------------------------
 # Callback helper
 # ---------------------------------------------------------------------------
 def send_callback(jewelry_id: str, payload: dict) -> None:
     final_payload = {"jewelryId": jewelry_id, **payload}
+    start = time.perf_counter()
     try:
         headers = {"Content-Type": "application/json", "x-ml-api-key": "ml-callback-secret"}
         data_bytes = json.dumps(final_payload).encode("utf-8")
@@ -82,43 +173,78 @@ def send_callback(jewelry_id: str, payload: dict) -> None:
             logger.info(f"Callback to Node.js succeeded with status {resp.status}")
     except Exception as e:
         logger.error(f"Callback to Node.js failed: {e}")
+    finally:
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="callback")
+
+# ---------------------------------------------------------------------------
+# Impostor atlas helper
+# ---------------------------------------------------------------------------
+def schedule_atlas_build(jewelry_id: str, glb_path: str) -> None:
+    """Pre-renders the try-on sprite atlas for a freshly written GLB in the background."""
+    atlas_builder.schedule(jewelry_id, glb_path)
 
 # ---------------------------------------------------------------------------
 # Core 2D-to-3D pipeline
 # ---------------------------------------------------------------------------
-def run_pipeline(jewelry_id: str, input_path: str, category: str, metadata: dict = {}) -> str:
+def run_pipeline(jewelry_id: str, input_path: str, category: str, metadata: dict = {},
+                 preset_name: str | None = None, symmetry: bool | None = None) -> str:
     output_glb_path = os.path.join(OUTPUT_DIR, f"{jewelry_id}.glb")
     public_url = f"{OUTPUT_BASE_URL}/{jewelry_id}.glb"
+    preset = get_preset(preset_name)
+    if symmetry is not None:
+        preset["symmetry"] = symmetry
+    timer = metrics.StageTimer(preset=preset["name"])
 
     try:
         if generator is None:
+            timer.failed_stage = "engine_unavailable"
             raise RuntimeError("ML Engine unavailable")
 
         logger.info(f"[1/3] Pipeline Start: {category} (id={jewelry_id})")
-        cleaned_path = clean_image(input_path)
-        metrics = generator.generate_mesh(cleaned_path, output_glb_path)
+        ingest_info = {}
+        cleaned_path = clean_image(input_path, ingest_info=ingest_info, timer=timer, rembg_model=preset["rembg_model"])
+        job_metrics = generator.generate_mesh(cleaned_path, output_glb_path, category=category, timer=timer,
+                                              preset=preset, artifact_id=jewelry_id)
+        # Depth + alpha were persisted by the pipeline; record what /remesh needs alongside them
+        if job_metrics.get("artifacts_saved"):
+            try:
+                artifacts.write_meta(jewelry_id, category=category, preset=preset["name"],
+                                     grid_resolution=job_metrics["grid_resolution"], geometry=job_metrics["geometry"],
+                                     symmetry=preset["symmetry"], version=metadata.get("version", 1),
+                                     glb=f"{jewelry_id}.glb")
+            except Exception as e:
+                logger.warning(f"Remesh metadata not saved for {jewelry_id}: {e}")
+        job_metrics["ingest_scale"] = ingest_info.get("scale", 1.0)
+        job_metrics["source_size"] = ingest_info.get("source_size")
+        job_metrics["timings_ms"] = timer.timings_ms
 
         success_payload = {
             "status": "completed",
             "glb_url": public_url,
-            "metrics": metrics,
+            "metrics": job_metrics,
             "is_fallback": False
         }
         success_payload.update(metadata)
 
-        logger.info(f"[3/3] ML Pipeline Success: {public_url}")
+        logger.info(f"[3/3] ML Pipeline Success: {public_url} {timer.timings_ms}")
         send_callback(jewelry_id, success_payload)
+        metrics.JOBS_TOTAL.inc(outcome="success", preset=preset["name"])
+        schedule_atlas_build(jewelry_id, output_glb_path)
         return public_url
 
     except Exception as e:
         logger.warning(f"ML Pipeline STRICT FAIL for {jewelry_id}: {e}. Engaging FALLBACK.")
+        metrics.FALLBACKS.inc(reason=timer.failed_stage or "unknown")
         try:
             from pipeline.fallback_generator import FallbackGenerator
-            fallback_metrics = FallbackGenerator.generate(
-                category=category,
-                output_path=output_glb_path,
-                reason=str(e)
-            )
+            with timer.stage("fallback"):
+                fallback_metrics = FallbackGenerator.generate(
+                    category=category,
+                    output_path=output_glb_path,
+                    reason=str(e)
+                )
+            fallback_metrics["timings_ms"] = timer.timings_ms
+            fallback_metrics["preset"] = preset["name"]
             fallback_payload = {
                 "status": "completed",
                 "glb_url": public_url,
@@ -130,49 +256,420 @@ def run_pipeline(jewelry_id: str, input_path: str, category: str, metadata: dict
 
             logger.info(f"[Fallback] Saved template to {public_url}")
             send_callback(jewelry_id, fallback_payload)
+            metrics.JOBS_TOTAL.inc(outcome="fallback", preset=preset["name"])
+            schedule_atlas_build(jewelry_id, output_glb_path)
             return public_url
         except Exception as fatal_e:
             logger.critical(f"FATAL: Fallback failed: {fatal_e}")
             fail_payload = {"status": "failed", "reason": f"ML and Fallback failed: {str(e)}"}
             send_callback(jewelry_id, fail_payload)
+            metrics.JOBS_TOTAL.inc(outcome="failed", preset=preset["name"])
             return None
+    finally:
+        # Depth + alpha are persisted by now; the upload and its cleaned copy are not needed again
+        for path in (input_path, input_path.replace('.png', '_cleaned.png')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+# ---------------------------------------------------------------------------
+# Progressive delivery: instant preview, upgraded by the full pipeline
+# ---------------------------------------------------------------------------
+PREVIEW_VERSION = 1
+FULL_VERSION = 2
+
+def publish_preview(jewelry_id: str, input_path: str, category: str, metadata: dict = {}) -> str:
+    """Builds and publishes the preview GLB (version 1). Returns its public URL."""
+    output_path = os.path.join(OUTPUT_DIR, f"{jewelry_id}_preview.glb")
+    public_url = f"{OUTPUT_BASE_URL}/{jewelry_id}_preview.glb"
+    start = time.perf_counter()
+    try:
+        preview_metrics = generate_preview(input_path, output_path, category)
+    finally:
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="preview")
+
+    payload = {
+        "status": "completed",
+        "glb_url": public_url,
+        "metrics": preview_metrics,
+        "is_fallback": False,
+        "is_preview": True,
+        "version": PREVIEW_VERSION
+    }
+    payload.update(metadata)
+    logger.info(f"[Preview] {jewelry_id}: {preview_metrics['preview_type']} in {preview_metrics['preview_ms']} ms")
+    send_callback(jewelry_id, payload)
+    return public_url
+
+def run_upgrade(preview_published: threading.Event, jewelry_id: str, input_path: str, category: str,
+                metadata: dict = {}, preset_name: str | None = None, symmetry: bool | None = None) -> str:
+    # The full GLB must not be overtaken by its own preview callback
+    preview_published.wait(timeout=30)
+    return run_pipeline(jewelry_id, input_path, category,
+                        {**metadata, "is_preview": False, "version": FULL_VERSION}, preset_name, symmetry)
+
+# ---------------------------------------------------------------------------
+# Parametric re-mesh from stored depth + alpha
+# ---------------------------------------------------------------------------
+def run_remesh(jewelry_id: str, geometry: dict, grid_resolution: int | None = None,
+               symmetry: bool | None = None) -> dict:
+    """Rebuilds the GLB with new geometry parameters and publishes it as the next version."""
+    depth, alpha, meta = artifacts.load(jewelry_id)
+    preset = get_preset(meta.get("preset"))
+    geometry = {**meta.get("geometry", {}), **{k: v for k, v in geometry.items() if v is not None}}
+    if symmetry is None:
+        symmetry = meta.get("symmetry", preset["symmetry"])
+    version = artifacts.next_version(jewelry_id)
+    # Versioned file name so clients and caches never see a stale GLB under the new version
+    name = f"{jewelry_id}_v{version}.glb"
+    output_glb_path = os.path.join(OUTPUT_DIR, name)
+    public_url = f"{OUTPUT_BASE_URL}/{name}"
+    timer = metrics.StageTimer(preset=preset["name"])
+
+    try:
+        job_metrics = mesh_generator.remesh(depth, alpha, output_glb_path,
+                                            grid_resolution or meta.get("grid_resolution", preset["grid_resolution"]),
+                                            preset["decimate_faces"], geometry, timer, symmetry)
+    except Exception:
+        # The reserved version never goes live; don't leave a half-written file under its name
+        if os.path.exists(output_glb_path):
+            os.remove(output_glb_path)
+        raise
+    job_metrics["timings_ms"] = timer.timings_ms
+    # Only now does the new version become the one /materials and the atlas use
+    if not artifacts.publish_version(jewelry_id, version, name, geometry=job_metrics["geometry"],
+                                     grid_resolution=job_metrics["grid_resolution"], symmetry=symmetry):
+        # A newer remesh went live while this one ran: its GLB, callback and atlas win
+        os.remove(output_glb_path)
+        metrics.JOBS_TOTAL.inc(outcome="remesh_superseded", preset=preset["name"])
+        live_version = (artifacts.read_meta(jewelry_id) or {}).get("version")
+        logger.info(f"[Remesh] {jewelry_id} v{version} superseded by v{live_version}; discarded")
+        return {"status": "superseded", "version": version, "live_version": live_version}
+
+    send_callback(jewelry_id, {
+        "status": "completed",
+        "glb_url": public_url,
+        "metrics": job_metrics,
+        "is_fallback": False,
+        "is_remesh": True,
+        "version": version
+    })
+    metrics.JOBS_TOTAL.inc(outcome="remesh", preset=preset["name"])
+    schedule_atlas_build(jewelry_id, output_glb_path)
+    logger.info(f"[Remesh] {jewelry_id} v{version}: {public_url} {timer.timings_ms}")
+    return {"status": "completed", "model_url": public_url, "version": version, **job_metrics}
+
+@app.post("/remesh/{jewelry_id}")
+async def remesh_jewelry(
+    jewelry_id: str,
+    relief_max: float = Form(None),
+    thickness: float = Form(None),
+    max_extent: float = Form(None),
+    alpha_threshold: int = Form(None),
+    grid_resolution: int = Form(None),
+    symmetry: bool = Form(None),
+    lane: str = Form("interactive"),
+):
+    """
+    Re-runs meshing, solidify and export with new geometry parameters on the
+    depth and alpha stored by the original job; omitted parameters (symmetry
+    included) keep the job's current values. Returns the new GLB version.
+    """
+    geometry = {"relief_max": relief_max, "thickness": thickness, "max_extent": max_extent,
+                "alpha_threshold": alpha_threshold}
+    try:
+        mesh_generator.geometry_params(geometry)
+        artifacts.job_dir(jewelry_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    lane = lane.lower()
+    if lane not in admission.LANES:
+        raise HTTPException(status_code=400, detail=f"lane must be one of {', '.join(admission.LANES)}")
+
+    try:
+        future, _ = pipeline_queue.submit(lane, run_remesh, jewelry_id, geometry, grid_resolution, symmetry)
+    except admission.AdmissionRejected as e:
+        return JSONResponse(
+            {"success": False, "message": str(e), "lane": e.lane, "estimated_wait_s": round(e.estimated_wait, 1)},
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    try:
+        result = await asyncio.wrap_future(future)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"No stored artifacts for {jewelry_id}; run /convert-2d-to-3d first")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Remesh failed: {e}")
+    return {"success": True, "asset_id": jewelry_id, **result}
+
+# ---------------------------------------------------------------------------
+# Material variants (metal finishes) on the published GLB
+# ---------------------------------------------------------------------------
+def current_glb(jewelry_id: str) -> tuple[str, str]:
+    """
+    (path, public URL) of the GLB currently live for a job: the latest remesh
+    version, else the base file. Raises glb.InvalidGLB if that file is broken.
+    """
+    meta = artifacts.read_meta(jewelry_id) or {}
+    name = meta.get("glb") or f"{jewelry_id}_v{meta.get('version')}.glb"
+    if not os.path.exists(os.path.join(OUTPUT_DIR, name)):
+        name = f"{jewelry_id}.glb"
+    path = os.path.join(OUTPUT_DIR, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No GLB for {jewelry_id}")
+    glb.validate(path)
+    return path, f"{OUTPUT_BASE_URL}/{name}"
+
+# One /materials patch per jewelry_id at a time: each is a read-modify-write of the GLB JSON
+_materials_locks = {}
+_materials_locks_guard = threading.Lock()
+
+def _materials_lock(jewelry_id: str) -> threading.Lock:
+    with _materials_locks_guard:
+        return _materials_locks.setdefault(jewelry_id, threading.Lock())
+
+def patch_materials(jewelry_id: str, variants: dict, default: str | None) -> dict:
+    with _materials_lock(jewelry_id):
+        path, public_url = current_glb(jewelry_id)
+        start = time.perf_counter()
+        gltf, _ = glb.read_json(path)
+        previous = materials.list_variants(gltf)["default"]
+        materials.apply_variants(gltf, variants, default)
+        # Validated on a side file, then atomically renamed over the live GLB
+        staged = f"{path}.{uuid.uuid4().hex[:8]}.patch"
+        try:
+            glb.rewrite_json(path, gltf, output_path=staged)
+            glb.validate(staged)
+            os.replace(staged, path)
+        finally:
+            if os.path.exists(staged):
+                os.remove(staged)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+    result = materials.list_variants(gltf)
+    # The sprite atlas is rendered in the default finish
+    if result["default"] != previous or result["default"] in variants:
+        schedule_atlas_build(jewelry_id, path)
+    logger.info(f"[Materials] {jewelry_id}: {sorted(variants)} default={result['default']} in {elapsed_ms:.2f} ms")
+    return {"model_url": public_url, "patch_ms": round(elapsed_ms, 3), **result}
+
+@app.get("/materials/{jewelry_id}")
+def get_materials(jewelry_id: str):
+    try:
+        path, public_url = current_glb(jewelry_id)
+        gltf, _ = glb.read_json(path)
+    except glb.InvalidGLB as e:
+        raise HTTPException(status_code=422, detail=f"Live GLB is invalid: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"asset_id": jewelry_id, "model_url": public_url, **materials.list_variants(gltf)}
+
+@app.post("/materials/{jewelry_id}")
+async def set_materials(jewelry_id: str, variants: dict = Body(..., embed=True), default: str = Body(None, embed=True)):
+    """
+    Adds or patches KHR_materials_variants finishes on the job's live GLB.
+    `variants` maps a finish name to pbrMetallicRoughness overrides (null for
+    the preset values); `default` picks the finish shown before the viewer
+    selects one. Only the GLB JSON chunk is rewritten; the URL is unchanged.
+    """
+    try:
+        result = await run_in_threadpool(patch_materials, jewelry_id, variants, default)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except glb.InvalidGLB as e:
+        raise HTTPException(status_code=422, detail=f"Live GLB is invalid: {e}")
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "asset_id": jewelry_id, **result}
 
 # ---------------------------------------------------------------------------
 # AR Try-On endpoint
 # ---------------------------------------------------------------------------
+def _render_jewelry(img, faces: list, jewelry_id: str | None, category: str) -> None:
+    """Composites the pre-rendered impostor when an atlas exists, else draws the debug boxes."""
+    atlas = atlas_cache.get(jewelry_id) if jewelry_id else None
+    if atlas is None:
+        try_on.annotate_frame(img, faces)
+        return
+    sprites, meta = atlas
+    impostor.composite_jewelry(img, faces, [try_on.compute_anchors(f) for f in faces], sprites, meta, category)
+
+def _try_on_frame(contents: bytes, mode: str = "image", session_id: str | None = None,
+                  jewelry_id: str | None = None, category: str = "necklace") -> dict:
+    img = try_on.decode_frame(contents)
+    detection_ms = None
+    faces = []
+    tracker = tracker_sessions.get(session_id) if session_id else None
+
+    # Face detection using MediaPipe if available
+    if face_pool.available:
+        faces, detection_ms = try_on.run_detection(face_pool, img, tracker)
+    elif mode != "image":
+        raise RuntimeError("Face detection unavailable (MediaPipe missing)")
+
+    if mode != "image":
+        # Anchor modes skip annotation, JPEG encoding and base64 entirely
+        anchors = try_on.build_anchor_response(faces, (img.shape[1], img.shape[0]))
+        return {"success": True, "mode": mode, **anchors, "detection_ms": detection_ms,
+                "keyframe": tracker.last_was_keyframe if tracker else True}
+
+    if face_pool.available:
+        _render_jewelry(img, faces, jewelry_id, category)
+    else:
+        try_on.annotate_unavailable(img)
+
+    base64_str = base64.b64encode(try_on.encode_frame(img)).decode('utf-8')
+    return {"success": True, "image": f"data:image/jpeg;base64,{base64_str}", "detection_ms": detection_ms,
+            "keyframe": tracker.last_was_keyframe if tracker else True}
+
 @app.post("/ar/try-on")
-async def ar_try_on(file: UploadFile = File(...), model_url: str = Form(...)):
+async def ar_try_on(
+    file: UploadFile = File(...),
+    model_url: str = Form(...),
+    mode: str = Form("image"),
+    session_id: str = Form(None),
+    jewelry_id: str = Form(None),
+    category: str = Form("necklace"),
+    profile: str = Query(None),
+    x_profile: str = Header(None)
+):
+    mode = mode.lower()
+    if mode not in try_on.RESPONSE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(try_on.RESPONSE_MODES)}")
     try:
-        import cv2
-        import numpy as np
         contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        # Face detection using MediaPipe if available
-        try:
-            import mediapipe as mp
-            mp_face_detection = mp.solutions.face_detection
-            with mp_face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5) as face_detection:
-                results = face_detection.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-                if results.detections:
-                    for detection in results.detections:
-                        bboxC = detection.location_data.relative_bounding_box
-                        ih, iw, _ = img.shape
-                        x, y, w, h = int(bboxC.xmin * iw), int(bboxC.ymin * ih), int(bboxC.width * iw), int(bboxC.height * ih)
-                        cv2.rectangle(img, (x, y), (x + w, y + h), (212, 175, 55), 2)
-                        cv2.putText(img, "Jewelry Applied", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (212, 175, 55), 2)
-        except ImportError:
-            cv2.putText(img, "AR Service (MP Missing)", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-
-        _, encoded_img = cv2.imencode('.jpg', img)
-        base64_str = base64.b64encode(encoded_img).decode('utf-8')
-        return JSONResponse({"success": True, "image": f"data:image/jpeg;base64,{base64_str}"})
+        headers = {}
+        if profiler.wants_profile(x_profile, profile):
+            profile_id = profiler.new_profile_id()
+            headers["X-Profile-Id"] = profile_id
+            result = await run_in_threadpool(profiler.run_profiled, PROFILE_DIR, profile_id, "ar-try-on",
+                                             _try_on_frame, contents, mode, session_id, jewelry_id, category)
+            result["profile_id"] = profile_id
+        else:
+            result = await run_in_threadpool(_try_on_frame, contents, mode, session_id, jewelry_id, category)
+        if result["detection_ms"] is not None:
+            metrics.TRYON_SECONDS.observe(result["detection_ms"] / 1000.0, stage="detect")
+            headers["Server-Timing"] = f"detect;dur={result['detection_ms']:.2f}"
+        if mode == "packed":
+            return Response(try_on.pack_anchor_response(result), media_type="application/octet-stream", headers=headers)
+        return JSONResponse(result, headers=headers)
 
     except Exception as e:
         logger.error(f"AR Try-On failed: {e}")
         return JSONResponse({"success": False, "message": str(e)}, status_code=500)
 
+# ---------------------------------------------------------------------------
+# AR Try-On streaming endpoint (WebSocket)
+# ---------------------------------------------------------------------------
+def _stream_frame(detector, tracker: FaceTracker, payload: bytes, mode: str,
+                  jewelry_id: str | None = None, category: str = "necklace") -> tuple[bytes, float, float]:
+    start = time.perf_counter()
+    img = try_on.decode_frame(payload)
+    decode_ms = (time.perf_counter() - start) * 1000.0
+
+    detect_ms = 0.0
+    faces = []
+    if detector is not None:
+        start = time.perf_counter()
+        faces = try_on.detect_on_frame(detector, img, tracker)
+        detect_ms = (time.perf_counter() - start) * 1000.0
+
+    if mode != "image":
+        anchors = try_on.build_anchor_response(faces, (img.shape[1], img.shape[0]))
+        return try_on.encode_anchor_response(anchors, mode), decode_ms, detect_ms
+
+    if detector is not None:
+        _render_jewelry(img, faces, jewelry_id, category)
+    else:
+        try_on.annotate_unavailable(img)
+    return try_on.encode_frame(img), decode_ms, detect_ms
+
+@app.websocket("/ar/try-on/stream")
+async def ar_try_on_stream(websocket: WebSocket, mode: str = "image", jewelry_id: str = None, category: str = "necklace"):
+    """
+    Binary frame stream (see pipeline/try_on.py for the wire format).
+    Only the newest frame is kept: anything that arrives while a frame is being
+    processed overwrites the pending slot and is counted as dropped, so latency
+    stays bounded when the client sends faster than we can process.
+    `?mode=anchors|packed` returns anchor JSON / packed anchors instead of a JPEG;
+    `?jewelry_id=` composites that item's impostor sprites in image mode.
+    """
+    mode = mode.lower()
+    if mode not in try_on.RESPONSE_MODES:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    # Per-connection detector from the stream pool, held for the lifetime of the socket;
+    # once every stream slot is taken, further sockets are turned away at once
+    checkout = None
+    detector = None
+    if stream_pool.available:
+        checkout = stream_pool.checkout(timeout=0)
+        try:
+            detector = await run_in_threadpool(checkout.__enter__)
+        except RuntimeError as e:
+            logger.warning(f"Try-on stream rejected: {e}")
+            await websocket.close(code=1013)  # Try Again Later
+            return
+
+    tracker = FaceTracker()
+    state = {"pending": None, "dropped": 0, "closed": False}
+    frame_ready = asyncio.Event()
+
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                data = message.get("bytes")
+                if not data:
+                    continue
+                try:
+                    seq, payload = try_on.unpack_stream_frame(data)
+                except ValueError:
+                    continue
+                if state["pending"] is not None:
+                    state["dropped"] += 1
+                state["pending"] = (seq, payload, time.perf_counter())
+                frame_ready.set()
+        finally:
+            state["closed"] = True
+            frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            if state["closed"]:
+                break
+            if state["pending"] is None:
+                continue
+            seq, payload, received_at = state["pending"]
+            state["pending"] = None
+            dropped, state["dropped"] = state["dropped"], 0
+
+            try:
+                result, decode_ms, detect_ms = await run_in_threadpool(_stream_frame, detector, tracker, payload, mode, jewelry_id, category)
+            except Exception as e:
+                logger.warning(f"Try-on stream frame {seq} failed: {e}")
+                result, decode_ms, detect_ms = b"", 0.0, 0.0
+
+            total_ms = (time.perf_counter() - received_at) * 1000.0
+            metrics.TRYON_SECONDS.observe(detect_ms / 1000.0, stage="detect")
+            metrics.TRYON_SECONDS.observe(total_ms / 1000.0, stage="stream_frame")
+            await websocket.send_bytes(try_on.pack_stream_result(seq, dropped, decode_ms, detect_ms, total_ms, result))
+    except Exception as e:
+        logger.info(f"Try-on stream closed: {e}")
+    finally:
+        receiver.cancel()
+        if checkout is not None:
+            checkout.__exit__(None, None, None)
+
 # ---------------------------------------------------------------------------
 # 2D-to-3D conversion endpoint
 # ---------------------------------------------------------------------------
@@ -186,10 +683,24 @@ async def convert_image(
     price: str = Form(None),
     image2D: str = Form(None),
     createdBy: str = Form(None),
-    sellerId: str = Form(None)
+    sellerId: str = Form(None),
+    lane: str = Form("interactive"),
+    progressive: bool = Form(False),
+    preset: str = Form("standard"),
+    symmetry: bool = Form(None),
+    profile: str = Query(None),
+    x_profile: str = Header(None)
 ):
+    lane = lane.lower()
+    if lane not in admission.LANES:
+        raise HTTPException(status_code=400, detail=f"lane must be one of {', '.join(admission.LANES)}")
+    preset = preset.lower()
+    if preset not in PRESETS:
+        raise HTTPException(status_code=400, detail=f"preset must be one of {', '.join(PRESETS)}")
     jewelry_id = str(product_id)
-    input_path = os.path.join(OUTPUT_DIR, f"{jewelry_id}_input.png")
+    # One input file per upload: a retried or duplicate product_id must not
+    # overwrite (or, on 429, delete) the input of a job that is already queued
+    input_path = os.path.join(UPLOAD_DIR, f"{jewelry_id}_input_{uuid.uuid4().hex[:8]}.png")
 
     metadata = {
         "name": name,
@@ -209,11 +720,87 @@ async def convert_image(
         logger.error(f"Failed to write uploaded image: {e}")
         raise HTTPException(status_code=500, detail="Failed to store uploaded image")
 
-    glb_url = run_pipeline(jewelry_id, input_path, category.lower(), metadata)
+    profile_id = None
+    preview_published = threading.Event()
+    if progressive:
+        job = (run_upgrade, preview_published, jewelry_id, input_path, category.lower(), metadata, preset, symmetry)
+    else:
+        job = (run_pipeline, jewelry_id, input_path, category.lower(), metadata, preset, symmetry)
+    if profiler.wants_profile(x_profile, profile):
+        profile_id = profiler.new_profile_id()
+        job = (profiler.run_profiled, PROFILE_DIR, profile_id, f"convert-2d-to-3d:{jewelry_id}") + job
+
+    try:
+        future, estimated_wait = pipeline_queue.submit(lane, *job)
+    except admission.AdmissionRejected as e:
+        logger.warning(f"Rejected {jewelry_id}: {e}")
+        try:
+            os.remove(input_path)
+        except OSError:
+            pass
+        return JSONResponse(
+            {"success": False, "message": str(e), "lane": e.lane, "estimated_wait_s": round(e.estimated_wait, 1)},
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    if progressive:
+        try:
+            preview_url = await run_in_threadpool(publish_preview, jewelry_id, input_path, category.lower(), metadata)
+        except Exception as e:
+            logger.error(f"Preview failed for {jewelry_id}: {e}")
+            preview_url = None
+        finally:
+            preview_published.set()
+        # The upgraded GLB (version 2) is delivered by callback when the pipeline finishes
+        response = {"success": True, "asset_id": jewelry_id, "model_url": preview_url, "is_preview": True,
+                    "version": PREVIEW_VERSION, "upgrade_version": FULL_VERSION,
+                    "lane": lane, "estimated_wait_s": round(estimated_wait, 1)}
+        if profile_id:
+            response["profile_id"] = profile_id
+        return response
+
+    glb_url = await asyncio.wrap_future(future)
     if glb_url is None:
         raise HTTPException(status_code=500, detail="Mesh generation failed")
 
-    return {"success": True, "asset_id": jewelry_id, "model_url": glb_url}
+    response = {"success": True, "asset_id": jewelry_id, "model_url": glb_url,
+                "lane": lane, "estimated_wait_s": round(estimated_wait, 1)}
+    if profile_id:
+        response["profile_id"] = profile_id
+    return response
+
+# ---------------------------------------------------------------------------
+# Pipeline queue status
+# ---------------------------------------------------------------------------
+@app.get("/queue")
+def queue_status():
+    return {**pipeline_queue.snapshot(), "atlas": atlas_builder.snapshot(), "threads": thread_budget.snapshot()}
+
+# ---------------------------------------------------------------------------
+# Profile retrieval
+# ---------------------------------------------------------------------------
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    path = profiler.profile_path(PROFILE_DIR, profile_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path) as f:
+        return json.load(f)
+
+@app.get("/profiles/{profile_id}/{artifact}")
+def get_profile_artifact(profile_id: str, artifact: str):
+    path = profiler.profile_path(PROFILE_DIR, profile_id, artifact)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile artifact not found")
+    return FileResponse(path, filename=f"{profile_id}_{artifact}")
+
+# ---------------------------------------------------------------------------
+# Prometheus metrics
+# ---------------------------------------------------------------------------
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # ---------------------------------------------------------------------------
 # Health check
@@ -222,6 +809,23 @@ async def convert_image(
 def health_check():
     return {"message": "AR Jewelry 2D-to-3D service is operational"}
 
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving, models may still be loading."""
+    return {"status": "ok", "uptime_s": round(time.time() - STARTED_AT, 1)}
+
+@app.get("/memory")
+def memory():
+    """This worker's resident memory, unique vs shared (see serve_prefork.py)."""
+    from pipeline.shared_models import process_memory
+    return process_memory()
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 once every required model is warm, 503 before (or if one failed to load)."""
+    snapshot = warmup.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
 # ---------------------------------------------------------------------------
 # Run server
 # ---------------------------------------------------------------------------
@@ -0,0 +1,89 @@
+"""
+Procedural jewelry corpus for the benchmark suite.
+Every case is an RGBA product shot (transparent background, shaded metal)
+generated from a fixed seed, so runs are comparable across machines.
+"""
+import os
+import cv2
+import numpy as np
+
+CATEGORIES = ("necklace", "ring", "earring")
+DEFAULT_RESOLUTIONS = (256, 512, 1024)
+GOLD_RGB = np.array([212, 175, 55], dtype=np.float32)
+
+
+def _necklace_mask(size: int, rng: np.random.Generator) -> np.ndarray:
+    mask = np.zeros((size, size), np.uint8)
+    c = size // 2
+    axes = (int(size * 0.38), int(size * 0.30))
+    thick = max(2, size // 40)
+    cv2.ellipse(mask, (c, int(size * 0.35)), axes, 0, 15, 165, 255, thick, cv2.LINE_AA)
+    # Beads along the chain and a drop pendant
+    for t in np.linspace(np.radians(25), np.radians(155), 9):
+        x = int(c + axes[0] * np.cos(t))
+        y = int(size * 0.35 + axes[1] * np.sin(t))
+        cv2.circle(mask, (x, y), max(2, int(size * rng.uniform(0.018, 0.026))), 255, -1, cv2.LINE_AA)
+    cv2.circle(mask, (c, int(size * 0.35) + axes[1] + size // 12), size // 14, 255, -1, cv2.LINE_AA)
+    return mask
+
+
+def _ring_mask(size: int, rng: np.random.Generator) -> np.ndarray:
+    mask = np.zeros((size, size), np.uint8)
+    c = size // 2
+    cv2.circle(mask, (c, int(size * 0.55)), int(size * 0.32), 255, -1, cv2.LINE_AA)
+    cv2.circle(mask, (c, int(size * 0.55)), int(size * 0.24), 0, -1, cv2.LINE_AA)
+    # Gem setting on top
+    gem = int(size * rng.uniform(0.09, 0.11))
+    pts = np.array([[c, int(size * 0.12)], [c + gem, int(size * 0.23)], [c, int(size * 0.32)],
+                    [c - gem, int(size * 0.23)]], np.int32)
+    cv2.fillConvexPoly(mask, pts, 255, cv2.LINE_AA)
+    return mask
+
+
+def _earring_mask(size: int, rng: np.random.Generator) -> np.ndarray:
+    mask = np.zeros((size, size), np.uint8)
+    c = size // 2
+    # Hook, stem and teardrop
+    cv2.ellipse(mask, (c, int(size * 0.14)), (size // 12, size // 12), 0, 180, 360, 255, max(2, size // 60), cv2.LINE_AA)
+    cv2.line(mask, (c, int(size * 0.14)), (c, int(size * 0.45)), 255, max(2, size // 50), cv2.LINE_AA)
+    cv2.circle(mask, (c, int(size * 0.66)), int(size * rng.uniform(0.17, 0.2)), 255, -1, cv2.LINE_AA)
+    pts = np.array([[c, int(size * 0.4)], [c + size // 6, int(size * 0.62)], [c - size // 6, int(size * 0.62)]], np.int32)
+    cv2.fillConvexPoly(mask, pts, 255, cv2.LINE_AA)
+    return mask
+
+
+_MASKS = {"necklace": _necklace_mask, "ring": _ring_mask, "earring": _earring_mask}
+
+
+def shading_from_alpha(alpha: np.ndarray) -> np.ndarray:
+    """Depth-like dome shading: distance to the silhouette edge, normalised to [0, 255]."""
+    dist = cv2.distanceTransform((alpha > 127).astype(np.uint8), cv2.DIST_L2, 5)
+    if dist.max() > 0:
+        dist = np.sqrt(dist / dist.max())
+    return (dist * 255.0).astype(np.float32)
+
+
+def make_case(category: str, size: int, seed: int = 0) -> np.ndarray:
+    """Returns an RGBA uint8 image of one synthetic piece."""
+    rng = np.random.default_rng(seed + size * 7 + CATEGORIES.index(category))
+    alpha = _MASKS[category](size, rng)
+    shade = shading_from_alpha(alpha) / 255.0
+    # Metal: base colour lit by the dome, a specular band and a little grain
+    light = 0.45 + 0.55 * shade
+    spec = np.clip(1.0 - np.abs(shade - 0.8) * 6.0, 0.0, 1.0)[..., None] * 60.0
+    grain = rng.normal(0.0, 4.0, alpha.shape)[..., None]
+    rgb = np.clip(GOLD_RGB * light[..., None] + spec + grain, 0, 255).astype(np.uint8)
+    return np.dstack([rgb, alpha])
+
+
+def write_corpus(out_dir: str, resolutions=DEFAULT_RESOLUTIONS, categories=CATEGORIES, seed: int = 0) -> list[dict]:
+    """Writes every (category, resolution) case as PNG. Returns the case list."""
+    os.makedirs(out_dir, exist_ok=True)
+    cases = []
+    for category in categories:
+        for size in resolutions:
+            rgba = make_case(category, size, seed)
+            path = os.path.join(out_dir, f"{category}_{size}.png")
+            cv2.imwrite(path, cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGRA))
+            cases.append({"name": f"{category}_{size}", "category": category, "resolution": size, "path": path})
+    return cases
@@ -0,0 +1,336 @@
+"""
+Load-test harness for the ML service.
+
+Starts a stub Node callback receiver, optionally spawns the FastAPI app with
+NODE_CALLBACK_URL / OUTPUT_BASE_URL pointed at it, then ramps concurrent
+clients through a profile and prints a saturation table.
+
+    python -m benchmarks.load_test --spawn --endpoint convert --profile 1,2,4 --requests-per-step 8
+    python -m benchmarks.load_test --target http://127.0.0.1:8000 --endpoint try-on --profile 1,4,16,32 --duration 20
+
+With --target the running server must already have NODE_CALLBACK_URL set to
+http://<callback-host>:<callback-port>/api/ml/callback for callback latencies.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from benchmarks import corpus
+
+CALLBACK_PATH = "/api/ml/callback"
+
+
+# ---------------------------------------------------------------------------
+# Stub callback receiver
+# ---------------------------------------------------------------------------
+class CallbackRecorder:
+    """Thread-safe record of callback arrival times keyed by jewelryId."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._arrivals = {}
+        self._events = {}
+
+    def record(self, payload: dict) -> None:
+        jewelry_id = str(payload.get("jewelryId"))
+        with self._lock:
+            self._arrivals[jewelry_id] = (time.perf_counter(), payload)
+            event = self._events.setdefault(jewelry_id, threading.Event())
+        event.set()
+
+    def wait(self, jewelry_id: str, timeout: float):
+        with self._lock:
+            event = self._events.setdefault(jewelry_id, threading.Event())
+        if not event.wait(timeout):
+            return None
+        with self._lock:
+            return self._arrivals.get(jewelry_id)
+
+
+def start_callback_server(recorder: CallbackRecorder, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                recorder.record(json.loads(self.rfile.read(length) or b"{}"))
+                status = 200
+            except ValueError:
+                status = 400
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b'{"ok":true}')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="callback-stub", daemon=True).start()
+    return server
+
+
+# ---------------------------------------------------------------------------
+# Clients
+# ---------------------------------------------------------------------------
+def encode_multipart(fields: dict, files: dict) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data, content_type) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _post(url: str, fields: dict, files: dict, timeout: float) -> int:
+    body, content_type = encode_multipart(fields, files)
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def synthetic_frame(size=(640, 480)) -> bytes:
+    """A webcam-sized JPEG (no face; exercises decode, detection and encode)."""
+    w, h = size
+    yy, xx = np.mgrid[:h, :w]
+    img = np.dstack([(xx * 255 // w), (yy * 255 // h), np.full((h, w), 96)]).astype(np.uint8)
+    cv2.ellipse(img, (w // 2, h // 2), (w // 8, h // 5), 0, 0, 360, (150, 180, 220), -1)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+class Workload:
+    def __init__(self, target: str, endpoint: str, recorder: CallbackRecorder | None,
+                 callback_timeout: float, request_timeout: float, category: str = "ring",
+                 try_on_mode: str = "anchors"):
+        self.target = target.rstrip("/")
+        self.endpoint = endpoint
+        self.recorder = recorder
+        self.callback_timeout = callback_timeout
+        self.request_timeout = request_timeout
+        self.category = category
+        self.try_on_mode = try_on_mode
+        self.product_png = cv2.imencode(".png", cv2.cvtColor(corpus.make_case(category, 512),
+                                                             cv2.COLOR_RGBA2BGRA))[1].tobytes()
+        self.frame_jpg = synthetic_frame()
+
+    def one(self) -> dict:
+        """Issues one request; returns its timings (seconds) and outcome."""
+        if self.endpoint == "try-on":
+            start = time.perf_counter()
+            status = _post(f"{self.target}/ar/try-on", {"model_url": "load-test", "mode": self.try_on_mode},
+                           {"file": ("frame.jpg", self.frame_jpg, "image/jpeg")}, self.request_timeout)
+            return {"ok": status == 200, "status": status, "response_s": time.perf_counter() - start}
+
+        product_id = f"load-{uuid.uuid4().hex[:12]}"
+        start = time.perf_counter()
+        status = _post(f"{self.target}/convert-2d-to-3d", {"product_id": product_id, "category": self.category},
+                       {"file": ("product.png", self.product_png, "image/png")}, self.request_timeout)
+        result = {"ok": status == 200, "status": status, "response_s": time.perf_counter() - start}
+        # Only admitted jobs call back; a 429 must not park the client for callback_timeout
+        if self.recorder is not None and status == 200:
+            arrival = self.recorder.wait(product_id, self.callback_timeout)
+            if arrival is None:
+                result["ok"] = False
+                result["callback_missing"] = True
+            else:
+                result["callback_s"] = arrival[0] - start
+                result["fallback"] = bool(arrival[1].get("is_fallback"))
+        return result
+
+
+def run_step(workload: Workload, concurrency: int, duration: float | None, requests: int | None) -> dict:
+    """Runs `concurrency` closed-loop clients until the duration or request budget is spent."""
+    results = []
+    lock = threading.Lock()
+    budget = [requests]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def client():
+        while True:
+            with lock:
+                if budget[0] is not None:
+                    if budget[0] <= 0:
+                        return
+                    budget[0] -= 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            try:
+                r = workload.one()
+            except Exception as e:
+                r = {"ok": False, "error": str(e), "response_s": float("nan")}
+            with lock:
+                results.append(r)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarise(concurrency, results, time.perf_counter() - start)
+
+
+def _pct(values, q):
+    return round(float(np.percentile(values, q)) * 1000.0, 1) if values else None
+
+
+def summarise(concurrency: int, results: list[dict], elapsed: float) -> dict:
+    ok = [r for r in results if r["ok"]]
+    response = [r["response_s"] for r in ok]
+    callback = [r["callback_s"] for r in ok if "callback_s" in r]
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "fallbacks": sum(1 for r in ok if r.get("fallback")),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else None,
+        "response_p50_ms": _pct(response, 50),
+        "response_p95_ms": _pct(response, 95),
+        "e2e_p50_ms": _pct(callback, 50),
+        "e2e_p95_ms": _pct(callback, 95),
+    }
+
+
+def print_curve(rows: list[dict]) -> None:
+    header = f"{'conc':>5} {'reqs':>6} {'err':>5} {'rps':>8} {'resp p50':>10} {'resp p95':>10} {'e2e p50':>10} {'e2e p95':>10}"
+    print(header)
+    print("-" * len(header))
+    peak = max((r["throughput_rps"] or 0) for r in rows) or 1.0
+    for r in rows:
+        bar = "#" * int(30 * (r["throughput_rps"] or 0) / peak)
+        print(f"{r['concurrency']:>5} {r['requests']:>6} {r['errors']:>5} {r['throughput_rps'] or 0:>8.2f} "
+              f"{_cell(r['response_p50_ms'])} {_cell(r['response_p95_ms'])} "
+              f"{_cell(r['e2e_p50_ms'])} {_cell(r['e2e_p95_ms'])}  {bar}")
+
+
+def _cell(value) -> str:
+    return f"{value:>10.1f}" if value is not None else f"{'-':>10}"
+
+
+# ---------------------------------------------------------------------------
+# Server under test
+# ---------------------------------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(target: str, timeout: float, proc: subprocess.Popen | None = None) -> None:
+    """
+    Polls /readyz until it returns 200. Warm-up runs in the background, so
+    the port answers long before the models are loaded; ramping up earlier
+    would measure cold model loading instead of steady-state throughput.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"App exited during startup (code {proc.returncode})")
+        try:
+            urllib.request.urlopen(f"{target}/readyz", timeout=1).read()
+            return
+        except urllib.error.HTTPError as e:
+            # 503 while warming; a required model that failed to load never becomes ready
+            failed = {name: c["error"] for name, c in json.loads(e.read() or b"{}").get("components", {}).items()
+                      if c.get("required") and c.get("state") == "failed"}
+            if failed:
+                raise RuntimeError(f"App warm-up failed: {failed}")
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"App did not become ready in {timeout:.0f}s")
+
+
+def spawn_app(callback_url: str, port: int, startup_timeout: float = 180.0) -> subprocess.Popen:
+    env = dict(os.environ, NODE_CALLBACK_URL=callback_url,
+               OUTPUT_BASE_URL=os.getenv("OUTPUT_BASE_URL", f"http://127.0.0.1:{port}/output"))
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+                            cwd=BASE_DIR, env=env)
+    try:
+        wait_ready(f"http://127.0.0.1:{port}", startup_timeout, proc)
+    except RuntimeError:
+        proc.terminate()
+        raise
+    return proc
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ML service load test")
+    parser.add_argument("--target", default=None, help="base URL of a running app (default: --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="start the app with callbacks redirected to the stub")
+    parser.add_argument("--endpoint", choices=("convert", "try-on"), default="convert")
+    parser.add_argument("--profile", default="1,2,4,8", help="comma-separated concurrency steps")
+    parser.add_argument("--duration", type=float, default=None, help="seconds per step")
+    parser.add_argument("--requests-per-step", type=int, default=None, help="requests per step (default 4 x concurrency)")
+    parser.add_argument("--category", default="ring", choices=corpus.CATEGORIES)
+    parser.add_argument("--try-on-mode", default="anchors", choices=("image", "anchors", "packed"))
+    parser.add_argument("--callback-host", default="127.0.0.1")
+    parser.add_argument("--callback-port", type=int, default=0)
+    parser.add_argument("--callback-timeout", type=float, default=300.0)
+    parser.add_argument("--request-timeout", type=float, default=600.0)
+    parser.add_argument("--startup-timeout", type=float, default=180.0, help="seconds to wait for /readyz")
+    parser.add_argument("--output", default=None, help="write the curve as JSON")
+    args = parser.parse_args(argv)
+
+    steps = [int(s) for s in args.profile.split(",") if s.strip()]
+    recorder = CallbackRecorder()
+    server = start_callback_server(recorder, args.callback_host, args.callback_port)
+    callback_url = f"http://{args.callback_host}:{server.server_address[1]}{CALLBACK_PATH}"
+    print(f"Callback stub listening on {callback_url}", file=sys.stderr)
+
+    proc = None
+    target = args.target
+    if target is None or args.spawn:
+        port = _free_port()
+        proc = spawn_app(callback_url, port, args.startup_timeout)
+        target = f"http://127.0.0.1:{port}"
+    else:
+        wait_ready(target.rstrip("/"), args.startup_timeout)
+
+    rows = []
+    try:
+        workload = Workload(target, args.endpoint, recorder if args.endpoint == "convert" else None,
+                            args.callback_timeout, args.request_timeout, args.category, args.try_on_mode)
+        for concurrency in steps:
+            requests = args.requests_per_step
+            if requests is None and args.duration is None:
+                requests = 4 * concurrency
+            row = run_step(workload, concurrency, args.duration, requests)
+            rows.append(row)
+            print(f"step concurrency={concurrency}: {row}", file=sys.stderr)
+    finally:
+        server.shutdown()
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    print_curve(rows)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"target": target, "endpoint": args.endpoint, "steps": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Offline benchmark for the 2D-to-3D pipeline.
+
+    python -m benchmarks.run_benchmarks                       # full corpus, compare to baseline
+    python -m benchmarks.run_benchmarks --resolutions 256 --repeats 1 --stages mesh solidify
+    python -m benchmarks.run_benchmarks --save-baseline       # record this machine's baseline
+    python -m benchmarks.run_benchmarks --check               # CI: a missing baseline is an error
+
+Heavy models (rembg, Depth-Anything, MobileSAM) are replaced by the
+deterministic stubs in benchmarks.stubs unless --real-models is given.
+Exit code is 1 when any stage regresses past --tolerance, and 2 when
+--check finds no baseline (the baseline is per machine, so record it with
+--save-baseline on the host that runs the check).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from benchmarks import corpus
+
+STAGES = ("clean", "validate", "mesh", "solidify", "export", "fallback", "end_to_end")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.15
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS; only used where /proc is missing
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class _RssSampler(threading.Thread):
+    """Tracks the peak resident set size while a stage runs."""
+
+    def __init__(self, interval: float = 0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _rss_bytes()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, _rss_bytes())
+        return self.peak
+
+
+def measure(fn, repeats: int) -> dict:
+    """Runs fn() `repeats` times; returns latency percentiles, throughput and peak RSS."""
+    latencies = []
+    sampler = _RssSampler()
+    sampler.start()
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        peak = sampler.stop()
+    lat = np.array(latencies)
+    return {
+        "runs": len(latencies),
+        "p50_ms": round(float(np.percentile(lat, 50)) * 1000.0, 3),
+        "p95_ms": round(float(np.percentile(lat, 95)) * 1000.0, 3),
+        "mean_ms": round(float(lat.mean()) * 1000.0, 3),
+        "throughput_per_s": round(len(lat) / float(lat.sum()), 4) if lat.sum() > 0 else None,
+        "peak_rss_mb": round(peak / 1e6, 1),
+    }
+
+
+def _stage_fns(case: dict, work_dir: str, generator, preset: dict) -> dict:
+    """Builds one zero-argument callable per stage for a corpus case."""
+    from pipeline.image_cleaner import clean_image
+    from pipeline import mesh_generator
+    from pipeline.fallback_generator import FallbackGenerator
+
+    name = case["name"]
+    input_path = os.path.join(work_dir, f"{name}.png")
+    shutil.copyfile(case["path"], input_path)
+    out_glb = os.path.join(work_dir, f"{name}.glb")
+    state = {}
+
+    def cleaned():
+        if "cleaned" not in state:
+            state["cleaned"] = clean_image(input_path)
+        return state["cleaned"]
+
+    def surface():
+        if "surface" not in state:
+            depth, _ = mesh_generator.estimate_depth(cleaned())
+            alpha = mesh_generator.remove_background(cleaned())
+            state["surface"] = mesh_generator.build_surface(*mesh_generator.prepare_grids(depth, alpha))
+        return state["surface"]
+
+    def solid():
+        if "solid" not in state:
+            state["solid"] = mesh_generator.solidify(surface())
+        return state["solid"]
+
+    def mesh():
+        depth, _ = mesh_generator.estimate_depth(cleaned())
+        alpha = mesh_generator.remove_background(cleaned())
+        mesh_generator.build_surface(*mesh_generator.prepare_grids(depth, alpha))
+
+    def end_to_end():
+        cleaned_path = clean_image(input_path, rembg_model=preset["rembg_model"])
+        generator.generate_mesh(cleaned_path, out_glb, category=case["category"], preset=preset)
+
+    return {
+        "clean": lambda: clean_image(input_path),
+        "validate": lambda: generator.validator.validate_mask(cleaned()),
+        "mesh": mesh,
+        "solidify": lambda: mesh_generator.solidify(surface()),
+        "export": lambda: mesh_generator.export_mesh(solid(), out_glb),
+        "fallback": lambda: FallbackGenerator.generate(case["category"], os.path.join(work_dir, f"{name}_fallback.glb")),
+        "end_to_end": end_to_end,
+    }
+
+
+def run(resolutions, categories, stages, repeats: int, real_models: bool = False, preset_name: str = None) -> dict:
+    from pipeline.mesh_generator import MeshGenerator
+    from pipeline.presets import get_preset
+
+    preset = get_preset(preset_name)
+
+    undo = None
+    if not real_models:
+        from benchmarks import stubs
+        undo = stubs.install()
+
+    work_dir = tempfile.mkdtemp(prefix="ar-bench-")
+    try:
+        generator = MeshGenerator()
+        if not real_models:
+            generator.validator.disable_sam()
+        cases = corpus.write_corpus(os.path.join(work_dir, "corpus"), resolutions, categories)
+
+        results = {}
+        for case in cases:
+            fns = _stage_fns(case, work_dir, generator, preset)
+            for stage in stages:
+                key = f"{stage}/{case['name']}"
+                try:
+                    fns[stage]()  # warm-up: caches, first-call allocations
+                    results[key] = measure(fns[stage], repeats)
+                except Exception as e:
+                    results[key] = {"error": f"{type(e).__name__}: {e}"}
+                print(f"{key:32s} {_fmt(results[key])}", flush=True)
+    finally:
+        if undo is not None:
+            undo()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeats": repeats,
+            "stubbed_models": not real_models,
+            "preset": preset["name"],
+        },
+        "results": results,
+    }
+
+
+def _fmt(entry: dict) -> str:
+    if "error" in entry:
+        return f"ERROR {entry['error']}"
+    return f"p50 {entry['p50_ms']:9.1f} ms  p95 {entry['p95_ms']:9.1f} ms  rss {entry['peak_rss_mb']:7.1f} MB"
+
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[dict]:
+    """Lists stages whose p50 latency or peak RSS exceed the baseline by more than `tolerance`."""
+    regressions = []
+    for key, entry in report["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if not base or "error" in base:
+            continue
+        if "error" in entry:
+            regressions.append({"key": key, "metric": "error", "detail": entry["error"]})
+            continue
+        for metric in ("p50_ms", "peak_rss_mb"):
+            old, new = base.get(metric), entry.get(metric)
+            if old and new and new > old * (1.0 + tolerance):
+                regressions.append({"key": key, "metric": metric, "baseline": old, "current": new,
+                                    "change": round(new / old - 1.0, 3)})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="2D-to-3D pipeline benchmark")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=list(corpus.DEFAULT_RESOLUTIONS))
+    parser.add_argument("--categories", nargs="+", default=list(corpus.CATEGORIES), choices=corpus.CATEGORIES)
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default=None, help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--check", action="store_true", help="fail (exit 2) when there is no baseline to compare to")
+    parser.add_argument("--real-models", action="store_true", help="run rembg / depth / SAM for real")
+    parser.add_argument("--preset", default=None, help="pipeline preset for end_to_end (default: standard)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+    baseline_missing = not args.save_baseline and not os.path.exists(args.baseline)
+    if baseline_missing and args.check:
+        # Fail before spending minutes on a run that cannot be checked
+        print(f"ERROR: no baseline at {args.baseline}; record one with --save-baseline", file=sys.stderr)
+        return 2
+    report = run(args.resolutions, args.categories, args.stages, max(1, args.repeats), args.real_models, args.preset)
+
+    if baseline_missing:
+        report["baseline"] = None
+        print(f"WARNING: no baseline at {args.baseline}; regression check SKIPPED "
+              f"(record one with --save-baseline)", file=sys.stderr)
+    elif not args.save_baseline:
+        report["baseline"] = args.baseline
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(text)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+
+    for r in report.get("regressions", []):
+        print(f"REGRESSION {r['key']} {r['metric']}: {r.get('baseline')} -> {r.get('current', r.get('detail'))}",
+              file=sys.stderr)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+Deterministic stand-ins for the heavy models (rembg, Depth-Anything, MobileSAM)
+so the benchmark measures our own code, not model inference.
+"""
+import numpy as np
+from PIL import Image
+from .corpus import shading_from_alpha
+
+
+def fake_rembg(data, *args, **kwargs):
+    """rembg.remove replacement: corpus images already carry their alpha."""
+    if isinstance(data, Image.Image):
+        return data.convert("RGBA")
+    return data
+
+
+def fake_estimate_depth(image_path: str, *args, **kwargs):
+    """estimate_depth replacement: dome shading derived from the image alpha."""
+    image = Image.open(image_path)
+    image.load()
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    alpha = np.asarray(image)[:, :, 3]
+    return shading_from_alpha(alpha), image.convert("RGB")
+
+
+def install():
+    """Patches the pipeline modules in place. Returns an undo callable."""
+    from pipeline import image_cleaner, mesh_generator
+
+    saved = [
+        (image_cleaner.rembg, "remove", image_cleaner.rembg.remove),
+        (image_cleaner, "get_rembg_session", image_cleaner.get_rembg_session),
+        (mesh_generator, "estimate_depth", mesh_generator.estimate_depth),
+    ]
+    image_cleaner.rembg.remove = fake_rembg  # same rembg module object as mesh_generator.rembg
+    image_cleaner.get_rembg_session = lambda model_name: None  # no ONNX session, no model files
+    mesh_generator.estimate_depth = fake_estimate_depth
+
+    def undo():
+        for owner, name, value in saved:
+            setattr(owner, name, value)
+
+    return undo
+
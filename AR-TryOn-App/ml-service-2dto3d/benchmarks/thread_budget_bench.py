@@ -0,0 +1,141 @@
+"""
+Throughput curve per thread-budget configuration.
+
+    python -m benchmarks.thread_budget_bench                        # budget off vs auto, 1..cpu concurrent jobs
+    python -m benchmarks.thread_budget_bench --jobs 1 4 8 --budgets off auto 2 --real-models
+
+Each configuration runs in a fresh interpreter, because the BLAS/OpenMP
+environment only takes effect before numpy and torch are imported. A
+configuration runs --total end-to-end pipeline jobs through a pool of
+--jobs concurrent workers (like PIPELINE_WORKERS) and reports jobs/s.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(args) -> dict:
+    """One configuration, in this process. Must run before numpy is imported."""
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    from pipeline import thread_budget
+    plan = thread_budget.configure()
+
+    import shutil
+    import tempfile
+    import logging
+    from concurrent.futures import ThreadPoolExecutor
+    import numpy as np
+    from benchmarks import corpus
+    from pipeline.image_cleaner import clean_image
+    from pipeline.mesh_generator import MeshGenerator
+    from pipeline.presets import get_preset
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+    if not args.real_models:
+        from benchmarks import stubs
+        stubs.install()
+    preset = get_preset(args.preset)
+    generator = MeshGenerator()
+    if not args.real_models:
+        generator.validator.disable_sam()
+
+    work_dir = tempfile.mkdtemp(prefix="ar-threads-")
+    try:
+        cases = corpus.write_corpus(os.path.join(work_dir, "corpus"), [args.resolution], ["ring", "earring"])
+
+        def job(i: int) -> float:
+            case = cases[i % len(cases)]
+            path = os.path.join(work_dir, f"job{i}.png")
+            shutil.copyfile(case["path"], path)
+            start = time.perf_counter()
+            cleaned = clean_image(path, rembg_model=preset["rembg_model"])
+            generator.generate_mesh(cleaned, os.path.join(work_dir, f"job{i}.glb"), category=case["category"], preset=preset)
+            return time.perf_counter() - start
+
+        job(0)  # warm-up: model loads, first-call allocations
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            latencies = list(pool.map(job, range(1, args.total + 1)))
+        wall = time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    lat = np.array(latencies)
+    return {
+        "budget": os.getenv("THREAD_BUDGET", "auto"),
+        "jobs": args.jobs,
+        "plan": plan,
+        "throughput_per_s": round(args.total / wall, 3),
+        "p50_ms": round(float(np.percentile(lat, 50)) * 1000.0, 1),
+        "p95_ms": round(float(np.percentile(lat, 95)) * 1000.0, 1),
+    }
+
+
+def run_config(budget: str, jobs: int, args) -> dict:
+    env = dict(os.environ, THREAD_BUDGET=budget, PIPELINE_WORKERS=str(jobs))
+    # Let the budget decide; a value inherited from the shell would pin every configuration
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        env.pop(var, None)
+    cmd = [sys.executable, "-m", "benchmarks.thread_budget_bench", "--child", "--jobs", str(jobs),
+           "--total", str(args.total), "--resolution", str(args.resolution)]
+    if args.preset:
+        cmd += ["--preset", args.preset]
+    if args.real_models:
+        cmd.append("--real-models")
+    proc = subprocess.run(cmd, cwd=BASE_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"budget": budget, "jobs": jobs, "error": proc.stderr.strip().splitlines()[-1:] or ["failed"]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def print_curve(results: list[dict]) -> None:
+    print(f"{'budget':>8} {'jobs':>5} {'jobs/s':>9} {'p50 ms':>10} {'p95 ms':>10}  plan", file=sys.stderr)
+    for r in results:
+        if "error" in r:
+            print(f"{r['budget']:>8} {r['jobs']:>5}  ERROR {r['error']}", file=sys.stderr)
+            continue
+        plan = r["plan"] or {}
+        threads = " ".join(f"{k}={plan[k]}" for k in ("torch_intra", "ort_intra", "cv2") if k in plan) or "library defaults"
+        print(f"{r['budget']:>8} {r['jobs']:>5} {r['throughput_per_s']:9.3f} {r['p50_ms']:10.1f} {r['p95_ms']:10.1f}  {threads}",
+              file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    default_jobs = sorted({1, 2, max(1, cpus // 2), cpus})
+    parser = argparse.ArgumentParser(description="Thread-budget throughput curve")
+    parser.add_argument("--budgets", nargs="+", default=["off", "auto"],
+                        help="THREAD_BUDGET values: off (library defaults), auto, or a core count")
+    parser.add_argument("--jobs", type=int, nargs="+", default=default_jobs, help="concurrent pipeline jobs")
+    parser.add_argument("--total", type=int, default=8, help="jobs per configuration")
+    parser.add_argument("--resolution", type=int, default=512)
+    parser.add_argument("--preset", default=None)
+    parser.add_argument("--real-models", action="store_true")
+    parser.add_argument("--output", default=None, help="write the JSON results here")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_child(argparse.Namespace(**{**vars(args), "jobs": args.jobs[0]}))))
+        return 0
+
+    results = []
+    for budget in args.budgets:
+        for jobs in args.jobs:
+            results.append(run_config(budget, jobs, args))
+            print(json.dumps(results[-1]), flush=True)
+    print_curve(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cpu_count": cpus, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
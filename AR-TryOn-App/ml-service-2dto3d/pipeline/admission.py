@@ -0,0 +1,204 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from . import metrics
+
+logger = logging.getLogger("Admission")
+
+# Interactive = single seller uploads, bulk = catalog imports
+LANES = ("interactive", "bulk")
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "1"))
+LANE_LIMITS = {
+    "interactive": int(os.getenv("INTERACTIVE_QUEUE_LIMIT", "16")),
+    "bulk": int(os.getenv("BULK_QUEUE_LIMIT", "256")),
+}
+# Share of worker time each lane gets while both have work queued
+LANE_WEIGHTS = {
+    "interactive": float(os.getenv("INTERACTIVE_WEIGHT", "4")),
+    "bulk": float(os.getenv("BULK_WEIGHT", "1")),
+}
+# Service-time guess until the first job finishes (seconds)
+INITIAL_SERVICE_ESTIMATE = float(os.getenv("PIPELINE_SERVICE_ESTIMATE", "10"))
+EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(RuntimeError):
+    """Lane queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, lane: str, retry_after: int, estimated_wait: float):
+        super().__init__(f"{lane} queue is full; retry in {retry_after}s")
+        self.lane = lane
+        self.retry_after = retry_after
+        self.estimated_wait = estimated_wait
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future", "enqueued_at")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class _Lane:
+    def __init__(self, name: str, weight: float, limit: int):
+        self.name = name
+        self.weight = max(weight, 1e-3)
+        self.limit = max(0, limit)
+        self.queue = deque()
+        self.vtime = 0.0
+
+
+class AdmissionController:
+    """
+    Bounded per-lane queues in front of a fixed pool of pipeline workers.
+    Lanes are served by weighted fair queueing on virtual time, so bulk work
+    keeps moving but an interactive upload never waits behind the whole import.
+    """
+
+    def __init__(self, workers: int = PIPELINE_WORKERS, limits: dict = None, weights: dict = None):
+        limits = limits or LANE_LIMITS
+        weights = weights or LANE_WEIGHTS
+        self.workers = max(1, int(workers))
+        self._lanes = {name: _Lane(name, weights[name], limits[name]) for name in LANES}
+        self._cond = threading.Condition()
+        self._vclock = 0.0
+        self._busy = 0
+        self._service_estimate = INITIAL_SERVICE_ESTIMATE
+        self._closed = False
+        # Workers start on first submit in each process, so a pre-forked
+        # parent (serve_prefork.py) hands its children no dead threads
+        self._threads = []
+        self._pid = None
+
+    def _ensure_workers(self) -> None:
+        """Starts the worker threads for this process. Caller holds self._cond."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"pipeline-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    # -- scheduling -------------------------------------------------------
+    def _next_job(self):
+        candidates = [lane for lane in self._lanes.values() if lane.queue]
+        if not candidates:
+            return None
+        lane = min(candidates, key=lambda l: l.vtime)
+        self._vclock = lane.vtime
+        lane.vtime += 1.0 / lane.weight
+        job = lane.queue.popleft()
+        metrics.QUEUE_DEPTH.set(len(lane.queue), lane=lane.name)
+        return job
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+                self._busy += 1
+                self._publish_utilisation()
+            start = time.monotonic()
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    job.future.set_result(job.fn(*job.args, **job.kwargs))
+            except BaseException as e:
+                job.future.set_exception(e)
+            finally:
+                elapsed = time.monotonic() - start
+                with self._cond:
+                    self._busy -= 1
+                    self._service_estimate += EWMA_ALPHA * (elapsed - self._service_estimate)
+                    self._publish_utilisation()
+
+    def _publish_utilisation(self) -> None:
+        metrics.WORKERS_BUSY.set(self._busy)
+        metrics.WORKER_UTILISATION.set(self._busy / self.workers)
+
+    # -- admission --------------------------------------------------------
+    def _jobs_ahead(self, lane: _Lane) -> float:
+        """Jobs the scheduler will start before a job appended to `lane` now."""
+        own = len(lane.queue) + 1
+        ahead = own - 1
+        for other in self._lanes.values():
+            if other is not lane and other.queue:
+                # Other lanes get weight-proportional turns while ours drains
+                ahead += min(len(other.queue), math.ceil(own * other.weight / lane.weight))
+        return ahead
+
+    def _estimate(self, lane: _Lane) -> float:
+        # Queued work spread over the pool, plus on average half a job for a worker to free up
+        in_service = 0.5 if self._busy >= self.workers else 0.0
+        return (self._jobs_ahead(lane) / self.workers + in_service) * self._service_estimate
+
+    def estimated_wait(self, lane_name: str) -> float:
+        with self._cond:
+            return self._estimate(self._lanes[lane_name])
+
+    def submit(self, lane_name: str, fn, *args, **kwargs) -> tuple[Future, float]:
+        """
+        Queues fn(*args, **kwargs) on a lane. Returns (future, estimated_wait_s).
+        Raises AdmissionRejected immediately when the lane is full.
+        """
+        if lane_name not in self._lanes:
+            raise ValueError(f"Unknown lane {lane_name!r}; expected one of {', '.join(LANES)}")
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Admission controller is shut down")
+            self._ensure_workers()
+            lane = self._lanes[lane_name]
+            estimate = self._estimate(lane)
+            if len(lane.queue) >= lane.limit:
+                metrics.ADMISSION_REJECTED.inc(lane=lane_name)
+                # A slot opens after roughly one scheduler turn for this lane
+                retry_after = max(1, math.ceil(self._service_estimate / self.workers))
+                raise AdmissionRejected(lane_name, retry_after, estimate)
+            if not lane.queue:
+                # An idle lane does not bank credit while it has nothing queued
+                lane.vtime = max(lane.vtime, self._vclock)
+            job = _Job(fn, args, kwargs)
+            lane.queue.append(job)
+            metrics.QUEUE_DEPTH.set(len(lane.queue), lane=lane_name)
+            self._cond.notify()
+        return job.future, estimate
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "busy": self._busy,
+                "service_estimate_s": round(self._service_estimate, 3),
+                "lanes": {
+                    name: {
+                        "depth": len(lane.queue),
+                        "limit": lane.limit,
+                        "weight": lane.weight,
+                        "estimated_wait_s": round(self._estimate(lane), 3),
+                    }
+                    for name, lane in self._lanes.items()
+                },
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stops accepting work; queued jobs still run. Optionally joins the workers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
@@ -0,0 +1,117 @@
+"""
+Per-job segmentation and depth artifacts, kept so /remesh can rebuild the
+geometry with new parameters without re-running rembg, SAM or depth.
+
+    ARTIFACT_DIR/<jewelry_id>/grids.npz   raw depth map + full-size alpha
+    ARTIFACT_DIR/<jewelry_id>/meta.json   category, preset, geometry, live GLB name + version
+"""
+import os
+import re
+import json
+import threading
+import numpy as np
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(SERVICE_DIR, "artifacts"))
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_lock = threading.Lock()
+
+
+def job_dir(jewelry_id: str) -> str:
+    if not _ID_RE.match(jewelry_id or ""):
+        raise ValueError(f"Invalid jewelry id {jewelry_id!r}")
+    return os.path.join(ARTIFACT_DIR, jewelry_id)
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def save_arrays(jewelry_id: str, depth: np.ndarray, alpha: np.ndarray) -> None:
+    """
+    Stores a job's depth + alpha. Resets the old meta so a failed job is never
+    remeshed, but carries the version counter forward: a re-upload must not
+    reuse the `_vN.glb` names of the previous geometry.
+    """
+    directory = job_dir(jewelry_id)
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, "meta.json")
+    with _lock:
+        old = _read_meta(meta_path) or {}
+        if old:
+            reserved = max(int(old.get("reserved_version", 0)), int(old.get("version", 1)))
+            # Remeshes of the old geometry still running must not publish over the new upload
+            counter = {"reserved_version": reserved, "min_version": reserved + 1}
+            _write_atomic(meta_path, lambda f: f.write(json.dumps(counter, indent=2).encode("utf-8")))
+        _write_atomic(os.path.join(directory, "grids.npz"),
+                      lambda f: np.savez_compressed(f, depth=depth.astype(np.float32), alpha=alpha.astype(np.uint8)))
+
+
+def write_meta(jewelry_id: str, **fields) -> dict:
+    """Merges `fields` into the job's meta.json. Returns the new meta."""
+    path = os.path.join(job_dir(jewelry_id), "meta.json")
+    with _lock:
+        meta = _read_meta(path) or {}
+        meta.update(fields)
+        _write_atomic(path, lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")))
+    return meta
+
+
+def _read_meta(path: str) -> dict | None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_meta(jewelry_id: str) -> dict | None:
+    """The job's meta.json, or None if it has none."""
+    return _read_meta(os.path.join(job_dir(jewelry_id), "meta.json"))
+
+
+def load(jewelry_id: str) -> tuple[np.ndarray, np.ndarray, dict]:
+    """Returns (depth, alpha, meta). Raises FileNotFoundError if the job left no usable artifacts."""
+    directory = job_dir(jewelry_id)
+    meta = _read_meta(os.path.join(directory, "meta.json"))
+    grids_path = os.path.join(directory, "grids.npz")
+    # A meta without geometry is only the version counter left by save_arrays
+    if meta is None or "geometry" not in meta or not os.path.exists(grids_path):
+        raise FileNotFoundError(f"No artifacts for {jewelry_id}")
+    with np.load(grids_path) as grids:
+        return grids["depth"], grids["alpha"], meta
+
+
+def next_version(jewelry_id: str) -> int:
+    """
+    Reserves the next GLB version number for a remesh. The live version is
+    unchanged until publish_version(), so a failed remesh leaves no gap.
+    """
+    path = os.path.join(job_dir(jewelry_id), "meta.json")
+    with _lock:
+        meta = _read_meta(path)
+        if meta is None or "geometry" not in meta:
+            raise FileNotFoundError(f"No artifacts for {jewelry_id}")
+        meta["reserved_version"] = max(int(meta.get("reserved_version", 0)), int(meta.get("version", 1))) + 1
+        _write_atomic(path, lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")))
+    return meta["reserved_version"]
+
+
+def publish_version(jewelry_id: str, version: int, glb_name: str, **fields) -> bool:
+    """
+    Makes `glb_name` (written as `version`) the live GLB and merges `fields`
+    into meta.json, unless a newer version went live first. Returns whether
+    it was published.
+    """
+    path = os.path.join(job_dir(jewelry_id), "meta.json")
+    with _lock:
+        meta = _read_meta(path)
+        if meta is None or "geometry" not in meta or version < int(meta.get("version", 1)) \
+                or version < int(meta.get("min_version", 0)):
+            return False
+        meta.update(fields, version=version, glb=glb_name)
+        _write_atomic(path, lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")))
+    return True
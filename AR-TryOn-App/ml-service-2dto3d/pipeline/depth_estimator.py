@@ -1,13 +1,24 @@
-from transformers import pipeline
+import copy
+import threading
 from PIL import Image
-import torch
 import numpy as np
 import logging
+from .ingest import decode_bounded
+from .startup import lazy_import
+from . import model_registry
+from . import thread_budget
+
+# torch + transformers take seconds to import; defer to the first model load
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
 
 logger = logging.getLogger("DepthEstimator")
 
 # Global pipe cache to avoid reloading
 _depth_pipe = None
+# Same weights, different input resolution: {input_size: pipeline}
+_sized_pipes = {}
+_sized_lock = threading.Lock()
 
 def get_depth_pipe():
     global _depth_pipe
@@ -15,23 +26,44 @@ def get_depth_pipe():
         try:
             device = "cuda" if torch.cuda.is_available() else "cpu"
             logger.info(f"Loading Depth-Anything model on {device}...")
-            # Using LiheYoung/depth-anything-small-hf as it is stable
-            _depth_pipe = pipeline("depth-estimation", model="LiheYoung/depth-anything-small-hf", device=device)
+            # LiheYoung/depth-anything-small-hf, provisioned locally (safetensors only)
+            model_dir = model_registry.require("depth_anything_small")
+            thread_budget.apply_torch()
+            _depth_pipe = transformers.pipeline("depth-estimation", model=model_dir, device=device,
+                                   model_kwargs={"local_files_only": True})
             logger.info("Depth model loaded successfully.")
         except Exception as e:
             logger.error(f"Failed to load depth model: {e}")
             raise e
     return _depth_pipe
 
-def estimate_depth(image_path: str):
+def get_sized_depth_pipe(input_size: int | None = None):
+    """
+    Depth pipe whose processor resizes to `input_size` (a multiple of 14)
+    instead of the model default. Shares the model weights with get_depth_pipe().
+    """
+    base = get_depth_pipe()
+    if not input_size:
+        return base
+    with _sized_lock:
+        pipe = _sized_pipes.get(input_size)
+        if pipe is None:
+            processor = copy.deepcopy(base.image_processor)
+            processor.size = {"height": input_size, "width": input_size}
+            pipe = transformers.pipeline("depth-estimation", model=base.model, image_processor=processor, device=base.device)
+            _sized_pipes[input_size] = pipe
+        return pipe
+
+def estimate_depth(image_path: str, input_size: int | None = None):
     """
     Estimates depth map from image using Depth Anything model.
+    `input_size` overrides the model input resolution (see presets).
     Returns: (depth_array, rgb_image)
     """
-    pipe = get_depth_pipe()
+    pipe = get_sized_depth_pipe(input_size)
     
     # Load and convert to RGB (Depth model usually expects RGB)
-    image = Image.open(image_path).convert("RGB")
+    image, _ = decode_bounded(image_path, mode="RGB")
     
     # Inference
     try:
@@ -1,5 +1,7 @@
 import os
 import shutil
+from . import glb
+from .mesh import Mesh
 
 # Respect environment setting so exporter and app use the same folder
 OUTPUT_DIR = os.getenv('OUTPUT_DIR', 'output')
@@ -9,13 +11,16 @@ PLACEHOLDER = os.path.join(os.path.dirname(__file__), '..', 'assets', 'templates
 
 def validate_glb_before_callback(path):
     """
-    Ensure the GLB is valid for Three.js:
-    1. File exists
-    2. Size > 5KB (avoids empty headers)
+    Ensure the GLB is valid for Three.js: header, chunk table, JSON,
+    accessor/bufferView ranges, indices and material references
+    (see glb.validate). Returns False with the reason printed.
     """
     if not os.path.exists(path):
         return False
-    if os.path.getsize(path) < 5 * 1024: # 5KB
+    try:
+        glb.validate(path)
+    except (glb.InvalidGLB, OSError) as e:
+        print(f"GLB validation failed for {path}: {e}")
         return False
     return True
 
@@ -26,16 +31,16 @@ def export_glb(mesh, image_id):
     try:
         # Check if the mesh actually has data before exporting
         if mesh is not None and len(mesh.vertices) > 0:
-            # Use appropriate flags for Trimesh export
-            # Some versions of trimesh might not take include_normals in export() if they are embedded in the scene
-            # But the user asked for this flag.
-            mesh.export(glb_path, file_type='glb', include_normals=True)
+            # Pipeline stages hand over a compact Mesh; trimesh objects are converted once
+            if not isinstance(mesh, Mesh):
+                mesh = Mesh.from_trimesh(mesh)
+            mesh.export_glb(glb_path)
         else:
             raise ValueError("Empty visible mesh")
             
         # Validation Gate
         if not validate_glb_before_callback(glb_path):
-             raise ValueError(f"Generated GLB failed validation (too small or missing): {glb_path}")
+             raise ValueError(f"Generated GLB failed validation: {glb_path}")
 
     except Exception as e:
         print(f"Export failed, using dummy fallback: {e}")
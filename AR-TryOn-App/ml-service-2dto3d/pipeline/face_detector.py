@@ -0,0 +1,107 @@
+import os
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import mediapipe as mp
+except ImportError:
+    mp = None
+
+logger = logging.getLogger("FaceDetectorPool")
+
+# One detector per worker thread; MediaPipe graphs are not safe to share across threads
+POOL_SIZE = int(os.getenv("FACE_DETECTOR_POOL_SIZE", os.cpu_count() or 4))
+CHECKOUT_TIMEOUT = float(os.getenv("FACE_DETECTOR_CHECKOUT_TIMEOUT", "5"))
+# Separate cap for /ar/try-on/stream sockets, which hold a detector for their whole lifetime
+STREAM_POOL_SIZE = int(os.getenv("FACE_DETECTOR_STREAM_POOL_SIZE", max(1, (os.cpu_count() or 4) // 2)))
+
+
+class FaceDetectorPool:
+    """
+    Pool of long-lived MediaPipe FaceDetection instances.
+    Graph construction is the expensive part of a detection call, so instances
+    are built once (at startup via warm()) and checked out per request.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, model_selection: int = 1, min_detection_confidence: float = 0.5):
+        self.size = max(1, int(size))
+        self.model_selection = model_selection
+        self.min_detection_confidence = min_detection_confidence
+        self._idle = queue.LifoQueue()  # LIFO keeps recently used (cache-warm) graphs busy
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return mp is not None
+
+    def _create(self):
+        detector = mp.solutions.face_detection.FaceDetection(
+            model_selection=self.model_selection,
+            min_detection_confidence=self.min_detection_confidence,
+        )
+        # First process() call finalises the graph; do it off the request path
+        detector.process(np.zeros((64, 64, 3), dtype=np.uint8))
+        return detector
+
+    def _try_grow(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return self._create()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def warm(self) -> int:
+        """Builds every pool slot up front. Returns the number of detectors created."""
+        if not self.available:
+            logger.warning("MediaPipe not installed; face detector pool disabled.")
+            return 0
+        built = 0
+        while True:
+            detector = self._try_grow()
+            if detector is None:
+                break
+            self._idle.put(detector)
+            built += 1
+        logger.info(f"Face detector pool warmed ({self._created} instances).")
+        return built
+
+    @contextmanager
+    def checkout(self, timeout: float = CHECKOUT_TIMEOUT):
+        """Yields an exclusive detector, growing the pool lazily up to `size`."""
+        if not self.available:
+            raise ImportError("mediapipe is not installed")
+        try:
+            detector = self._idle.get_nowait()
+        except queue.Empty:
+            detector = self._try_grow()
+            if detector is None:
+                try:
+                    detector = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise RuntimeError(f"No face detector free after {timeout:.1f}s (pool size {self.size})")
+        try:
+            yield detector
+        finally:
+            self._idle.put(detector)
+
+    def close(self) -> None:
+        while True:
+            try:
+                detector = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                detector.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
@@ -0,0 +1,174 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from .try_on import detect_faces
+
+# Full-frame detection every N frames even while tracking is healthy
+KEYFRAME_INTERVAL = 15
+# Below this detection score the ROI result is discarded and a keyframe is forced
+MIN_TRACK_CONFIDENCE = 0.6
+# ROI = previous box grown by this fraction on each side
+ROI_PADDING = 0.5
+# ROI crops are downscaled to at most this many pixels on the long side
+ROI_MAX_SIDE = 256
+
+
+class OneEuroFilter:
+    """
+    One-Euro low-pass filter (Casiez et al.) over numpy vectors.
+    Strong smoothing when the signal is still, little lag when it moves fast.
+    """
+
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 0.05, d_cutoff: float = 1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self._x = None
+        self._dx = None
+        self._t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt: float):
+        tau = 1.0 / (2.0 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def reset(self) -> None:
+        self._x = self._dx = self._t = None
+
+    def __call__(self, x, t: float) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        if self._x is None or self._x.shape != x.shape:
+            self._x, self._dx, self._t = x, np.zeros_like(x), t
+            return x
+        dt = max(t - self._t, 1e-3)
+        self._t = t
+
+        a_d = self._alpha(self.d_cutoff, dt)
+        dx = (x - self._x) / dt
+        self._dx = a_d * dx + (1.0 - a_d) * self._dx
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self._dx)
+        a = self._alpha(cutoff, dt)
+        self._x = a * x + (1.0 - a) * self._x
+        return self._x
+
+
+class FaceTracker:
+    """
+    Per-session tracker for the primary (highest scoring) face.
+    Full-frame detection runs on keyframes or when tracking confidence drops;
+    other frames only search a padded, downscaled ROI around the previous box.
+    Box and keypoints are smoothed with a One-Euro filter.
+    """
+
+    def __init__(self, keyframe_interval: int = KEYFRAME_INTERVAL, min_confidence: float = MIN_TRACK_CONFIDENCE,
+                 roi_padding: float = ROI_PADDING, roi_max_side: int = ROI_MAX_SIDE):
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.min_confidence = min_confidence
+        self.roi_padding = roi_padding
+        self.roi_max_side = roi_max_side
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.last_was_keyframe = False
+        self._prev = None
+        self._since_keyframe = 0
+        self._box_filter = OneEuroFilter(min_cutoff=1.0, beta=0.05)
+        self._kp_filter = OneEuroFilter(min_cutoff=1.0, beta=0.05)
+
+    def reset(self) -> None:
+        self._prev = None
+        self._box_filter.reset()
+        self._kp_filter.reset()
+
+    def _roi(self, frame_shape) -> tuple[int, int, int, int]:
+        ih, iw = frame_shape[:2]
+        x, y, w, h = self._prev["box"]
+        pad_w, pad_h = w * self.roi_padding, h * self.roi_padding
+        x0, y0 = max(0, int(x - pad_w)), max(0, int(y - pad_h))
+        x1, y1 = min(iw, int(x + w + pad_w)), min(ih, int(y + h + pad_h))
+        return x0, y0, x1, y1
+
+    def _detect_roi(self, detector, img: np.ndarray) -> list[dict]:
+        x0, y0, x1, y1 = self._roi(img.shape)
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return []
+        crop = img[y0:y1, x0:x1]
+        scale = min(1.0, self.roi_max_side / float(max(crop.shape[:2])))
+        if scale < 1.0:
+            crop = cv2.resize(crop, (max(1, int(crop.shape[1] * scale)), max(1, int(crop.shape[0] * scale))),
+                              interpolation=cv2.INTER_AREA)
+        faces = detect_faces(detector, crop)
+        inv = 1.0 / scale
+        for face in faces:
+            bx, by, bw, bh = face["box"]
+            face["box"] = [int(bx * inv) + x0, int(by * inv) + y0, int(bw * inv), int(bh * inv)]
+            face["keypoints"] = [[kx * inv + x0, ky * inv + y0] for kx, ky in face["keypoints"]]
+        return faces
+
+    def _smooth(self, face: dict, t: float) -> dict:
+        box = self._box_filter(face["box"], t)
+        face = dict(face, box=[int(round(v)) for v in box])
+        if face["keypoints"]:
+            kps = self._kp_filter(face["keypoints"], t)
+            face["keypoints"] = kps.tolist()
+        return face
+
+    def detect(self, detector, img: np.ndarray, t: float | None = None) -> list[dict]:
+        """Returns at most one (smoothed) face for this frame."""
+        t = time.monotonic() if t is None else t
+        self.last_used = time.monotonic()
+
+        faces = []
+        keyframe = self._prev is None or self._since_keyframe >= self.keyframe_interval
+        if not keyframe:
+            faces = self._detect_roi(detector, img)
+            if not faces or max(f["score"] for f in faces) < self.min_confidence:
+                keyframe = True
+        if keyframe:
+            faces = detect_faces(detector, img)
+            self._since_keyframe = 0
+        else:
+            self._since_keyframe += 1
+        self.last_was_keyframe = keyframe
+
+        if not faces:
+            self.reset()
+            return []
+        best = max(faces, key=lambda f: f["score"])
+        if keyframe and self._prev is not None and not _overlaps(best["box"], self._prev["box"]):
+            # Different person / big jump: don't smear the old track into the new one
+            self._box_filter.reset()
+            self._kp_filter.reset()
+        best = self._smooth(best, t)
+        self._prev = best
+        return [best]
+
+
+def _overlaps(a, b) -> bool:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+class TrackerSessions:
+    """Thread-safe LRU of FaceTracker instances keyed by client session id."""
+
+    def __init__(self, max_sessions: int = 1024, idle_timeout: float = 60.0):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> FaceTracker:
+        now = time.monotonic()
+        with self._lock:
+            tracker = self._sessions.pop(session_id, None)
+            if tracker is None or now - tracker.last_used > self.idle_timeout:
+                tracker = FaceTracker()
+            self._sessions[session_id] = tracker
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return tracker
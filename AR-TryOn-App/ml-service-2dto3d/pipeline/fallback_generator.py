@@ -1,8 +1,13 @@
 import os
 import logging
-import trimesh
 import numpy as np
 from .mesh_generator import MeshGenerator
+from .startup import lazy_import
+from . import materials
+from . import glb
+from .mesh import Mesh
+
+trimesh = lazy_import("trimesh")
 
 logger = logging.getLogger("FallbackGenerator")
 
@@ -28,7 +33,7 @@ class FallbackGenerator:
                 # Create a Torus (Ring shape)
                 # major_radius = distance from center to tube center
                 # minor_radius = tube radius
-                mesh = trimesh.creation.torus(major_radius=0.01, minor_radius=0.002, sections=64)
+                mesh = trimesh.creation.torus(major_radius=0.01, minor_radius=0.002, major_sections=64)
                 # Rotate to face Forward (Z) or Up (Y)? 
                 # WebGL usually Y-up. Ring usually lies on logic.
                 # Let's rotate it 90 deg around X to stand up
@@ -36,7 +41,7 @@ class FallbackGenerator:
                 
             elif "necklace" in category or "chain" in category:
                 # Larger Torus
-                mesh = trimesh.creation.torus(major_radius=0.08, minor_radius=0.001, sections=128)
+                mesh = trimesh.creation.torus(major_radius=0.08, minor_radius=0.001, major_sections=128)
                 # Rotate to lie flat or hang?
                 # Usually necklaces are displayed flat or on a bust.
                 # Let's keep it default.
@@ -52,16 +57,12 @@ class FallbackGenerator:
                 # Generic Gem / Sphere
                 mesh = trimesh.creation.icosphere(radius=0.01, subdivisions=4)
 
-            # 2. Add Dummy Color (Gold)
-            # Trimesh visuals are basic, we rely on PBR injection later
-            mesh.visual.vertex_colors = [255, 215, 0, 255] # Gold
-            
-            # 3. Export
-            mesh.export(output_path)
-            
-            # 4. Inject PBR (Reuse logic if possible, or duplicate)
-            # We inject "High Polish Gold" materials
-            FallbackGenerator._inject_pbr(output_path)
+            # 2. Export from the compact arrays, with the same metal finishes
+            # (gold by default) as generated meshes. No vertex colours: COLOR_0
+            # would tint every finish but gold.
+            mesh = Mesh.from_trimesh(mesh)
+            mesh.export_glb(output_path, variants=dict.fromkeys(materials.FINISHES))
+            glb.validate(output_path)
             
             return {
                 "is_fallback": True,
@@ -73,26 +74,3 @@ class FallbackGenerator:
         except Exception as e:
             logger.error(f"Fallback generation also failed: {e}")
             raise e
-
-    @staticmethod
-    def _inject_pbr(glb_path):
-        """Injects highly polished gold PBR material into the GLB."""
-        try:
-            from pygltflib import GLTF2, Material, PbrMetallicRoughness
-            gltf = GLTF2().load(glb_path)
-            if not gltf.materials:
-                 gltf.materials.append(Material())
-            
-            for mat in gltf.materials:
-                if mat.pbrMetallicRoughness is None:
-                    mat.pbrMetallicRoughness = PbrMetallicRoughness()
-                
-                # Polished Gold
-                # Base Color: Gold (Hex #PTD700 roughly) -> [1.0, 0.84, 0.0, 1.0]
-                mat.pbrMetallicRoughness.baseColorFactor = [1.0, 0.84, 0.0, 1.0]
-                mat.pbrMetallicRoughness.metallicFactor = 1.0
-                mat.pbrMetallicRoughness.roughnessFactor = 0.1
-                
-            gltf.save(glb_path)
-        except Exception as e:
-            logger.warning(f"Fallback PBR injection failed: {e}")
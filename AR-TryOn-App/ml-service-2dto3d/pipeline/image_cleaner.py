@@ -1,31 +1,67 @@
-import io
 import os
-import rembg
+import threading
 import numpy as np
 from PIL import Image
+from .ingest import decode_bounded, MAX_WORKING_SIDE
+from .metrics import maybe_stage
+from .startup import lazy_import
+from . import model_registry
+from . import thread_budget
 
-def clean_image(input_path: str) -> str:
+# onnxruntime + rembg load on first use (or during the startup warm-up)
+rembg = lazy_import("rembg")
+
+# rembg's default model. rembg.remove() without a session rebuilds the
+# ONNX session on every call, so every model, this one included, gets a cached one.
+DEFAULT_REMBG_MODEL = "u2net"
+_rembg_sessions = {}
+_rembg_lock = threading.Lock()
+
+def get_rembg_session(model_name: str | None):
+    """Returns a cached rembg session for `model_name` loaded from the local model registry."""
+    model_name = model_name or DEFAULT_REMBG_MODEL
+    with _rembg_lock:
+        session = _rembg_sessions.get(model_name)
+        if session is None:
+            model_registry.require(model_registry.rembg_model_name(model_name))
+            model_registry.configure_rembg()
+            session = _rembg_sessions[model_name] = _new_rembg_session(model_name)
+        return session
+
+def _new_rembg_session(model_name: str):
+    """rembg session whose ONNX Runtime pools follow the thread budget."""
+    for session_class in getattr(getattr(rembg, "sessions", None), "sessions_class", ()):
+        if session_class.name() == model_name:
+            return session_class(model_name, thread_budget.ort_session_options())
+    return rembg.new_session(model_name)
+
+def rembg_kwargs(model_name: str | None) -> dict:
+    session = get_rembg_session(model_name)
+    return {"session": session} if session is not None else {}
+
+def clean_image(input_path: str, ingest_info: dict | None = None, max_side: int = MAX_WORKING_SIDE,
+                timer=None, rembg_model: str | None = None) -> str:
     """
     Removes background using Rembg. 
     Fails HARD if object detection is weak or image is empty.
     Returns path to the cleaned RGBA image.
+    If `ingest_info` is given it is filled with the decode scale factor.
     """
     output_path = input_path.replace('.png', '_cleaned.png')
     
-    # 1. Read Input
-    try:
-        with open(input_path, "rb") as f:
-            input_data = f.read()
-    except IOError:
-        raise ValueError(f"Could not read input file: {input_path}")
+    # 1. Read Input at a bounded working resolution
+    with maybe_stage(timer, "ingest"):
+        working_image, info = decode_bounded(input_path, max_side=max_side)
+    if ingest_info is not None:
+        ingest_info.update(info)
     
     # 2. Background Removal (Rembg)
-    try:
-        # returns bytes
-        result_data = rembg.remove(input_data)
-        image = Image.open(io.BytesIO(result_data)).convert("RGBA")
-    except Exception as e:
-        raise ValueError(f"Rembg execution failed: {str(e)}")
+    with maybe_stage(timer, "clean_rembg"):
+        try:
+            # PIL in -> PIL out, avoids a PNG encode/decode round-trip
+            image = rembg.remove(working_image, **rembg_kwargs(rembg_model)).convert("RGBA")
+        except Exception as e:
+            raise ValueError(f"Rembg execution failed: {str(e)}")
     
     # 3. Validation: Check alpha channel
     alpha = np.array(image)[:, :, 3]
@@ -0,0 +1,358 @@
+import os
+import json
+import math
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from .metrics import CACHE_REQUESTS
+from .startup import lazy_import
+
+trimesh = lazy_import("trimesh")
+
+logger = logging.getLogger("Impostor")
+
+# View grid the atlas is rendered from (degrees). Yaw = head turning left/right.
+ATLAS_YAWS = (-60, -45, -30, -15, 0, 15, 30, 45, 60)
+ATLAS_PITCHES = (-30, -15, 0, 15, 30)
+SPRITE_SIZE = 128
+SUPERSAMPLE = 2
+# Triangles are bucketed by screen bbox span; each bucket is rasterised with one
+# vectorised sweep over its bbox offsets. Anything larger goes triangle by triangle.
+SPAN_BUCKETS = (2, 4, 8, 16, 32)
+
+DEFAULT_COLOR = (212 / 255, 175 / 255, 55 / 255)
+LIGHT_DIR = np.array([0.3, 0.5, 1.0]) / np.linalg.norm([0.3, 0.5, 1.0])
+
+# Real-world width (meters) each category is drawn at, matching the web client's CATEGORY_SCALES
+CATEGORY_WIDTHS = {"necklace": 0.22, "earring": 0.035, "nosepin": 0.008}
+# Ear-to-ear width of an average head, used to convert pixels to meters
+HEAD_WIDTH_M = 0.15
+# Concurrent background atlas renders per process (see AtlasBuilder)
+ATLAS_WORKERS = int(os.getenv("ATLAS_WORKERS", "1"))
+
+
+def _rotation(yaw_deg: float, pitch_deg: float) -> np.ndarray:
+    yaw, pitch = math.radians(yaw_deg), math.radians(pitch_deg)
+    ry = np.array([[math.cos(yaw), 0, math.sin(yaw)], [0, 1, 0], [-math.sin(yaw), 0, math.cos(yaw)]])
+    rx = np.array([[1, 0, 0], [0, math.cos(pitch), -math.sin(pitch)], [0, math.sin(pitch), math.cos(pitch)]])
+    return rx @ ry
+
+
+def _load_geometry(glb_path: str) -> tuple[np.ndarray, np.ndarray, tuple, bool]:
+    mesh = trimesh.load(glb_path, force="mesh", process=False)
+    color = DEFAULT_COLOR
+    material = getattr(mesh.visual, "material", None)
+    factor = getattr(material, "baseColorFactor", None)
+    if factor is not None:
+        factor = np.asarray(factor, dtype=np.float64)
+        color = tuple((factor[:3] / 255.0 if factor.max() > 1.0 else factor[:3]).tolist())
+    closed = bool(mesh.is_watertight and mesh.is_winding_consistent)
+    return np.asarray(mesh.vertices, dtype=np.float64), np.asarray(mesh.faces, dtype=np.int64), color, closed
+
+
+def _rasterise(px: np.ndarray, depth: np.ndarray, faces: np.ndarray, size: int) -> np.ndarray:
+    """
+    Z-buffered triangle rasteriser. Returns an (size, size) int array holding the
+    visible face index per pixel, -1 where empty.
+    """
+    tri = px[faces]                       # (F, 3, 2)
+    tz = depth[faces]                     # (F, 3)
+    x0, y0 = tri[:, 0, 0], tri[:, 0, 1]
+    e1, e2 = tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0]
+    det = e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]
+    ok = np.abs(det) > 1e-12
+    inv_det = np.where(ok, 1.0 / np.where(ok, det, 1.0), 0.0)
+
+    bmin = np.floor(tri.min(axis=1)).astype(np.int64)
+    bmax = np.ceil(tri.max(axis=1)).astype(np.int64)
+    span = (bmax - bmin).max(axis=1)
+
+    cand_pix, cand_z, cand_face = [], [], []
+
+    def emit(idx, sx, sy):
+        # barycentric test at pixel centres for faces idx against sample points (sx, sy)
+        dx, dy = sx + 0.5 - x0[idx], sy + 0.5 - y0[idx]
+        u = (dx * e2[idx, 1] - dy * e2[idx, 0]) * inv_det[idx]
+        v = (e1[idx, 0] * dy - e1[idx, 1] * dx) * inv_det[idx]
+        inside = (u >= 0) & (v >= 0) & (u + v <= 1) & (sx >= 0) & (sy >= 0) & (sx < size) & (sy < size)
+        if not inside.any():
+            return
+        u, v, idx_in = u[inside], v[inside], idx[inside]
+        z = tz[idx_in, 0] + u * (tz[idx_in, 1] - tz[idx_in, 0]) + v * (tz[idx_in, 2] - tz[idx_in, 0])
+        cand_pix.append(sy[inside] * size + sx[inside])
+        cand_z.append(z)
+        cand_face.append(idx_in)
+
+    lower = -1
+    for limit in SPAN_BUCKETS:
+        bucket = np.nonzero(ok & (span > lower) & (span <= limit))[0]
+        lower = limit
+        for oy in range(limit + 1 if len(bucket) else 0):
+            for ox in range(limit + 1):
+                emit(bucket, bmin[bucket, 0] + ox, bmin[bucket, 1] + oy)
+
+    for f in np.nonzero(ok & (span > SPAN_BUCKETS[-1]))[0]:
+        xs = np.arange(max(bmin[f, 0], 0), min(bmax[f, 0] + 1, size))
+        ys = np.arange(max(bmin[f, 1], 0), min(bmax[f, 1] + 1, size))
+        if not len(xs) or not len(ys):
+            continue
+        gx, gy = np.meshgrid(xs, ys)
+        emit(np.full(gx.size, f), gx.ravel(), gy.ravel())
+
+    face_buf = np.full(size * size, -1, dtype=np.int64)
+    if cand_pix:
+        pix = np.concatenate(cand_pix)
+        z = np.concatenate(cand_z)
+        fidx = np.concatenate(cand_face)
+        order = np.lexsort((-z, pix))          # nearest (largest z) first per pixel
+        pix, fidx = pix[order], fidx[order]
+        first = np.ones(len(pix), dtype=bool)
+        first[1:] = pix[1:] != pix[:-1]
+        face_buf[pix[first]] = fidx[first]
+    return face_buf.reshape(size, size)
+
+
+def render_view(vertices: np.ndarray, faces: np.ndarray, radius: float, yaw: float, pitch: float,
+                color=DEFAULT_COLOR, size: int = SPRITE_SIZE, cull_backfaces: bool = False) -> np.ndarray:
+    """
+    Orthographic, flat-shaded metallic render of one view. Returns RGBA uint8.
+    Back faces are skipped when `cull_backfaces` is set (closed, consistently wound meshes only).
+    """
+    hi = size * SUPERSAMPLE
+    v = vertices @ _rotation(yaw, pitch).T
+    tri = v[faces]
+    normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    if cull_backfaces:
+        front = normals[:, 2] > 0
+        faces, normals = faces[front], normals[front]
+
+    px = np.empty((len(v), 2))
+    px[:, 0] = (v[:, 0] / (2 * radius) + 0.5) * hi
+    px[:, 1] = (0.5 - v[:, 1] / (2 * radius)) * hi
+    face_buf = _rasterise(px, v[:, 2], faces, hi)
+
+    normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+    normals *= np.where(normals[:, 2:3] < 0, -1.0, 1.0)   # two-sided: face the camera
+    diffuse = np.clip(normals @ LIGHT_DIR, 0.0, 1.0)
+    half = LIGHT_DIR + np.array([0.0, 0.0, 1.0])
+    half /= np.linalg.norm(half)
+    spec = np.clip(normals @ half, 0.0, 1.0) ** 32
+    shade = np.asarray(color)[None, :] * (0.25 + 0.75 * diffuse[:, None]) + 0.8 * spec[:, None]
+    shade = np.clip(shade, 0.0, 1.0)
+
+    covered = face_buf >= 0
+    rgba = np.zeros((hi, hi, 4), dtype=np.float32)
+    rgba[covered, :3] = shade[face_buf[covered]]
+    rgba[covered, 3] = 1.0
+    # Premultiplied area downsample gives anti-aliased edges
+    rgba = cv2.resize(rgba, (size, size), interpolation=cv2.INTER_AREA)
+    alpha = np.maximum(rgba[:, :, 3:4], 1e-6)
+    rgb = np.where(rgba[:, :, 3:4] > 0, rgba[:, :, :3] / alpha, 0.0)
+    out = np.concatenate([rgb, rgba[:, :, 3:4]], axis=2)
+    return (np.clip(out, 0.0, 1.0) * 255 + 0.5).astype(np.uint8)
+
+
+def atlas_paths(atlas_dir: str, jewelry_id: str) -> tuple[str, str]:
+    return os.path.join(atlas_dir, f"{jewelry_id}_atlas.png"), os.path.join(atlas_dir, f"{jewelry_id}_atlas.json")
+
+
+def build_atlas(glb_path: str, jewelry_id: str, atlas_dir: str) -> dict:
+    """Renders the yaw/pitch view grid of a GLB into an RGBA atlas PNG + JSON metadata."""
+    vertices, faces, color, closed = _load_geometry(glb_path)
+    if not len(faces):
+        raise ValueError(f"No triangles to render in {glb_path}")
+    vertices = vertices - (vertices.min(axis=0) + vertices.max(axis=0)) / 2.0
+    radius = float(np.linalg.norm(vertices, axis=1).max()) * 1.02
+    extents = vertices.max(axis=0) - vertices.min(axis=0)
+
+    rows, cols = len(ATLAS_PITCHES), len(ATLAS_YAWS)
+    atlas = np.zeros((rows * SPRITE_SIZE, cols * SPRITE_SIZE, 4), dtype=np.uint8)
+    for r, pitch in enumerate(ATLAS_PITCHES):
+        for c, yaw in enumerate(ATLAS_YAWS):
+            sprite = render_view(vertices, faces, radius, yaw, pitch, color, cull_backfaces=closed)
+            atlas[r * SPRITE_SIZE:(r + 1) * SPRITE_SIZE, c * SPRITE_SIZE:(c + 1) * SPRITE_SIZE] = sprite
+
+    meta = {
+        "jewelry_id": jewelry_id,
+        "sprite_size": SPRITE_SIZE,
+        "yaws": list(ATLAS_YAWS),
+        "pitches": list(ATLAS_PITCHES),
+        # fraction of the sprite width covered by the model's largest extent
+        "fill": float(extents.max() / (2 * radius)),
+        "source_mtime": os.path.getmtime(glb_path),
+    }
+    os.makedirs(atlas_dir, exist_ok=True)
+    png_path, json_path = atlas_paths(atlas_dir, jewelry_id)
+    # OpenCV writes BGRA
+    cv2.imwrite(png_path, cv2.cvtColor(atlas, cv2.COLOR_RGBA2BGRA))
+    with open(json_path, "w") as f:
+        json.dump(meta, f)
+    logger.info(f"Impostor atlas built for {jewelry_id}: {cols}x{rows} views, {len(faces)} triangles")
+    return meta
+
+
+class AtlasCache:
+    """In-memory cache of decoded atlases keyed by jewelry_id, backed by the atlas directory."""
+
+    def __init__(self, atlas_dir: str, max_items: int = 64):
+        self.atlas_dir = atlas_dir
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, jewelry_id: str) -> None:
+        with self._lock:
+            self._items.pop(jewelry_id, None)
+
+    def get(self, jewelry_id: str):
+        """Returns (atlas_rgba, meta) or None if no atlas exists for this id."""
+        with self._lock:
+            item = self._items.get(jewelry_id)
+            if item is not None:
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache="atlas", result="hit")
+                return item
+        CACHE_REQUESTS.inc(cache="atlas", result="miss")
+        png_path, json_path = atlas_paths(self.atlas_dir, jewelry_id)
+        if not (os.path.exists(png_path) and os.path.exists(json_path)):
+            return None
+        with open(json_path) as f:
+            meta = json.load(f)
+        atlas = cv2.imread(png_path, cv2.IMREAD_UNCHANGED)
+        if atlas is None or atlas.ndim != 3 or atlas.shape[2] != 4:
+            return None
+        item = (cv2.cvtColor(atlas, cv2.COLOR_BGRA2RGBA), meta)
+        with self._lock:
+            self.misses += 1
+            if len(self._items) >= self.max_items:
+                self._items.pop(next(iter(self._items)))
+            self._items[jewelry_id] = item
+        return item
+
+
+class AtlasBuilder:
+    """
+    Background atlas rendering on a fixed pool of `workers` threads. Each
+    jewelry_id has at most one queued build: scheduling it again only swaps
+    in the newer GLB path, and an id is never rendered by two workers at
+    once (a request arriving mid-build queues one rebuild after it).
+    """
+
+    def __init__(self, atlas_dir: str, cache: AtlasCache | None = None, workers: int = ATLAS_WORKERS):
+        self.atlas_dir = atlas_dir
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="atlas")
+        self._lock = threading.Lock()
+        self._pending = {}      # jewelry_id -> newest GLB path not yet picked up
+        self._running = set()
+
+    def schedule(self, jewelry_id: str, glb_path: str) -> bool:
+        """Queues a build. Returns False when it merged into an already queued one."""
+        with self._lock:
+            merged = jewelry_id in self._pending
+            self._pending[jewelry_id] = glb_path
+            submit = not merged and jewelry_id not in self._running
+        if submit:
+            self._pool.submit(self._build, jewelry_id)
+        return not merged
+
+    def _build(self, jewelry_id: str) -> None:
+        with self._lock:
+            glb_path = self._pending.pop(jewelry_id)
+            self._running.add(jewelry_id)
+        try:
+            build_atlas(glb_path, jewelry_id, self.atlas_dir)
+            if self.cache is not None:
+                self.cache.invalidate(jewelry_id)
+        except Exception as e:
+            logger.warning(f"Impostor atlas build failed for {jewelry_id}: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(jewelry_id)
+                again = jewelry_id in self._pending
+            if again:
+                self._pool.submit(self._build, jewelry_id)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"running": len(self._running), "queued": len(self._pending)}
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def estimate_head_pose(face: dict) -> tuple[float, float]:
+    """Coarse (yaw, pitch) in degrees from the six MediaPipe keypoints."""
+    kp = np.asarray(face.get("keypoints") or [], dtype=np.float64)
+    if len(kp) < 6:
+        return 0.0, 0.0
+    right_eye, left_eye, nose, mouth, right_ear, left_ear = kp[:6]
+    ear_mid = (right_ear + left_ear) / 2.0
+    ear_half = max(np.linalg.norm(left_ear - right_ear) / 2.0, 1e-6)
+    yaw = math.degrees(math.asin(float(np.clip((nose[0] - ear_mid[0]) / ear_half, -1.0, 1.0))))
+    eye_mid = (right_eye + left_eye) / 2.0
+    span = max(mouth[1] - eye_mid[1], 1e-6)
+    # Nose sits ~45% of the way from eyes to mouth when facing the camera
+    pitch = float(np.clip(((nose[1] - eye_mid[1]) / span - 0.45) * 120.0, -45.0, 45.0))
+    return yaw, pitch
+
+
+def select_sprite(atlas: np.ndarray, meta: dict, yaw: float, pitch: float) -> np.ndarray:
+    c = int(np.argmin(np.abs(np.asarray(meta["yaws"]) - yaw)))
+    r = int(np.argmin(np.abs(np.asarray(meta["pitches"]) - pitch)))
+    s = meta["sprite_size"]
+    return atlas[r * s:(r + 1) * s, c * s:(c + 1) * s]
+
+
+def composite_sprite(frame: np.ndarray, sprite_rgba: np.ndarray, center, size_px: float, roll: float) -> np.ndarray:
+    """Alpha-blends an RGBA sprite onto a BGR frame in place, centred at `center`, rotated by `roll` radians."""
+    size = int(round(size_px))
+    if size < 2:
+        return frame
+    sprite = cv2.resize(sprite_rgba, (size, size), interpolation=cv2.INTER_AREA if size < sprite_rgba.shape[0] else cv2.INTER_LINEAR)
+    if abs(roll) > 1e-3:
+        rot = cv2.getRotationMatrix2D((size / 2.0, size / 2.0), -math.degrees(roll), 1.0)
+        sprite = cv2.warpAffine(sprite, rot, (size, size), flags=cv2.INTER_LINEAR, borderValue=(0, 0, 0, 0))
+
+    fh, fw = frame.shape[:2]
+    x0, y0 = int(round(center[0] - size / 2.0)), int(round(center[1] - size / 2.0))
+    fx0, fy0, fx1, fy1 = max(x0, 0), max(y0, 0), min(x0 + size, fw), min(y0 + size, fh)
+    if fx0 >= fx1 or fy0 >= fy1:
+        return frame
+    patch = sprite[fy0 - y0:fy1 - y0, fx0 - x0:fx1 - x0].astype(np.float32)
+    alpha = patch[:, :, 3:4] / 255.0
+    roi = frame[fy0:fy1, fx0:fx1].astype(np.float32)
+    roi = roi * (1.0 - alpha) + patch[:, :, 2::-1] * alpha   # RGBA sprite -> BGR frame
+    frame[fy0:fy1, fx0:fx1] = roi.astype(np.uint8)
+    return frame
+
+
+def composite_jewelry(frame: np.ndarray, faces: list[dict], anchors_per_face: list[dict], atlas: np.ndarray,
+                      meta: dict, category: str) -> np.ndarray:
+    """Draws the nearest pre-rendered view at each anchor that applies to `category`."""
+    category = (category or "").lower()
+    width_m = next((w for key, w in CATEGORY_WIDTHS.items() if key in category), 0.05)
+    if "earring" in category:
+        anchor_names = ("right_ear", "left_ear")
+    elif "nose" in category:
+        anchor_names = ("nose",)
+    else:
+        anchor_names = ("neck",)
+
+    for face, anchors in zip(faces, anchors_per_face):
+        yaw, pitch = estimate_head_pose(face)
+        sprite = select_sprite(atlas, meta, yaw, pitch)
+        for name in anchor_names:
+            anchor = anchors.get(name)
+            if anchor is None and name == "nose" and len(face.get("keypoints") or []) > 2:
+                anchor = {"position": face["keypoints"][2], "roll": anchors["neck"]["roll"], "scale": anchors["neck"]["scale"]}
+            if anchor is None:
+                continue
+            px_per_m = anchor["scale"] / HEAD_WIDTH_M
+            size_px = width_m * px_per_m / max(meta.get("fill", 1.0), 1e-3)
+            composite_sprite(frame, sprite, anchor["position"], size_px, anchor["roll"])
+    return frame
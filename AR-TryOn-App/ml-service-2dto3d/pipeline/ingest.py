@@ -0,0 +1,112 @@
+import io
+import logging
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger("Ingest")
+
+# Longest side we ever work at. Everything downstream is resized to 1024 anyway,
+# so decoding a 48 MP photo at full size only costs memory and rembg time.
+MAX_WORKING_SIDE = 2048
+
+# OpenCV can decode JPEGs straight at 1/2, 1/4 or 1/8 scale (DCT-domain scaling)
+_CV_REDUCED_FLAGS = {
+    cv2.IMREAD_COLOR: {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8},
+    cv2.IMREAD_GRAYSCALE: {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8},
+}
+
+
+def _bounded_size(width: int, height: int, max_side: int) -> tuple[int, int]:
+    scale = min(1.0, max_side / float(max(width, height)))
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def decode_bounded(image_path: str, max_side: int = MAX_WORKING_SIDE, mode: str = "RGBA") -> tuple[Image.Image, dict]:
+    """
+    Decodes an image so that its longest side is at most `max_side`.
+    JPEGs are decoded at reduced scale by libjpeg (PIL draft mode) so the full
+    resolution bitmap is never materialised; the remainder is area-resampled.
+    Returns: (image, ingest_info) where ingest_info records the scale factor
+    (working / source) for later stages.
+    """
+    try:
+        image = Image.open(image_path)
+    except Exception as e:
+        raise ValueError(f"Could not decode image {image_path}: {e}")
+
+    src_w, src_h = image.size
+    target_w, target_h = _bounded_size(src_w, src_h, max_side)
+    dct_scaled = False
+
+    if image.format == "JPEG" and (target_w, target_h) != (src_w, src_h):
+        # draft() picks the largest 1/2, 1/4, 1/8 reduction that stays >= target
+        image.draft("RGB", (target_w, target_h))
+        dct_scaled = image.size != (src_w, src_h)
+
+    image = image.convert(mode)
+
+    if image.size != (target_w, target_h):
+        # BOX == area averaging, the right filter for pure downscaling
+        image = image.resize((target_w, target_h), Image.BOX)
+
+    info = {
+        "source_size": [src_w, src_h],
+        "working_size": [target_w, target_h],
+        "scale": target_w / float(src_w),
+        "dct_scaled": dct_scaled,
+    }
+    if info["scale"] < 1.0:
+        logger.info(f"Ingest: {src_w}x{src_h} -> {target_w}x{target_h} (scale {info['scale']:.3f}, dct={dct_scaled})")
+    return image, info
+
+
+def reduced_factor(width: int, height: int, max_side: int) -> int:
+    """Largest power-of-two reduction (<= 8) that keeps the longest side >= max_side."""
+    factor = 1
+    while factor < 8 and max(width, height) / (factor * 2) >= max_side:
+        factor *= 2
+    return factor
+
+
+def imdecode_bounded(data, max_side: int = MAX_WORKING_SIDE, flags: int = cv2.IMREAD_COLOR) -> tuple[np.ndarray, float]:
+    """
+    OpenCV counterpart of decode_bounded for encoded bytes.
+    Uses IMREAD_REDUCED_* where the flag allows it, then INTER_AREA resizing.
+    Returns: (array, scale)
+    """
+    data = bytes(data)
+    buf = np.frombuffer(data, np.uint8)
+    factor = 1
+    reduced = _CV_REDUCED_FLAGS.get(flags)
+    if reduced:
+        try:
+            # PIL only parses the header here; BytesIO shares the bytes object
+            with Image.open(io.BytesIO(data)) as probe:
+                src_w = probe.size[0]
+                factor = reduced_factor(probe.size[0], probe.size[1], max_side)
+        except Exception:
+            factor = 1
+
+    img = cv2.imdecode(buf, reduced[factor] if factor > 1 else flags)
+    if img is None:
+        raise ValueError("Could not decode image bytes")
+    if factor == 1:
+        src_w = img.shape[1]
+
+    h, w = img.shape[:2]
+    if max(w, h) > max_side:
+        new_w, new_h = _bounded_size(w, h, max_side)
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    return img, img.shape[1] / float(src_w)
+
+
+def imread_bounded(image_path: str, max_side: int = MAX_WORKING_SIDE, flags: int = cv2.IMREAD_COLOR) -> tuple[np.ndarray, float]:
+    """Reads a file with imdecode_bounded. Returns (array, scale) or raises ValueError."""
+    try:
+        with open(image_path, "rb") as f:
+            data = f.read()
+    except IOError:
+        raise ValueError(f"Could not read image: {image_path}")
+    return imdecode_bounded(data, max_side, flags)
+
@@ -0,0 +1,142 @@
+"""
+Metal finishes as KHR_materials_variants: one geometry buffer, one material
+per finish, switchable in the viewer. Variants are added or patched by
+rewriting the GLB JSON chunk only (see glb.rewrite_json).
+"""
+import copy
+import logging
+from . import glb
+
+logger = logging.getLogger("Materials")
+
+EXTENSION = "KHR_materials_variants"
+
+# pbrMetallicRoughness per finish; "gold" is the finish the pipeline always exported
+FINISHES = {
+    "gold": {"baseColorFactor": [212 / 255, 175 / 255, 55 / 255, 1.0], "metallicFactor": 1.0, "roughnessFactor": 0.2},
+    "rose-gold": {"baseColorFactor": [0.92, 0.64, 0.55, 1.0], "metallicFactor": 1.0, "roughnessFactor": 0.22},
+    "silver": {"baseColorFactor": [0.97, 0.96, 0.92, 1.0], "metallicFactor": 1.0, "roughnessFactor": 0.15},
+    "platinum": {"baseColorFactor": [0.84, 0.82, 0.79, 1.0], "metallicFactor": 1.0, "roughnessFactor": 0.18},
+}
+DEFAULT_FINISH = "gold"
+_PBR_KEYS = ("baseColorFactor", "metallicFactor", "roughnessFactor")
+
+
+def _pbr(name: str, overrides: dict | None, base: dict | None = None) -> dict:
+    """
+    `base` (the preset values for a known finish when None) updated with
+    `overrides`. Raises ValueError if invalid.
+    """
+    pbr = copy.deepcopy(FINISHES.get(name, {}) if base is None else base)
+    for key, value in (overrides or {}).items():
+        if key not in _PBR_KEYS:
+            raise ValueError(f"Unknown material field {key!r}; expected one of {', '.join(_PBR_KEYS)}")
+        if key == "baseColorFactor":
+            if len(value) not in (3, 4) or not all(0.0 <= float(c) <= 1.0 for c in value):
+                raise ValueError("baseColorFactor must be 3 or 4 values in [0, 1]")
+            value = [float(c) for c in value] + ([1.0] if len(value) == 3 else [])
+        elif not 0.0 <= float(value) <= 1.0:
+            raise ValueError(f"{key} must be in [0, 1]")
+        else:
+            value = float(value)
+        pbr[key] = value
+    if "baseColorFactor" not in pbr:
+        raise ValueError(f"Variant {name!r} is not a preset finish; give its baseColorFactor")
+    return pbr
+
+
+def apply_variants(gltf: dict, variants: dict, default: str | None = None) -> dict:
+    """
+    Adds or patches `variants` ({name: pbr overrides or None}) on every mesh
+    primitive of `gltf` and makes `default` the material shown without a
+    variant selection (the currently shown variant is kept when `default` is
+    None). Overrides for an existing variant are merged into its current
+    material; new variants start from their preset. Existing variants not
+    named are kept. Returns gltf.
+    """
+    materials = gltf.setdefault("materials", [])
+    ext = gltf.setdefault("extensions", {}).setdefault(EXTENSION, {"variants": []})
+    names = [v["name"] for v in ext["variants"]]
+    # Material index per variant, from the existing mappings of the first primitive that has them
+    variant_material, current_default = {}, None
+    for mesh in gltf.get("meshes", []):
+        for prim in mesh.get("primitives", []):
+            for mapping in prim.get("extensions", {}).get(EXTENSION, {}).get("mappings", []):
+                for v in mapping["variants"]:
+                    variant_material.setdefault(names[v], mapping["material"])
+                    if mapping["material"] == prim.get("material") and current_default is None:
+                        current_default = names[v]
+
+    for name, overrides in variants.items():
+        if name in variant_material:
+            material = materials[variant_material[name]]
+            material["pbrMetallicRoughness"] = _pbr(name, overrides, material.get("pbrMetallicRoughness", {}))
+        else:
+            pbr = _pbr(name, overrides)
+            if name not in names:
+                names.append(name)
+                ext["variants"].append({"name": name})
+            variant_material[name] = len(materials)
+            materials.append({"name": name, "pbrMetallicRoughness": pbr})
+
+    default = default or current_default or (DEFAULT_FINISH if DEFAULT_FINISH in variant_material else names[0])
+    if default not in variant_material:
+        raise ValueError(f"Default variant {default!r} is not defined")
+
+    mappings = [{"material": variant_material[name], "variants": [names.index(name)]} for name in names]
+    for mesh in gltf.get("meshes", []):
+        for prim in mesh.get("primitives", []):
+            prim["material"] = variant_material[default]
+            prim.setdefault("extensions", {})[EXTENSION] = {"mappings": copy.deepcopy(mappings)}
+
+    _drop_unused_materials(gltf)
+    used = gltf.setdefault("extensionsUsed", [])
+    if EXTENSION not in used:
+        used.append(EXTENSION)
+    return gltf
+
+
+def _drop_unused_materials(gltf: dict) -> None:
+    """Removes materials no primitive or variant mapping references (e.g. the exporter's own)."""
+    prims = [p for m in gltf.get("meshes", []) for p in m.get("primitives", [])]
+    used = set()
+    for prim in prims:
+        if "material" in prim:
+            used.add(prim["material"])
+        used.update(m["material"] for m in prim.get("extensions", {}).get(EXTENSION, {}).get("mappings", []))
+    materials = gltf.get("materials", [])
+    if len(used) == len(materials):
+        return
+    remap = {old: new for new, old in enumerate(sorted(used))}
+    gltf["materials"] = [materials[i] for i in sorted(used)]
+    for prim in prims:
+        if "material" in prim:
+            prim["material"] = remap[prim["material"]]
+        for mapping in prim.get("extensions", {}).get(EXTENSION, {}).get("mappings", []):
+            mapping["material"] = remap[mapping["material"]]
+
+
+def list_variants(gltf: dict) -> dict:
+    """{"variants": {name: pbrMetallicRoughness}, "default": name or None}."""
+    names = [v["name"] for v in gltf.get("extensions", {}).get(EXTENSION, {}).get("variants", [])]
+    materials = gltf.get("materials", [])
+    result, default = {}, None
+    for mesh in gltf.get("meshes", []):
+        for prim in mesh.get("primitives", []):
+            for mapping in prim.get("extensions", {}).get(EXTENSION, {}).get("mappings", []):
+                for v in mapping["variants"]:
+                    result.setdefault(names[v], materials[mapping["material"]].get("pbrMetallicRoughness", {}))
+                    if mapping["material"] == prim.get("material") and default is None:
+                        default = names[v]
+    return {"variants": result, "default": default}
+
+
+def write_variants(glb_path: str, variants: dict | None = None, default: str | None = None) -> dict:
+    """
+    Adds/patches variants in a GLB file (all preset finishes when `variants`
+    is None). Only the JSON chunk is rewritten. Returns list_variants().
+    """
+    gltf, _ = glb.read_json(glb_path)
+    apply_variants(gltf, variants if variants is not None else dict.fromkeys(FINISHES), default)
+    glb.rewrite_json(glb_path, gltf)
+    return list_variants(gltf)
@@ -0,0 +1,212 @@
+"""
+Compact triangle mesh handed between pipeline stages: float32 vertices and
+normals, uint32 faces, optional per-vertex attributes, `__slots__` and no
+cached properties. Stages convert to trimesh only where an algorithm needs
+it (quadric decimation, primitive creation) and write GLB / OBJ straight
+from the arrays; indices are narrowed to uint16 in the file when they fit.
+"""
+import numpy as np
+from .startup import lazy_import
+from . import glb
+from . import materials
+
+trimesh = lazy_import("trimesh")
+
+_FLOAT = 5126
+_INDEX_TYPES = {np.dtype(np.uint16): 5123, np.dtype(np.uint32): 5125}
+_TYPES = {1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4"}
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+
+
+def index_dtype(vertex_count: int) -> np.dtype:
+    """uint16 when every index fits (65535 is reserved as glTF's restart value), else uint32."""
+    return np.dtype(np.uint16) if vertex_count <= 65535 else np.dtype(np.uint32)
+
+
+def boundary_edges(faces: np.ndarray, vertex_count: int) -> np.ndarray:
+    """Directed edges (as wound in their face) that belong to exactly one face."""
+    edges = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    low, high = np.minimum(edges[:, 0], edges[:, 1]), np.maximum(edges[:, 0], edges[:, 1])
+    keys = low.astype(np.int64) * vertex_count + high
+    _, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    return edges[first[counts == 1]]
+
+
+class Mesh:
+    """Triangle mesh as flat arrays. `attributes` maps glTF attribute names (e.g. COLOR_0) to per-vertex arrays."""
+
+    __slots__ = ("vertices", "faces", "normals", "attributes")
+
+    def __init__(self, vertices, faces, normals=None, attributes: dict | None = None):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.faces = np.ascontiguousarray(faces, dtype=np.uint32).reshape(-1, 3)
+        self.normals = None if normals is None else np.ascontiguousarray(normals, dtype=np.float32).reshape(-1, 3)
+        self.attributes = {name: np.ascontiguousarray(values) for name, values in (attributes or {}).items()}
+
+    def __repr__(self) -> str:
+        return f"<Mesh {len(self.vertices)} vertices, {len(self.faces)} faces, {self.nbytes / 1e6:.2f} MB>"
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.vertices, self.faces, self.normals, *self.attributes.values()]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    # ------------------------------------------------------------------
+    # trimesh interop
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_trimesh(cls, mesh: "trimesh.Trimesh") -> "Mesh":
+        return cls(mesh.vertices, mesh.faces)
+
+    def to_trimesh(self, process: bool = False) -> "trimesh.Trimesh":
+        return trimesh.Trimesh(vertices=self.vertices, faces=self.faces, process=process)
+
+    # ------------------------------------------------------------------
+    # Geometry (float64 accumulation, results in place or as small arrays)
+    # ------------------------------------------------------------------
+    def _triangles(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        v = self.vertices
+        return v[self.faces[:, 0]], v[self.faces[:, 1]], v[self.faces[:, 2]]
+
+    def bounds(self) -> np.ndarray:
+        # Reducing a transposed copy is ~10x faster than axis=0 on (N, 3)
+        columns = np.ascontiguousarray(self.vertices.T)
+        return np.array([columns.min(axis=1), columns.max(axis=1)], dtype=np.float64)
+
+    def extents(self) -> np.ndarray:
+        low, high = self.bounds()
+        return high - low
+
+    def centroid(self) -> np.ndarray:
+        """Area-weighted mean of the triangle centroids (what trimesh.Trimesh.centroid returns)."""
+        a, b, c = self._triangles()
+        areas = np.linalg.norm(np.cross(b - a, c - a).astype(np.float64), axis=1)
+        centers = (a.astype(np.float64) + b + c) / 3.0
+        return areas @ centers / areas.sum()
+
+    def volume(self) -> float:
+        """Signed volume; negative when a closed mesh is wound inside-out."""
+        a, b, c = self._triangles()
+        return float(np.einsum("ij,ij->", a.astype(np.float64), np.cross(b, c).astype(np.float64)) / 6.0)
+
+    def compute_normals(self) -> "Mesh":
+        """Area-weighted vertex normals."""
+        a, b, c = self._triangles()
+        face_normals = np.cross(b - a, c - a)
+        n = len(self.vertices)
+        flat = self.faces.ravel()
+        normals = np.column_stack([np.bincount(flat, np.repeat(face_normals[:, k], 3), minlength=n) for k in range(3)])
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals /= np.where(length > 0, length, 1.0)
+        self.normals = normals.astype(np.float32)
+        return self
+
+    def boundary_edges(self) -> np.ndarray:
+        return boundary_edges(self.faces, len(self.vertices))
+
+    def remove_unreferenced(self) -> "Mesh":
+        used = np.unique(self.faces)
+        if len(used) == len(self.vertices):
+            return self
+        remap = np.zeros(len(self.vertices), dtype=np.uint32)
+        remap[used] = np.arange(len(used), dtype=np.uint32)
+        self.faces = remap[self.faces]
+        self.vertices = self.vertices[used]
+        if self.normals is not None:
+            self.normals = self.normals[used]
+        self.attributes = {name: values[used] for name, values in self.attributes.items()}
+        return self
+
+    def mirror_x(self, axis: float) -> "Mesh":
+        """
+        This half plus its mirror image across the plane x = `axis`. Vertices
+        lying exactly on the plane are shared, which stitches the seam; the
+        mirrored faces are the original index buffer gathered through a
+        remap table and reversed, so both halves wind the same way.
+        """
+        n = len(self.vertices)
+        on_axis = self.vertices[:, 0] == np.float32(axis)
+        off_axis = np.nonzero(~on_axis)[0]
+        remap = np.arange(n, dtype=np.uint32)
+        remap[off_axis] = n + np.arange(len(off_axis), dtype=np.uint32)
+        mirrored = self.vertices[off_axis]
+        mirrored[:, 0] = np.float32(2.0 * axis) - mirrored[:, 0]
+        return Mesh(np.concatenate([self.vertices, mirrored]),
+                    np.concatenate([self.faces, remap[self.faces[:, ::-1]]]))
+
+    def invert(self) -> "Mesh":
+        self.faces = np.ascontiguousarray(self.faces[:, ::-1])
+        if self.normals is not None:
+            self.normals *= -1.0
+        return self
+
+    def apply_translation(self, offset) -> "Mesh":
+        self.vertices += np.asarray(offset, dtype=np.float32)
+        return self
+
+    def apply_scale(self, factor: float) -> "Mesh":
+        self.vertices *= np.float32(factor)
+        return self
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+    def export_glb(self, path: str, material: dict | None = None, variants: dict | None = None) -> int:
+        """
+        Writes a single-primitive GLB: indices (uint16 when they fit), POSITION
+        with min/max, NORMAL (computed if missing) and the extra attributes.
+        `material` is a glTF material ({"pbrMetallicRoughness": ...}); with
+        `variants` (see materials.apply_variants) the finishes are declared
+        in the same write. Returns the file size.
+        """
+        if self.normals is None:
+            self.compute_normals()
+        indices = self.faces.ravel()
+        if index_dtype(len(self.vertices)) != indices.dtype:
+            indices = indices.astype(index_dtype(len(self.vertices)))
+        arrays = [(indices, _ELEMENT_ARRAY_BUFFER), (self.vertices, _ARRAY_BUFFER), (self.normals, _ARRAY_BUFFER)]
+        arrays += [(values if values.dtype in (np.uint8, np.float32) else values.astype(np.float32), _ARRAY_BUFFER)
+                   for values in self.attributes.values()]
+
+        views, accessors, offset = [], [], 0
+        for i, (data, target) in enumerate(arrays):
+            views.append({"buffer": 0, "byteOffset": offset, "byteLength": data.nbytes, "target": target})
+            components = 1 if data.ndim == 1 else data.shape[1]
+            accessor = {"bufferView": i, "componentType": _INDEX_TYPES.get(data.dtype, _FLOAT),
+                        "count": len(data), "type": _TYPES[components]}
+            if data.dtype == np.uint8:
+                accessor.update(componentType=5121, normalized=True)
+            accessors.append(accessor)
+            offset += data.nbytes + (-data.nbytes % 4)
+        low, high = self.bounds()
+        # float32 values round-trip exactly through float64 JSON numbers
+        accessors[1]["min"], accessors[1]["max"] = low.tolist(), high.tolist()
+
+        primitive = {"attributes": {"POSITION": 1, "NORMAL": 2}, "indices": 0, "mode": 4}
+        primitive["attributes"].update({name: 3 + i for i, name in enumerate(self.attributes)})
+        gltf = {
+            "asset": {"version": "2.0", "generator": "ar-tryon ml-service"},
+            "scene": 0,
+            "scenes": [{"nodes": [0]}],
+            "nodes": [{"mesh": 0}],
+            "meshes": [{"primitives": [primitive]}],
+            "accessors": accessors,
+            "bufferViews": views,
+            "buffers": [{"byteLength": offset}],
+        }
+        if material is not None:
+            gltf["materials"] = [material]
+            primitive["material"] = 0
+        if variants is not None:
+            materials.apply_variants(gltf, variants)
+
+        return glb.write(path, gltf, [memoryview(data).cast("B") for data, _ in arrays])
+
+    def export_obj(self, path: str, color_attribute: str = "COLOR_0") -> None:
+        """Wavefront OBJ; `color_attribute` (float RGB in [0, 1]) is written as `v x y z r g b`."""
+        colors = self.attributes.get(color_attribute)
+        columns = self.vertices if colors is None else np.hstack([self.vertices, colors[:, :3].astype(np.float32)])
+        with open(path, "w") as f:
+            np.savetxt(f, columns, fmt="v" + " %.6f" * columns.shape[1])
+            np.savetxt(f, self.faces.astype(np.int64) + 1, fmt="f %d %d %d")
@@ -2,19 +2,52 @@ import os
 import io
 import logging
 import numpy as np
-import open3d as o3d
 import cv2
-import trimesh
-from rembg import remove as rembg_remove
 from PIL import Image
-from trimesh.visual.material import PBRMaterial
-from scipy.ndimage import gaussian_filter
+from .startup import lazy_import
 from .depth_estimator import estimate_depth
 from .validator import SegmentationValidator
+from .metrics import StageTimer, maybe_stage
+from .stage_graph import StageGraph
+from .presets import get_preset
+from .image_cleaner import rembg_kwargs
+from . import artifacts
+from . import materials
+from . import glb
+from .mesh import Mesh
+
+# Heavy libraries load on first use (or during the startup warm-up)
+trimesh = lazy_import("trimesh")
+rembg = lazy_import("rembg")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("MeshGenerator")
 
+# Smallest heightmap grid a preset may ask for
+MIN_GRID_RESOLUTION = 64
+MAX_GRID_RESOLUTION = 512
+
+# Opt-in mirror symmetry (see detect_mirror_axis): the left half is meshed and
+# mirrored only when the mirrored silhouette overlaps itself and the mirrored
+# depth correlates at least this well, AND the residual is pure edge aliasing:
+# no silhouette difference survives a 3x3 erosion (a one-sided clasp or bail
+# does) and no interior depth cell differs by more than SYMMETRY_DEPTH_TOL of
+# the normalised relief. Axis candidates lie within SYMMETRY_SEARCH of the
+# silhouette width from its centre.
+SYMMETRY_MASK_MIN = 0.99
+SYMMETRY_DEPTH_MIN = 0.98
+SYMMETRY_DEPTH_TOL = 0.02
+SYMMETRY_SEARCH = 0.15
+
+# Geometry constants, overridable per job through /remesh
+#   relief_max       front relief depth before scaling
+#   thickness        back offset (solidify)
+#   max_extent       largest dimension of the final mesh, meters
+#   alpha_threshold  alpha above which a grid cell is solid
+DEFAULT_GEOMETRY = {"relief_max": 0.02, "thickness": 0.005, "max_extent": 0.15, "alpha_threshold": 230}
+GEOMETRY_LIMITS = {"relief_max": (0.001, 0.2), "thickness": (0.0005, 0.05), "max_extent": (0.01, 1.0),
+                   "alpha_threshold": (1, 254)}
+
 class MeshGenerator:
     """
     Production-grade Geometric Lifting Kernel.
@@ -31,294 +64,416 @@ class MeshGenerator:
         self.validator = SegmentationValidator()
         logger.info("MeshGenerator initialized.")
 
-    def generate_mesh(self, input_image_path: str, output_path: str, category: str = "necklace", resolution: int = 256) -> dict:
+    def generate_mesh(self, input_image_path: str, output_path: str, category: str = "necklace", resolution: int | None = None,
+                      timer: StageTimer | None = None, preset: dict | None = None, geometry: dict | None = None,
+                      artifact_id: str | None = None) -> dict:
         """
         Returns metrics dict on success, raises Exception on fail.
+        Stage timings are recorded on `timer` when given. `preset` (see
+        presets.get_preset) picks models and resolutions; `resolution`
+        overrides its grid size. With `artifact_id` the depth and alpha
+        are persisted for remesh().
         """
-        logger.info(f"Starting pipeline for: {input_image_path} [Category: {category}]")
-        
-        # 1. Validation (Fail Hard)
-        try:
-            self.validator.validate_mask(input_image_path)
-        except Exception as e:
-            raise ValueError(f"Pipeline Validation Failed: {e}")
-            
-        # 2. Depth Estimation
-        depth_array, rgb_image = estimate_depth(input_image_path)
-        
-        # Metrics
-        depth_conf = float(np.std(depth_array))
+        preset = preset or get_preset(None)
+        resolution = resolution or preset["grid_resolution"]
+        geometry = geometry_params(geometry)
+        logger.info(f"Starting pipeline for: {input_image_path} [Category: {category}, preset: {preset['name']}]")
 
-        # 3. Background removal using rembg -> get alpha mask
-        try:
-            with open(input_image_path, 'rb') as f:
-                input_bytes = f.read()
-            result_bytes = rembg_remove(input_bytes)
-            img_nobg = Image.open(io.BytesIO(result_bytes)).convert('RGBA')
-        except Exception as e:
-            raise RuntimeError(f"Background removal failed: {e}")
-
-        # Convert to numpy
-        rgba_full = np.array(img_nobg)
-        alpha_full = rgba_full[:, :, 3]
-
-        # 4. Convert depth and mask to fixed-resolution grid
-        # Force high resolution for geometry quality
-        res = max(int(resolution), 256) 
-
-        depth_np = np.array(depth_array)
-        # Resize to resolution x resolution
-        depth_res = cv2.resize(depth_np.astype(np.float32), (res, res), interpolation=cv2.INTER_LINEAR)
-        alpha_res = cv2.resize(alpha_full, (res, res), interpolation=cv2.INTER_NEAREST)
-
-        # Depth normalization
-        try:
-            dmin, dmax = np.percentile(depth_res, [1.0, 99.0])
-        except Exception:
-            dmin, dmax = float(depth_res.min()), float(depth_res.max())
-
-        if dmax - dmin < 1e-6:
-            depth_norm = np.zeros_like(depth_res)
-        else:
-            # Clip to percentile range then normalize
-            depth_clipped = np.clip(depth_res, dmin, dmax)
-            depth_norm = (depth_clipped - dmin) / (dmax - dmin)
-
-        # Apply light Gaussian blur to smooth noisy depth
-        try:
-            # Use SCIPY Gaussian Filter per instruction for better smoothing
-            depth_norm = gaussian_filter(depth_norm, sigma=1)
-        except Exception:
+        def validate():
+            # 1. Validation (Fail Hard): the cheap geometric checks gate the model stages
             try:
-                depth_norm = cv2.GaussianBlur(depth_norm, (5, 5), 0)
-            except: pass
+                return self.validator.check_geometry(input_image_path, timer=timer)
+            except Exception as e:
+                raise ValueError(f"Pipeline Validation Failed: {e}")
 
-        # Map normalized depth to small relief (meters)
-        # We start flat-ish because we will extrude
-        relief_max = 0.02 
-        z_grid = depth_norm * relief_max
-
-        # Alpha cleanup
-        try:
-            kernel = np.ones((3, 3), np.uint8)
-            alpha_clean = cv2.morphologyEx((alpha_res > 127).astype(np.uint8), cv2.MORPH_OPEN, kernel)
-        except Exception:
-            alpha_clean = (alpha_res > 127).astype(np.uint8)
-
-        # Determine valid pixels
-        # STRICT CONFIDENCE MASK: Alpha > 0.9 (approx 230/255)
-        # Using alpha_res (which is 0-255)
-        valid_mask = alpha_res > 230
-        
-        # Also ensure depth > 0 to avoid zero-depth artifacts
-        valid_mask = valid_mask & (depth_norm > 1e-4)
+        def confirm(checked):
+            # SAM confirmation of ambiguous masks overlaps depth + rembg
+            if checked is None:
+                return False
+            try:
+                return self.validator.confirm(*checked, timer=timer, use_sam=preset["use_sam"])
+            except Exception as e:
+                raise ValueError(f"Pipeline Validation Failed: {e}")
 
-        if valid_mask.sum() == 0:
-            raise ValueError("No foreground pixels after background removal")
+        # Depth and background removal only need the cleaned image, so they run
+        # concurrently once the geometric checks pass (a clearly bad mask never
+        # pays for either model); meshing joins on depth + alpha + confirmation.
+        graph = StageGraph()
+        graph.add("validate", validate, timed=False)
+        graph.add("confirm", confirm, deps=("validate",), timed=False)
+        # 2. Depth Estimation
+        graph.add("depth", lambda _checked: estimate_depth(input_image_path, input_size=preset["depth_size"])[0],
+                  deps=("validate",))
+        # 3. Background removal using rembg -> get alpha mask (clean_image's pass is "clean_rembg")
+        graph.add("rembg_alpha", lambda _checked: remove_background(input_image_path, preset["rembg_model"]),
+                  deps=("validate",))
+        if artifact_id:
+            # Kept for /remesh; runs alongside meshing and never fails the job
+            graph.add("persist", lambda depth, alpha: persist_grids(artifact_id, depth, alpha),
+                      deps=("depth", "rembg_alpha"))
+        # 4. Heightmap surface from depth + alpha
+        # (only the left half when the product is mirror-symmetric)
+        graph.add("meshing", lambda _valid, depth, alpha: surface_from_grids(
+                      depth, alpha, resolution, preset["decimate_faces"], geometry, preset["symmetry"]),
+                  deps=("confirm", "depth", "rembg_alpha"))
+        # 5. Add Physical Thickness (Root Cause 2), mirror a symmetric half + center/scale (Root Cause 4)
+        graph.add("solidify", lambda meshing: solidify(meshing[0], geometry["thickness"], geometry["max_extent"],
+                                                       meshing[1]["mirror_x"]),
+                  deps=("meshing",))
+        # 6. Material + Export
+        graph.add("export", lambda solid: export_mesh(solid, output_path), deps=("solidify",))
+        results = graph.run(timer)
 
-        # Create vertices for the grid
-        xs = np.linspace(-0.5, 0.5, res)
-        ys = np.linspace(-0.5, 0.5, res) # Note: Y logic might need flip if image coordinates are Y-down
-        # In 3D, usually Y is up. Image is Y down. Let's map image Y to -Y in 3D.
-        
-        xv, yv = np.meshgrid(xs, ys)
-        
-        # We only keep vertices where alpha > threshold
-        # To create a proper mesh, we can create a full grid and then remove faces, or keep points.
-        # But for 'extrude', trimesh usually expects a polygon. 
-        # Since we have heightmap data (relief), we are effectively making a displacement map.
-        
-        # Approach: Create points, triangulation, then extrude? 
-        # Trimesh 'extrude' works on 2D Path/Polygon.
-        # We have 3D relief. 
-        # The user instruction `mesh = mesh.extrude(0.005)` implies `mesh` is a surface (Trimesh object).
-        # So first we build the surface mesh from the heightmap.
-        
-        # Build Quad Mesh
-        rows, cols = res, res
-        
-        # Vertices: (N, 3)
-        # Flatten
-        flat_x = xv.flatten()
-        flat_y = -yv.flatten() # Flip Y to match image upright
-        flat_z = z_grid.flatten()
-        
-        vertices = np.column_stack((flat_x, flat_y, flat_z))
-        
-        # Valid vertices mask
-        flat_mask = valid_mask.flatten()
-        
-        # We will create faces only for valid quads
-        faces = []
-        for r in range(rows - 1):
-            for c in range(cols - 1):
-                if valid_mask[r, c] and valid_mask[r, c+1] and valid_mask[r+1, c] and valid_mask[r+1, c+1]:
-                    # Indices
-                    i = r * cols + c
-                    i_right = i + 1
-                    i_down = i + cols
-                    i_down_right = i_down + 1
-                    
-                    # Two triangles
-                    faces.append([i, i_right, i_down])
-                    faces.append([i_right, i_down_right, i_down])
-        
-        if not faces:
-            raise ValueError("Could not generate any faces from the mask.")
-            
-        faces = np.array(faces)
-        
-        # Create surface mesh
-        surface_mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=True)
-        
-        # Clean up unreferenced vertices (masked out ones)
-        surface_mesh.remove_unreferenced_vertices()
-        
-        # Check Vertex Count (Root Cause 1)
-        if len(surface_mesh.vertices) < 1000:
-             raise ValueError(f"Mesh geometry too simple ({len(surface_mesh.vertices)} vertices). Resolution increase required.")
-
-        # Add Physical Thickness (Root Cause 2)
-        # Extrude the surface. Using trimesh's extrude for a mesh? 
-        # trimesh.Trimesh doesn't have .extrude() that behaves like "thicken".
-        # The user might be thinking of "extrude_polygon" or a custom operation.
-        # However, for a heightmap mesh, we can "extrude" by duplicating vertices and stitching edges.
-        # OR we can assume the user wants `mesh.extrude` if they used a Path2D.
-        # Given we have a 3D surface, we need to "solidify" it.
-        # Let's simple duplicate the mesh, offset it, and stitch boundaries.
-        
-        # Calculate thickness vector (negative Z)
-        thickness = 0.005 # 5mm
-        
-        # Helper to solidify
-        # Front face is surface_mesh. Back face is offset.
-        # But we need to flip back face normals.
-        
-        front = surface_mesh.copy()
-        back = surface_mesh.copy()
-        
-        # Offset back
-        back.vertices[:, 2] -= thickness
-        # Flip normals of back
-        back.faces = np.fliplr(back.faces)
-        
-        # Combine
-        solid_mesh = trimesh.util.concatenate([front, back])
-        
-        # Stitch edges? This is complex for arbitrary meshes. 
-        # But since we built it from a grid, boundaries are predictable?
-        # A simpler way ensuring watertightness is to rely on validation or specialized solidify algos.
-        # BUT, the user specifically asked for "mesh = mesh.extrude(0.005)".
-        # Wait, if `mesh` was a Path2D, `extrude` works. 
-        # If the user is instructing `mesh.extrude`, and `mesh` is a Trimesh... 
-        # Trimesh (the library) does not have `extrude` on the Trimesh object itself in standard versions.
-        # IT DOES HAVE `trimesh.creation.extrude_polygon`.
-        
-        # ALTERNATIVE: Use the polygon extraction logic which allows true extrusion.
-        # Extract contours -> Polygon -> Extrude.
-        # This loses interior depth relief (detail) but guarantees a solid block.
-        # The prompt says: "Jewelry cannot be a 2D plane. Use trimesh to extrude...".
-        # If we keep the surface relief, we must stitch.
-        # Let's try to preserve relief if possible, but reliability is key.
-        # "Reconstructed meshes do not have valid UV maps. DO NOT EXPORT TEXTURES."
-        
-        # Let's use the solidify approach (Front + Back + Side strip)
-        # Getting naked edges (boundary)
-        start_edges = surface_mesh.edges_unique
-        # This is expensive/complex.
-        
-        # Let's Pivot to the "Contours" approach if relief is not strictly required or if we can map relief later.
-        # But "Depth Estimation" step implies relief is wanted.
-        # Let's just output the FRONT surface for now, but with BackFACE culling disabled?
-        # No, "paper-thin" is the complaint.
-        
-        # Let's try to assume `trimesh` might have a way or I implement a simple stitcher.
-        # Actually, for the sake of the "Invisible" problem, a double-sided mesh is often enough?
-        # "Extruding the mesh gives it sides... making it visible from all angles".
-        
-        # I will implement a robust "Solidify" logic.
-        # 1. Front Mesh
-        # 2. Back Mesh (offset Z)
-        # 3. Find boundary edges of Front.
-        # 4. Create quads connecting Front boundary to Back boundary.
-        
-        # Find boundary edges: edges used only once.
-        unique_edges = surface_mesh.edges_sorted.reshape(-1)
-        # Count occurrences
-        counts = np.bincount(unique_edges) # checks vertices? No.
-        
-        # Use trimesh's built-in
-        boundary_edges = surface_mesh.edges[trimesh.grouping.group_rows(surface_mesh.edges_sorted, require_count=1)]
-        
-        # Create side faces
-        n_verts = len(surface_mesh.vertices)
-        side_faces = []
-        for e in boundary_edges:
-            # e has [i1, i2]
-            # corresponding back vertices are [i1+n, i2+n]
-            # ordering for normal Out:
-            # We want side wall.
-            # Triangle 1: i1, i2, i2+n
-            # Triangle 2: i1, i2+n, i1+n
-            # Check winding order? Usually CCW.
-            i1, i2 = e
-            side_faces.append([i1, i2, i2 + n_verts])
-            side_faces.append([i1, i2 + n_verts, i1 + n_verts])
-            
-            # Note: winding might need check based on edge direction. 
-            # `boundary_edges` might not be ordered.
-            
-        side_faces = np.array(side_faces)
-        
-        # Combine everything
-        full_vertices = np.vstack([surface_mesh.vertices, back.vertices])
-        full_faces = np.vstack([surface_mesh.faces, back.faces + n_verts, side_faces])
-        
-        solid_mesh = trimesh.Trimesh(vertices=full_vertices, faces=full_faces, process=True)
-        # Fix normals
-        solid_mesh.fix_normals()
-        
-        # Root Cause 4: Center and Normalize Scale
-        solid_mesh.apply_translation(-solid_mesh.centroid)
-        # Scale to max dim 0.15 (15cm)
-        max_limit = 0.15
-        current_max = np.max(solid_mesh.extents)
-        if current_max > 0:
-            scale_fac = max_limit / current_max
-            solid_mesh.apply_scale(scale_fac)
-            
-        # Root Cause 3: Fix Material & UV Logic
-        # Assign PBR Material directly
-        # Note: trimesh.visual.material.PBRMaterial might be stripped on export if not supported by exporter or format.
-        # But we will set it.
-        
-        try:
-             # Luxury Gold
-             gold_mat = PBRMaterial(
-                baseColorFactor=[212/255, 175/255, 55/255, 1.0],
-                metallicFactor=1.0,
-                roughnessFactor=0.2
-             )
-             solid_mesh.visual.material = gold_mat
-        except Exception:
-             logger.warning("Could not create PBRMaterial object. Proceeding without explicit PBR object.")
-             # Fallback: Vertex colors? No, user says "DO NOT EXPORT TEXTURES".
-             # If we can't set PBR, we leave it blank, and maybe injecting later or relying on default.
-             pass
-
-        # Export
-        logger.info(f"Exporting solid mesh ({len(solid_mesh.vertices)} vertices) to {output_path}")
-        
-        # Ensure directory
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        solid_mesh.export(output_path, file_type='glb', include_normals=True)
+        solid_mesh = results["solidify"]
+        # Metrics
+        depth_conf = float(np.std(results["depth"]))
         
         return {
             'vertices': len(solid_mesh.vertices),
             'faces': len(solid_mesh.faces),
-            'depth_confidence': depth_conf
+            'depth_confidence': depth_conf,
+            'preset': preset['name'],
+            'grid_resolution': resolution,
+            'geometry': geometry,
+            'symmetry': results["meshing"][1],
+            'artifacts_saved': results.get("persist", False)
         }
 
+
+def persist_grids(artifact_id: str, depth: np.ndarray, alpha: np.ndarray) -> bool:
+    """artifacts.save_arrays that logs instead of raising. Returns whether the grids were stored."""
+    try:
+        artifacts.save_arrays(artifact_id, depth, alpha)
+        return True
+    except Exception as e:
+        logger.warning(f"Remesh artifacts not saved for {artifact_id}: {e}")
+        return False
+
+
+def geometry_params(overrides: dict | None = None) -> dict:
+    """DEFAULT_GEOMETRY with `overrides` applied (None values ignored). Raises ValueError when out of range."""
+    geometry = dict(DEFAULT_GEOMETRY)
+    for key, value in (overrides or {}).items():
+        if value is None:
+            continue
+        if key not in GEOMETRY_LIMITS:
+            raise ValueError(f"Unknown geometry parameter {key!r}; expected one of {', '.join(GEOMETRY_LIMITS)}")
+        low, high = GEOMETRY_LIMITS[key]
+        if not low <= value <= high:
+            raise ValueError(f"{key}={value} outside [{low}, {high}]")
+        geometry[key] = int(value) if key == "alpha_threshold" else float(value)
+    return geometry
+
+
+def surface_from_grids(depth, alpha: np.ndarray, resolution: int, decimate_faces: int | None = None,
+                       geometry: dict | None = None, symmetry: bool = False) -> tuple[Mesh, dict]:
+    """
+    Relief surface from a depth map + alpha (meshing stage). With `symmetry`
+    a mirror-symmetric product yields only its left half; the returned info
+    ({"symmetric", "mirror_x"} plus detect_mirror_axis's scores) carries the
+    plane solidify() mirrors it across.
+    """
+    geometry = geometry or DEFAULT_GEOMETRY
+    depth_norm, alpha_res = prepare_grids(depth, alpha, resolution)
+    info = {"symmetric": False, "mirror_x": None}
+    min_vertices = 1000
+    if symmetry:
+        info.update(detect_mirror_axis(depth_norm, alpha_res, geometry["alpha_threshold"]))
+        if info["symmetric"]:
+            depth_norm, alpha_res, column = symmetrize_grids(depth_norm, alpha_res, info["axis"])
+            info["mirror_x"] = float(grid_coordinates(alpha_res.shape[1])[column])
+            min_vertices //= 2
+    surface = build_surface(depth_norm, alpha_res, relief_max=geometry["relief_max"],
+                            alpha_threshold=geometry["alpha_threshold"], min_vertices=min_vertices)
+    if info["mirror_x"] is not None and decimate_faces and len(surface.faces) > decimate_faces // 2:
+        # Decimation may move seam vertices off the plane, so it runs on the whole surface
+        surface = surface.mirror_x(info["mirror_x"])
+        info["mirror_x"] = None
+    return decimate_surface(surface, decimate_faces), info
+
+
+def detect_mirror_axis(depth_norm: np.ndarray, alpha_res: np.ndarray, alpha_threshold: int = 230) -> dict:
+    """
+    Finds the vertical mirror axis of the silhouette. For every candidate axis
+    a/2 (in half-column steps) the row-wise self-convolution sum_c f(c) f(a - c)
+    gives, in one FFT pass, the mirrored overlap of the mask (mask_score, 1.0 =
+    identical halves) and the correlation of the mean-free depth with its
+    mirror image (depth_score). The best axis is then checked cell by cell
+    (mask_residual, depth_residual; see SYMMETRY_DEPTH_TOL). Returns the axis,
+    the scores and whether all of them pass.
+    """
+    valid = (alpha_res > alpha_threshold) & (depth_norm > 1e-4)
+    area = int(valid.sum())
+    if area == 0:
+        return {"symmetric": False, "axis": None, "mask_score": 0.0, "depth_score": 0.0}
+    cols = valid.shape[1]
+    centered = np.where(valid, depth_norm - depth_norm[valid].mean(), 0.0)
+    spectra = np.fft.rfft(np.stack([valid.astype(np.float64), centered]), n=2 * cols, axis=2)
+    overlap, depth_corr = np.fft.irfft(spectra * spectra, n=2 * cols, axis=2).sum(axis=1)
+
+    columns = np.nonzero(valid.any(axis=0))[0]
+    center, width = columns[0] + columns[-1], columns[-1] - columns[0] + 1
+    reach = max(1, int(SYMMETRY_SEARCH * 2 * width))
+    candidates = np.arange(max(center - reach, 0), min(center + reach, 2 * cols - 2) + 1)
+    a = int(candidates[np.argmax(overlap[candidates])])
+    mask_score = float(overlap[a] / area)
+    energy = float((centered ** 2).sum())
+    depth_score = float(depth_corr[a] / energy) if energy > 1e-12 else 1.0
+
+    # Column c mirrors onto a - c; cells mirrored from outside the grid count as empty
+    source = a - np.arange(cols)
+    inside = (source >= 0) & (source < cols)
+    mirrored_valid = np.zeros_like(valid)
+    mirrored_valid[:, inside] = valid[:, source[inside]]
+    mirrored_depth = np.zeros_like(depth_norm)
+    mirrored_depth[:, inside] = depth_norm[:, source[inside]]
+    kernel = np.ones((3, 3), np.uint8)
+    mask_residual = int(np.count_nonzero(cv2.erode((valid ^ mirrored_valid).astype(np.uint8), kernel)))
+    interior = cv2.erode((valid & mirrored_valid).astype(np.uint8), kernel).astype(bool)
+    depth_residual = float(np.abs(depth_norm - mirrored_depth)[interior].max()) if interior.any() else 0.0
+    return {
+        "symmetric": (mask_score >= SYMMETRY_MASK_MIN and depth_score >= SYMMETRY_DEPTH_MIN
+                      and mask_residual == 0 and depth_residual <= SYMMETRY_DEPTH_TOL),
+        "axis": a / 2.0,
+        "mask_score": round(mask_score, 4),
+        "depth_score": round(depth_score, 4),
+        "mask_residual": mask_residual,
+        "depth_residual": round(depth_residual, 4),
+    }
+
+
+def symmetrize_grids(depth_norm: np.ndarray, alpha_res: np.ndarray, axis: float) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Merges both grids with their mirror image across `axis` (a column index,
+    possibly half-integer): depth is averaged, alpha takes the maximum so no
+    solid cell is lost. Only the columns up to the axis are kept, so
+    build_surface meshes one half. A half-integer axis is first moved onto a
+    column by resampling half a column. Returns (depth, alpha, axis column).
+    """
+    if axis != int(axis):
+        depth_norm = np.concatenate([(depth_norm[:, :-1] + depth_norm[:, 1:]) / 2, depth_norm[:, -1:]], axis=1)
+        alpha_res = np.concatenate([np.maximum(alpha_res[:, :-1], alpha_res[:, 1:]), alpha_res[:, -1:]], axis=1)
+    column = int(axis)
+    reach = min(column, alpha_res.shape[1] - 1 - column)
+    left = np.arange(column - reach, column + 1)
+    right = 2 * column - left
+    depth_half = np.zeros_like(depth_norm)
+    alpha_half = np.zeros_like(alpha_res)
+    depth_half[:, left] = (depth_norm[:, left] + depth_norm[:, right]) / 2
+    alpha_half[:, left] = np.maximum(alpha_res[:, left], alpha_res[:, right])
+    return depth_half, alpha_half, column
+
+
+def remesh(depth, alpha: np.ndarray, output_path: str, resolution: int, decimate_faces: int | None = None,
+           geometry: dict | None = None, timer: StageTimer | None = None, symmetry: bool = False) -> dict:
+    """
+    Re-runs meshing, solidify and export on stored depth + alpha with new
+    geometry parameters. No model runs here.
+    """
+    geometry = geometry_params(geometry)
+    resolution = min(max(int(resolution), MIN_GRID_RESOLUTION), MAX_GRID_RESOLUTION)
+    with maybe_stage(timer, "meshing"):
+        surface, symmetry_info = surface_from_grids(depth, alpha, resolution, decimate_faces, geometry, symmetry)
+    with maybe_stage(timer, "solidify"):
+        solid_mesh = solidify(surface, geometry["thickness"], geometry["max_extent"], symmetry_info["mirror_x"])
+    with maybe_stage(timer, "export"):
+        export_mesh(solid_mesh, output_path)
+    return {
+        'vertices': len(solid_mesh.vertices),
+        'faces': len(solid_mesh.faces),
+        'grid_resolution': resolution,
+        'geometry': geometry,
+        'symmetry': symmetry_info
+    }
+
+
+def remove_background(image_path: str, rembg_model: str | None = None) -> np.ndarray:
+    """Runs rembg on the image and returns its alpha channel (uint8, full size)."""
+    try:
+        with open(image_path, 'rb') as f:
+            input_bytes = f.read()
+        result_bytes = rembg.remove(input_bytes, **rembg_kwargs(rembg_model))
+        img_nobg = Image.open(io.BytesIO(result_bytes)).convert('RGBA')
+    except Exception as e:
+        raise RuntimeError(f"Background removal failed: {e}")
+    return np.array(img_nobg)[:, :, 3]
+
+
+def prepare_grids(depth_array, alpha_full: np.ndarray, resolution: int = 256) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Resamples depth and alpha onto a square grid.
+    Returns (depth_norm in [0, 1], alpha_res uint8).
+    """
+    # Presets choose the grid; below this the relief is too coarse to read
+    res = max(int(resolution), MIN_GRID_RESOLUTION)
+
+    depth_np = np.array(depth_array)
+    # Resize to resolution x resolution
+    depth_res = cv2.resize(depth_np.astype(np.float32), (res, res), interpolation=cv2.INTER_LINEAR)
+    alpha_res = cv2.resize(alpha_full, (res, res), interpolation=cv2.INTER_NEAREST)
+
+    # Depth normalization
+    try:
+        dmin, dmax = np.percentile(depth_res, [1.0, 99.0])
+    except Exception:
+        dmin, dmax = float(depth_res.min()), float(depth_res.max())
+
+    if dmax - dmin < 1e-6:
+        depth_norm = np.zeros_like(depth_res)
+    else:
+        # Clip to percentile range then normalize
+        depth_clipped = np.clip(depth_res, dmin, dmax)
+        depth_norm = (depth_clipped - dmin) / (dmax - dmin)
+
+    # Apply light Gaussian blur to smooth noisy depth
+    try:
+        # Use SCIPY Gaussian Filter per instruction for better smoothing
+        from scipy.ndimage import gaussian_filter
+        depth_norm = gaussian_filter(depth_norm, sigma=1)
+    except Exception:
+        try:
+            depth_norm = cv2.GaussianBlur(depth_norm, (5, 5), 0)
+        except: pass
+
+    return depth_norm, alpha_res
+
+
+def grid_coordinates(count: int) -> np.ndarray:
+    """Grid line positions along one axis of the unit heightmap square."""
+    return np.linspace(-0.5, 0.5, count, dtype=np.float32)
+
+
+def build_surface(depth_norm: np.ndarray, alpha_res: np.ndarray, relief_max: float = 0.02,
+                  alpha_threshold: int = 230, min_vertices: int = 1000) -> Mesh:
+    """Builds the front relief surface: one quad per fully valid grid cell."""
+    rows, cols = depth_norm.shape
+
+    # Determine valid pixels
+    # STRICT CONFIDENCE MASK: Alpha > 0.9 (approx 230/255)
+    # Also ensure depth > 0 to avoid zero-depth artifacts
+    valid_mask = (alpha_res > alpha_threshold) & (depth_norm > 1e-4)
+
+    if not valid_mask.any():
+        raise ValueError("No foreground pixels after background removal")
+
+    # Faces only for quads whose four corners are valid, two triangles each
+    cells = valid_mask[:-1, :-1] & valid_mask[:-1, 1:] & valid_mask[1:, :-1] & valid_mask[1:, 1:]
+    r, c = np.nonzero(cells)
+    if not len(r):
+        raise ValueError("Could not generate any faces from the mask.")
+    i = (r * cols + c).astype(np.uint32)
+    faces = np.empty((2 * len(i), 3), dtype=np.uint32)
+    faces[0::2] = np.column_stack([i, i + 1, i + cols])
+    faces[1::2] = np.column_stack([i + 1, i + cols + 1, i + cols])
+
+    # Only the grid points the faces use become vertices (row-major order)
+    used = np.unique(faces)
+    remap = np.zeros(rows * cols, dtype=np.uint32)
+    remap[used] = np.arange(len(used), dtype=np.uint32)
+
+    # In 3D, usually Y is up. Image is Y down. Let's map image Y to -Y in 3D.
+    # Map normalized depth to small relief (meters); we start flat-ish because we will extrude
+    xs, ys = grid_coordinates(cols), grid_coordinates(rows)
+    vertices = np.empty((len(used), 3), dtype=np.float32)
+    vertices[:, 0] = xs[used % cols]
+    vertices[:, 1] = -ys[used // cols]
+    vertices[:, 2] = depth_norm.ravel()[used] * relief_max
+    surface_mesh = Mesh(vertices, remap[faces])
+
+    # Check Vertex Count (Root Cause 1)
+    if len(surface_mesh.vertices) < min_vertices:
+         raise ValueError(f"Mesh geometry too simple ({len(surface_mesh.vertices)} vertices). Resolution increase required.")
+
+    return surface_mesh
+
+
+def decimate_surface(surface_mesh: Mesh, target_faces: int | None) -> Mesh:
+    """
+    Quadric-decimates the relief surface to about `target_faces` before it is
+    solidified. Skipped when no target is set or no simplification backend
+    (fast-simplification) is installed.
+    """
+    if not target_faces or len(surface_mesh.faces) <= target_faces:
+        return surface_mesh
+    try:
+        simplified = Mesh.from_trimesh(
+            surface_mesh.to_trimesh().simplify_quadric_decimation(face_count=int(target_faces)))
+    except Exception as e:
+        logger.warning(f"Decimation skipped ({e}).")
+        return surface_mesh
+    logger.info(f"Decimated surface {len(surface_mesh.faces)} -> {len(simplified.faces)} faces")
+    return simplified
+
+
+def solidify(surface_mesh: Mesh, thickness: float = 0.005, max_limit: float = 0.15,
+             mirror_x: float | None = None) -> Mesh:
+    """
+    Gives the relief surface physical thickness (Root Cause 2):
+    front surface + back surface offset by `thickness` in -Z + side walls
+    stitched along the boundary edges. With `mirror_x` the surface is one
+    half of a symmetric product: no wall is built on the seam at x = mirror_x
+    and the solid half is mirrored across it. Then centers and scales the
+    result so its largest extent is `max_limit` meters (Root Cause 4).
+    """
+    n_verts, n_faces = len(surface_mesh.vertices), len(surface_mesh.faces)
+
+    # Back face is the front offset in -Z with flipped winding
+    vertices = np.empty((2 * n_verts, 3), dtype=np.float32)
+    vertices[:n_verts] = surface_mesh.vertices
+    vertices[n_verts:] = surface_mesh.vertices
+    vertices[n_verts:, 2] -= thickness
+
+    # Side faces: boundary edge [i1, i2] -> back vertices [i1+n, i2+n].
+    # Boundary edges keep their face direction, so walking each one as
+    # i2 -> i1 makes the walls wind consistently with front and back.
+    boundary_edges = surface_mesh.boundary_edges()
+    if mirror_x is not None:
+        # Seam edges lie on the mirror plane; the mirrored half closes them
+        on_seam = surface_mesh.vertices[:, 0] == np.float32(mirror_x)
+        boundary_edges = boundary_edges[~(on_seam[boundary_edges[:, 0]] & on_seam[boundary_edges[:, 1]])]
+    i1, i2 = boundary_edges[:, 0], boundary_edges[:, 1]
+    n_walls = len(boundary_edges)
+    faces = np.empty((2 * n_faces + 2 * n_walls, 3), dtype=np.uint32)
+    faces[:n_faces] = surface_mesh.faces
+    faces[n_faces:2 * n_faces] = surface_mesh.faces[:, ::-1] + np.uint32(n_verts)
+    walls = faces[2 * n_faces:]
+    walls[:n_walls, 0], walls[:n_walls, 1], walls[:n_walls, 2] = i1, i2 + n_verts, i2
+    walls[n_walls:, 0], walls[n_walls:, 1], walls[n_walls:, 2] = i1, i1 + n_verts, i2 + n_verts
+
+    solid_mesh = Mesh(vertices, faces)
+    if mirror_x is not None:
+        solid_mesh = solid_mesh.mirror_x(mirror_x)
+    # Winding is consistent by construction; only the global orientation can be inside-out
+    if solid_mesh.volume() < 0:
+        solid_mesh.invert()
+
+    # Root Cause 4: Center and Normalize Scale
+    solid_mesh.apply_translation(-solid_mesh.centroid())
+    # Scale to max dim 0.15 (15cm)
+    current_max = np.max(solid_mesh.extents())
+    if current_max > 0:
+        scale_fac = max_limit / current_max
+        solid_mesh.apply_scale(scale_fac)
+
+    return solid_mesh
+
+
+def export_mesh(solid_mesh: Mesh, output_path: str) -> None:
+    """
+    Writes a GLB with every metal finish as a KHR_materials_variants variant
+    (gold shown by default). Raises glb.InvalidGLB if the written file is broken.
+    """
+    # Root Cause 3: Fix Material & UV Logic
+    # "Reconstructed meshes do not have valid UV maps. DO NOT EXPORT TEXTURES."
+    # Export
+    logger.info(f"Exporting solid mesh ({len(solid_mesh.vertices)} vertices) to {output_path}")
+    
+    # Ensure directory
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    
+    solid_mesh.export_glb(output_path, variants=dict.fromkeys(materials.FINISHES))
+    # Structural gate: a GLB that would fail in the browser raises here (and the job falls back)
+    glb.validate(output_path)
+
 if __name__ == "__main__":
     pass
@@ -0,0 +1,187 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Seconds. Covers ~1 ms try-on blits up to multi-minute CPU pipeline runs.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_str(self.label_names, key)} {value:.6g}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, count) in items:
+            for bound, c in zip(self.buckets, counts):
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_label_str(self.label_names, key, le)} {c}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_label_str(self.label_names, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_label_str(self.label_names, key)} {total:.6g}")
+            lines.append(f"{self.name}_count{_label_str(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "pipeline_stage_seconds", "Wall time per 2D-to-3D pipeline stage", labels=("stage", "preset")))
+STAGE_FAILURES = REGISTRY.register(Counter(
+    "pipeline_stage_failures_total", "Pipeline stages that raised", labels=("stage",)))
+JOBS_TOTAL = REGISTRY.register(Counter(
+    "pipeline_jobs_total", "Finished pipeline jobs by outcome and preset", labels=("outcome", "preset")))
+FALLBACKS = REGISTRY.register(Counter(
+    "pipeline_fallbacks_total", "Jobs served by FallbackGenerator, by failing stage", labels=("reason",)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result", labels=("cache", "result")))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "pipeline_queue_depth", "Jobs accepted but not yet started", labels=("lane",)))
+VALIDATION_PATH = REGISTRY.register(Counter(
+    "validation_decisions_total", "How validate_mask reached its verdict", labels=("path",)))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "pipeline_admission_rejected_total", "Jobs rejected with 429 because their lane was full", labels=("lane",)))
+WORKERS_BUSY = REGISTRY.register(Gauge(
+    "pipeline_workers_busy", "Pipeline jobs currently executing"))
+WORKER_UTILISATION = REGISTRY.register(Gauge(
+    "pipeline_worker_utilisation", "Busy pipeline workers / pipeline worker capacity"))
+TRYON_SECONDS = REGISTRY.register(Histogram(
+    "tryon_stage_seconds", "Wall time per try-on frame stage", labels=("stage",)))
+
+
+class StageTimer:
+    """
+    Times named pipeline stages into STAGE_SECONDS and keeps the per-job
+    breakdown (ms) for the callback metrics. Remembers which stage raised.
+    """
+
+    def __init__(self, preset: str = ""):
+        self.preset = preset
+        self.timings_ms = {}
+        self.failed_stage = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            if self.failed_stage is None:
+                self.failed_stage = name
+            STAGE_FAILURES.inc(stage=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            STAGE_SECONDS.observe(elapsed, stage=name, preset=self.preset)
+            self.timings_ms[name] = round(self.timings_ms.get(name, 0.0) + elapsed * 1000.0, 2)
+
+
+@contextmanager
+def maybe_stage(timer, name: str):
+    """`timer.stage(name)` when a timer is given, otherwise a no-op."""
+    if timer is None:
+        yield
+    else:
+        with timer.stage(name):
+            yield
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,377 @@
+"""
+Offline model registry.
+
+Models are listed in model_manifest.json and fetched once with
+
+    python -m pipeline.model_registry provision [name ...]
+
+which downloads, verifies and records every file (size + sha256) in
+MODEL_DIR/registry.lock.json. At runtime loaders call require(), which only
+reads local files; nothing touches the network unless MODEL_ALLOW_DOWNLOAD=1.
+
+Every manifest entry must be pinned (a sha256 per file, and a commit sha as
+the revision of Hugging Face snapshots) or provisioning refuses to lock it,
+so every replica locks the same weights. New entries are pinned once, from a
+trusted network, with
+
+    python -m pipeline.model_registry pin name
+
+which provisions the entry unpinned and writes the digests back into the
+manifest for review and commit.
+"""
+import os
+import sys
+import json
+import re
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+import urllib.request
+
+logger = logging.getLogger("ModelRegistry")
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.path.abspath(os.getenv("MODEL_DIR", os.path.join(SERVICE_DIR, "models")))
+MANIFEST_PATH = os.getenv("MODEL_MANIFEST", os.path.join(SERVICE_DIR, "model_manifest.json"))
+LOCK_PATH = os.path.join(MODEL_DIR, "registry.lock.json")
+# Dev convenience only: provision missing models on first use
+ALLOW_DOWNLOAD = os.getenv("MODEL_ALLOW_DOWNLOAD", "").lower() in ("1", "true", "yes")
+# Escape hatch for provisioning entries that have no pinned digests (trust on first use)
+ALLOW_UNPINNED = os.getenv("MODEL_ALLOW_UNPINNED", "").lower() in ("1", "true", "yes")
+# size: compare file sizes with the lock (cheap, default); full: re-hash; off: existence only
+VERIFY_MODE = os.getenv("MODEL_VERIFY", "size").lower()
+
+_lock = threading.Lock()
+_manifest = None
+_verified = set()
+_COMMIT_RE = re.compile(r"^[0-9a-f]{40}$")
+
+
+class ModelNotProvisioned(RuntimeError):
+    def __init__(self, name: str, detail: str):
+        super().__init__(f"Model '{name}' is not provisioned ({detail}). "
+                         f"Run `python -m pipeline.model_registry provision {name}`.")
+        self.name = name
+
+
+class ModelNotPinned(ValueError):
+    def __init__(self, name: str, detail: str):
+        super().__init__(f"Model '{name}' is not pinned ({detail}). Pin it with "
+                         f"`python -m pipeline.model_registry pin {name}` or set MODEL_ALLOW_UNPINNED=1.")
+        self.name = name
+
+
+def load_manifest() -> dict:
+    global _manifest
+    if _manifest is None:
+        with open(MANIFEST_PATH) as f:
+            _manifest = json.load(f)
+    return _manifest
+
+
+def _entry(name: str) -> dict:
+    manifest = load_manifest()
+    if name not in manifest:
+        raise KeyError(f"Unknown model '{name}'; known: {', '.join(manifest)}")
+    return manifest[name]
+
+
+def local_path(name: str) -> str:
+    return os.path.join(MODEL_DIR, _entry(name)["path"])
+
+
+def _read_lock() -> dict:
+    try:
+        with open(LOCK_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_lock(data: dict) -> None:
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    tmp = LOCK_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, LOCK_PATH)
+
+
+def file_digest(path: str, algo: str = "sha256") -> str:
+    h = hashlib.new(algo)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _check_pinned(path: str, checksum: str | None) -> None:
+    """Verifies a manifest checksum of the form 'algo:hex' (md5, sha256, ...)."""
+    if not checksum:
+        return
+    algo, expected = checksum.split(":", 1)
+    actual = file_digest(path, algo)
+    if actual != expected:
+        raise ValueError(f"Checksum mismatch for {path}: expected {checksum}, got {algo}:{actual}")
+
+
+def _unpinned(entry: dict) -> list[str]:
+    """What keeps a manifest entry from being reproducible; empty when fully pinned."""
+    if entry["kind"] == "hf_snapshot":
+        problems = []
+        if not _COMMIT_RE.match(entry.get("revision") or ""):
+            problems.append(f"revision {entry.get('revision')!r} is not a commit sha")
+        if not entry.get("files"):
+            problems.append("no per-file sha256")
+        return problems
+    return [] if entry.get("sha256") else ["no sha256"]
+
+
+def _check_snapshot(name: str, root: str, files: dict) -> None:
+    """Verifies a snapshot directory holds exactly the pinned files."""
+    present = {os.path.relpath(f, root) for f in _files_of(name)}
+    if present != set(files):
+        raise ValueError(f"Snapshot of {name} has files {sorted(present ^ set(files))} not matching the manifest")
+    for rel, digest in files.items():
+        _check_pinned(os.path.join(root, rel), f"sha256:{digest}")
+
+
+def _files_of(name: str) -> list[str]:
+    """Absolute paths of every file a provisioned model consists of."""
+    root = local_path(name)
+    if os.path.isdir(root):
+        return sorted(os.path.join(dp, f) for dp, _, fs in os.walk(root) for f in fs
+                      if not os.path.relpath(os.path.join(dp, f), root).startswith("."))
+    entry = _entry(name)
+    files = [root] if os.path.exists(root) else []
+    if entry.get("safetensors"):
+        converted = os.path.join(MODEL_DIR, entry["safetensors"])
+        if os.path.exists(converted):
+            files.append(converted)
+    return files
+
+
+def verify(name: str, full: bool = False) -> None:
+    """Raises ModelNotProvisioned unless every locked file is present (and intact when `full`)."""
+    record = _read_lock().get(name)
+    if not record:
+        raise ModelNotProvisioned(name, "no lock entry")
+    for rel, meta in record["files"].items():
+        path = os.path.join(MODEL_DIR, rel)
+        if not os.path.exists(path):
+            raise ModelNotProvisioned(name, f"missing {rel}")
+        if VERIFY_MODE != "off" and os.path.getsize(path) != meta["size"]:
+            raise ModelNotProvisioned(name, f"size mismatch for {rel}")
+        if full and file_digest(path) != meta["sha256"]:
+            raise ModelNotProvisioned(name, f"sha256 mismatch for {rel}")
+
+
+def require(name: str) -> str:
+    """
+    Local path of a provisioned model, verified once per process.
+    For models with a safetensors conversion that file is returned.
+    """
+    if name not in _verified:
+        with _lock:
+            if name not in _verified:
+                try:
+                    verify(name, full=VERIFY_MODE == "full")
+                except ModelNotProvisioned:
+                    if not ALLOW_DOWNLOAD:
+                        raise
+                    logger.warning(f"Model '{name}' missing; provisioning (MODEL_ALLOW_DOWNLOAD=1).")
+                    _provision_one(name)
+                _verified.add(name)
+    entry = _entry(name)
+    if entry.get("safetensors"):
+        converted = os.path.join(MODEL_DIR, entry["safetensors"])
+        if os.path.exists(converted):
+            return converted
+    return local_path(name)
+
+
+def configure_rembg() -> None:
+    """Points rembg at MODEL_DIR/rembg. rembg's own md5 pass is skipped for models we verified."""
+    os.environ.setdefault("U2NET_HOME", os.path.join(MODEL_DIR, "rembg"))
+    if os.environ["U2NET_HOME"] == os.path.join(MODEL_DIR, "rembg") and VERIFY_MODE != "off":
+        os.environ.setdefault("MODEL_CHECKSUM_DISABLED", "1")
+
+
+def rembg_model_name(session_name: str) -> str:
+    """Registry name of the rembg session `session_name` (e.g. u2netp -> rembg_u2netp)."""
+    return "rembg_" + session_name.replace("-", "_")
+
+
+def load_safetensors(path: str) -> dict:
+    """Memory-maps a safetensors file into a CPU state dict."""
+    from safetensors.torch import load_file
+    return load_file(path, device="cpu")
+
+
+# ---------------------------------------------------------------------------
+# Provisioning (network)
+# ---------------------------------------------------------------------------
+def _download(url: str, dest: str) -> None:
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = dest + ".part"
+    logger.info(f"Downloading {url}")
+    with urllib.request.urlopen(url, timeout=60) as resp, open(tmp, "wb") as out:
+        shutil.copyfileobj(resp, out, 1 << 20)
+    os.replace(tmp, dest)
+
+
+def _convert_checkpoint(src: str, dest: str) -> None:
+    """torch pickle checkpoint -> safetensors, so loading is an mmap instead of an unpickle."""
+    import torch
+    from safetensors.torch import save_file
+    state = torch.load(src, map_location="cpu")
+    if isinstance(state, dict) and "state_dict" in state:
+        state = state["state_dict"]
+    save_file({k: v.contiguous() for k, v in state.items()}, dest)
+
+
+def _provision_one(name: str, force: bool = False, allow_unpinned: bool = ALLOW_UNPINNED) -> dict:
+    entry = _entry(name)
+    path = local_path(name)
+    kind = entry["kind"]
+    problems = _unpinned(entry)
+    if problems:
+        if not allow_unpinned:
+            raise ModelNotPinned(name, "; ".join(problems))
+        logger.warning(f"Provisioning unpinned model '{name}': {'; '.join(problems)}")
+    record = {"kind": kind, "pinned": not problems}
+
+    if kind == "url":
+        if force or not os.path.exists(path):
+            _download(entry["url"], path)
+        _check_pinned(path, entry.get("checksum"))
+        _check_pinned(path, entry.get("sha256") and f"sha256:{entry['sha256']}")
+        if entry.get("safetensors"):
+            converted = os.path.join(MODEL_DIR, entry["safetensors"])
+            if force or not os.path.exists(converted):
+                try:
+                    _convert_checkpoint(path, converted)
+                except Exception as e:
+                    logger.warning(f"safetensors conversion of {name} skipped: {e}")
+
+    elif kind == "hf_snapshot":
+        from huggingface_hub import snapshot_download, HfApi
+        patterns = list(entry.get("allow_patterns") or ["*"])
+        snapshot_download(entry["repo_id"], revision=entry.get("revision"), local_dir=path,
+                          allow_patterns=patterns, force_download=force)
+        if not any(f.endswith(".safetensors") for f in os.listdir(path)):
+            # No safetensors published for this revision: fall back to the pickle weights
+            snapshot_download(entry["repo_id"], revision=entry.get("revision"), local_dir=path,
+                              allow_patterns=patterns + ["*.bin"], force_download=force)
+        if entry.get("files"):
+            _check_snapshot(name, path, entry["files"])
+        try:
+            record["revision"] = HfApi().model_info(entry["repo_id"], revision=entry.get("revision")).sha
+        except Exception:
+            record["revision"] = entry.get("revision")
+
+    elif kind == "rembg":
+        configure_rembg()
+        if force or not os.path.exists(path):
+            import rembg
+            previous = os.environ.pop("MODEL_CHECKSUM_DISABLED", None)
+            try:
+                rembg.new_session(entry["session"])  # downloads + md5-checks into U2NET_HOME
+            finally:
+                if previous is not None:
+                    os.environ["MODEL_CHECKSUM_DISABLED"] = previous
+        _check_pinned(path, entry.get("checksum"))
+        _check_pinned(path, entry.get("sha256") and f"sha256:{entry['sha256']}")
+
+    else:
+        raise ValueError(f"Unknown model kind '{kind}' for {name}")
+
+    files = _files_of(name)
+    if not files:
+        raise RuntimeError(f"Provisioning {name} produced no files")
+    record["files"] = {
+        os.path.relpath(f, MODEL_DIR): {"size": os.path.getsize(f), "sha256": file_digest(f)} for f in files
+    }
+    lock = _read_lock()
+    lock[name] = record
+    _write_lock(lock)
+    logger.info(f"Provisioned {name}: {len(files)} file(s)")
+    return record
+
+
+def provision(names=None, force: bool = False, allow_unpinned: bool = ALLOW_UNPINNED) -> dict:
+    names = list(names or load_manifest())
+    return {name: _provision_one(name, force=force, allow_unpinned=allow_unpinned) for name in names}
+
+
+def pin(names=None) -> dict:
+    """
+    Provisions `names` (all unpinned entries by default) and records their
+    sha256 digests, and the resolved commit of snapshots, in the manifest.
+    Returns the updated entries.
+    """
+    manifest = load_manifest()
+    names = list(names or [name for name, entry in manifest.items() if _unpinned(entry)])
+    for name in names:
+        entry = manifest[name]
+        record = _provision_one(name, force=True, allow_unpinned=True)
+        if entry["kind"] == "hf_snapshot":
+            if not _COMMIT_RE.match(record.get("revision") or ""):
+                raise RuntimeError(f"Could not resolve a commit sha for {name} (got {record.get('revision')!r})")
+            entry["revision"] = record["revision"]
+            root = os.path.relpath(local_path(name), MODEL_DIR)
+            entry["files"] = {os.path.relpath(rel, root): meta["sha256"] for rel, meta in record["files"].items()}
+        else:
+            entry["sha256"] = record["files"][entry["path"]]["sha256"]
+        logger.info(f"Pinned {name}")
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, MANIFEST_PATH)
+    return {name: manifest[name] for name in names}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline model registry")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("provision", help="download, verify and lock models")
+    p.add_argument("names", nargs="*")
+    p.add_argument("--force", action="store_true")
+    p.add_argument("--allow-unpinned", action="store_true", help="lock entries without pinned digests")
+    pn = sub.add_parser("pin", help="provision and record sha256 digests / commit shas in the manifest")
+    pn.add_argument("names", nargs="*")
+    v = sub.add_parser("verify", help="check provisioned models against the lock")
+    v.add_argument("names", nargs="*")
+    v.add_argument("--full", action="store_true", help="re-hash every file")
+    sub.add_parser("list", help="show manifest entries and their state")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "provision":
+        try:
+            provision(args.names, force=args.force, allow_unpinned=args.allow_unpinned or ALLOW_UNPINNED)
+        except ModelNotPinned as e:
+            logger.error(str(e))
+            return 1
+        return 0
+    if args.command == "pin":
+        pin(args.names)
+        return 0
+
+    names = getattr(args, "names", None) or list(load_manifest())
+    failed = 0
+    for name in names:
+        try:
+            verify(name, full=getattr(args, "full", False))
+            state = "ok"
+        except ModelNotProvisioned as e:
+            state = f"missing ({e})" if args.command == "verify" else "not provisioned"
+            failed += 1
+        print(f"{name:28s} {state}")
+    return 1 if failed and args.command == "verify" else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+# Named quality/latency presets, selectable per /convert-2d-to-3d request.
+#   rembg_model     rembg session name (u2netp is ~4x faster than u2net)
+#   depth_size      Depth-Anything input side in px (None = model default, 518)
+#   use_sam         run MobileSAM confirmation after the geometric checks
+#   grid_resolution heightmap grid side (faces scale with its square)
+#   decimate_faces  target face count for the relief surface (None = keep all)
+#   symmetry        mesh one half of mirror-symmetric products and mirror it
+#                   (off by default; requests opt in with symmetry=true)
+PRESETS = {
+    "preview": {
+        "rembg_model": "u2netp",
+        "depth_size": 252,
+        "use_sam": False,
+        "grid_resolution": 128,
+        "decimate_faces": 8000,
+        "symmetry": False,
+    },
+    "standard": {
+        "rembg_model": "u2net",
+        "depth_size": None,
+        "use_sam": True,
+        "grid_resolution": 256,
+        "decimate_faces": None,
+        "symmetry": False,
+    },
+    "high": {
+        "rembg_model": "isnet-general-use",
+        "depth_size": 770,
+        "use_sam": True,
+        "grid_resolution": 384,
+        "decimate_faces": None,
+        "symmetry": False,
+    },
+}
+DEFAULT_PRESET = "standard"
+
+
+def get_preset(name: str | None) -> dict:
+    """Returns a copy of the named preset (with its name). Raises ValueError if unknown."""
+    name = (name or DEFAULT_PRESET).lower()
+    if name not in PRESETS:
+        raise ValueError(f"Unknown preset {name!r}; expected one of {', '.join(PRESETS)}")
+    return {"name": name, **PRESETS[name]}
@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+import cv2
+import numpy as np
+from .ingest import decode_bounded
+from .mesh_generator import build_surface, solidify, export_mesh
+from .fallback_generator import FallbackGenerator
+
+logger = logging.getLogger("Preview")
+
+# Preview must be published well inside this budget; otherwise use the template
+PREVIEW_DEADLINE = float(os.getenv("PREVIEW_DEADLINE_S", "0.5"))
+PREVIEW_GRID = 64
+# Decode just enough pixels to find the silhouette
+PREVIEW_DECODE_SIDE = 256
+PREVIEW_MIN_VERTICES = 100
+# Silhouettes outside this coverage are treated as segmentation failures
+MIN_COVERAGE, MAX_COVERAGE = 0.02, 0.95
+
+
+def silhouette(image_path: str) -> np.ndarray | None:
+    """
+    Cheap foreground mask without rembg: the alpha channel when the upload is
+    transparent, otherwise pixels that differ from the median border colour.
+    """
+    image, _ = decode_bounded(image_path, max_side=PREVIEW_DECODE_SIDE)
+    rgba = np.asarray(image)
+    alpha = rgba[:, :, 3]
+    if (alpha < 128).mean() > 0.01:
+        mask = alpha > 127
+    else:
+        lab = cv2.cvtColor(np.ascontiguousarray(rgba[:, :, :3]), cv2.COLOR_RGB2LAB).astype(np.float32)
+        border = np.concatenate([lab[0], lab[-1], lab[:, 0], lab[:, -1]])
+        dist = np.linalg.norm(lab - np.median(border, axis=0), axis=2)
+        dist8 = np.clip(dist * (255.0 / max(dist.max(), 1e-6)), 0, 255).astype(np.uint8)
+        _, otsu = cv2.threshold(dist8, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        mask = otsu > 0
+    mask = cv2.morphologyEx(mask.astype(np.uint8), cv2.MORPH_OPEN, np.ones((3, 3), np.uint8)) > 0
+    coverage = mask.mean()
+    if not MIN_COVERAGE <= coverage <= MAX_COVERAGE:
+        logger.info(f"Preview silhouette rejected ({coverage * 100:.1f}% coverage)")
+        return None
+    return mask
+
+
+def _square_grid(mask: np.ndarray, grid: int) -> np.ndarray:
+    """Crops to the silhouette, pads to a square with a margin and resamples to grid x grid."""
+    ys, xs = np.nonzero(mask)
+    crop = mask[ys.min():ys.max() + 1, xs.min():xs.max() + 1].astype(np.uint8) * 255
+    side = int(max(crop.shape) * 1.1) + 2
+    canvas = np.zeros((side, side), np.uint8)
+    y0, x0 = (side - crop.shape[0]) // 2, (side - crop.shape[1]) // 2
+    canvas[y0:y0 + crop.shape[0], x0:x0 + crop.shape[1]] = crop
+    return cv2.resize(canvas, (grid, grid), interpolation=cv2.INTER_AREA)
+
+
+def heightmap_preview(mask: np.ndarray, output_path: str, grid: int = PREVIEW_GRID) -> dict:
+    """Low-resolution relief mesh: silhouette lifted by a distance-transform dome."""
+    alpha = _square_grid(mask, grid)
+    solid = alpha > 127
+    dist = cv2.distanceTransform(solid.astype(np.uint8), cv2.DIST_L2, 3)
+    depth_norm = np.sqrt(dist / dist.max()) if dist.max() > 0 else dist
+    # build_surface drops zero-depth cells, so keep the rim just above zero
+    depth_norm = np.where(solid, np.maximum(depth_norm, 1e-3), 0.0).astype(np.float32)
+    surface = build_surface(depth_norm, alpha, min_vertices=PREVIEW_MIN_VERTICES)
+    mesh = solidify(surface)
+    export_mesh(mesh, output_path)
+    return {"vertices": len(mesh.vertices), "faces": len(mesh.faces), "preview_type": "heightmap", "grid": grid}
+
+
+def generate_preview(input_path: str, output_path: str, category: str, deadline: float = PREVIEW_DEADLINE) -> dict:
+    """
+    Writes a cheap preview GLB: the silhouette heightmap when it can be built
+    inside `deadline` seconds, else the category template.
+    """
+    start = time.perf_counter()
+    reason = None
+    try:
+        mask = silhouette(input_path)
+        if mask is None:
+            reason = "silhouette unusable"
+        elif time.perf_counter() - start > deadline / 2:
+            reason = "deadline"
+        else:
+            result = heightmap_preview(mask, output_path)
+            result["preview_ms"] = round((time.perf_counter() - start) * 1000.0, 2)
+            return result
+    except Exception as e:
+        reason = str(e)
+
+    logger.info(f"Preview falling back to {category} template ({reason})")
+    result = FallbackGenerator.generate(category=category, output_path=output_path, reason=f"preview: {reason}")
+    result["preview_type"] = "template"
+    result["preview_ms"] = round((time.perf_counter() - start) * 1000.0, 2)
+    return result
@@ -0,0 +1,236 @@
+import io
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+
+logger = logging.getLogger("Profiler")
+
+# Opt-in per request: `X-Profile: 1` header or `?profile=1` query flag
+PROFILE_HEADER = "X-Profile"
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+TRACEMALLOC_FRAMES = 16
+TOP_ALLOCATIONS = 30
+
+PSTATS_FILE = "profile.pstats"
+COLLAPSED_FILE = "stacks.collapsed"
+ALLOCATIONS_FILE = "allocations.txt"
+SUMMARY_FILE = "summary.json"
+ARTIFACTS = (PSTATS_FILE, COLLAPSED_FILE, ALLOCATIONS_FILE, SUMMARY_FILE)
+
+_PROFILE_ID_RE = re.compile(r"^[0-9a-f]{12}$")
+# tracemalloc is process-wide; only one capture may own it at a time
+_tracemalloc_lock = threading.Lock()
+
+
+def wants_profile(header_value: str | None, query_value: str | None) -> bool:
+    for value in (header_value, query_value):
+        if value is not None and value.strip().lower() in ("1", "true", "yes", "on"):
+            return True
+    return False
+
+
+def new_profile_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def profile_path(profile_dir: str, profile_id: str, artifact: str = SUMMARY_FILE) -> str | None:
+    """Resolves an artifact path, or None for ids/artifacts that are not ours."""
+    if not _PROFILE_ID_RE.match(profile_id or "") or artifact not in ARTIFACTS:
+        return None
+    return os.path.join(profile_dir, profile_id, artifact)
+
+
+class _StackSampler(threading.Thread):
+    """Samples the Python stacks of a set of threads into flamegraph-style collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_ids = {thread_id}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def add_thread(self, thread_id: int) -> None:
+        with self._lock:
+            self._thread_ids.add(thread_id)
+
+    def remove_thread(self, thread_id: int) -> None:
+        with self._lock:
+            self._thread_ids.discard(thread_id)
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            with self._lock:
+                thread_ids = tuple(self._thread_ids)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class _Capture:
+    """State of one run_profiled call, shared with the worker threads it hands work to (see propagate)."""
+
+    def __init__(self, sampler: _StackSampler):
+        self.sampler = sampler
+        self.profilers = []
+        self._lock = threading.Lock()
+
+    def run_child(self, fn, args, kwargs):
+        thread_id = threading.get_ident()
+        previous = getattr(_active, "capture", None)
+        _active.capture = self
+        self.sampler.add_thread(thread_id)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Interpreters with one process-wide profiler: stack samples only
+            profiler = None
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                with self._lock:
+                    self.profilers.append(profiler)
+            self.sampler.remove_thread(thread_id)
+            _active.capture = previous
+
+
+# The capture run_profiled is recording on the current thread, if any
+_active = threading.local()
+
+
+def propagate(fn):
+    """
+    For handing work to another thread (e.g. the stage pool): when called
+    inside run_profiled, returns a wrapper that profiles `fn` on whichever
+    thread runs it into the same capture. Otherwise returns `fn` unchanged.
+    """
+    capture = getattr(_active, "capture", None)
+    if capture is None:
+        return fn
+
+    def run(*args, **kwargs):
+        return capture.run_child(fn, args, kwargs)
+    return run
+
+
+def run_profiled(profile_dir: str, profile_id: str, label: str, fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs) under cProfile, a stack sampler and (when free)
+    tracemalloc, then writes the artifacts to profile_dir/profile_id.
+    Must be called on the thread that does the work; work it hands to other
+    threads is included when wrapped with propagate(). Returns fn's result.
+    """
+    out_dir = os.path.join(profile_dir, profile_id)
+    os.makedirs(out_dir, exist_ok=True)
+
+    owns_tracemalloc = _tracemalloc_lock.acquire(blocking=False)
+    if owns_tracemalloc:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    sampler = _StackSampler(threading.get_ident())
+    capture = _Capture(sampler)
+    profiler = cProfile.Profile()
+
+    error = None
+    start = time.perf_counter()
+    previous = getattr(_active, "capture", None)
+    _active.capture = capture
+    sampler.start()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another capture holds the interpreter's only profiler (3.12+): stack samples only
+        profiler = None
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _active.capture = previous
+        wall = time.perf_counter() - start
+        sampler.stop()
+        snapshot = peak = None
+        if owns_tracemalloc:
+            try:
+                _, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+            finally:
+                tracemalloc.stop()
+                _tracemalloc_lock.release()
+        try:
+            profilers = ([profiler] if profiler is not None else []) + capture.profilers
+            stats = pstats.Stats(*profilers)
+            _write_artifacts(out_dir, profile_id, label, wall, error, stats, bool(profilers), sampler, snapshot, peak)
+        except Exception as e:
+            logger.error(f"Failed to write profile {profile_id}: {e}")
+
+
+def _write_artifacts(out_dir, profile_id, label, wall, error, stats, profiled, sampler, snapshot, peak) -> None:
+    stats.dump_stats(os.path.join(out_dir, PSTATS_FILE))
+
+    with open(os.path.join(out_dir, COLLAPSED_FILE), "w") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    top_allocations = []
+    with open(os.path.join(out_dir, ALLOCATIONS_FILE), "w") as f:
+        if snapshot is None:
+            f.write("tracemalloc skipped: another profile capture owned it\n")
+        else:
+            f.write(f"peak traced memory: {peak / 1e6:.2f} MB\n\n")
+            for stat in snapshot.statistics("traceback")[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                top_allocations.append({"site": f"{frame.filename}:{frame.lineno}",
+                                        "size_kb": round(stat.size / 1024.0, 1), "count": stat.count})
+                f.write(f"{stat.size / 1024.0:.1f} KB in {stat.count} blocks\n")
+                for line in stat.traceback.format():
+                    f.write(f"  {line}\n")
+                f.write("\n")
+
+    buf = io.StringIO()
+    stats.stream = buf
+    stats.sort_stats("cumulative").print_stats(25)
+
+    summary = {
+        "profile_id": profile_id,
+        "label": label,
+        "wall_seconds": round(wall, 4),
+        "error": error,
+        "cprofile": profiled,
+        "samples": sum(sampler.stacks.values()),
+        "sample_interval_ms": sampler.interval * 1000.0,
+        "peak_traced_mb": round(peak / 1e6, 3) if peak is not None else None,
+        "top_allocations": top_allocations[:10],
+        "top_cumulative": buf.getvalue(),
+        "artifacts": list(ARTIFACTS),
+    }
+    with open(os.path.join(out_dir, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f, indent=2)
+    logger.info(f"Profile {profile_id} ({label}) written to {out_dir}")
@@ -0,0 +1,93 @@
+"""
+Preload-then-fork support: load models once in the parent, freeze them for
+inference and move their weights to shared memory so forked workers share
+the pages instead of each holding a private copy.
+"""
+import os
+import gc
+import logging
+
+logger = logging.getLogger("SharedModels")
+
+
+def freeze_for_sharing(model) -> int:
+    """
+    Puts a torch module in inference mode and moves its tensors to shared
+    memory. Returns the parameter + buffer bytes now shared.
+    """
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad_(False)
+    model.share_memory()
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def preload(generator=None) -> dict:
+    """
+    Loads everything workers can share. Runs no inference, so no torch or
+    ONNX Runtime thread pools exist at fork time. ONNX Runtime sessions are
+    not fork-safe and are created per worker (rembg's library code is still
+    imported here and shared).
+    Returns {component: shared weight bytes}.
+    """
+    from .depth_estimator import get_depth_pipe
+    from . import image_cleaner, mesh_generator
+
+    shared = {}
+    shared["depth"] = freeze_for_sharing(get_depth_pipe().model)
+    if generator is not None:
+        predictor = generator.validator.load_sam()
+        if predictor is not None:
+            shared["sam"] = freeze_for_sharing(predictor.model)
+    # Library imports only: their code and data pages are shared too
+    image_cleaner.rembg.new_session
+    mesh_generator.trimesh.Trimesh
+
+    # Objects that live until exit: keep the collector from touching (and un-sharing) their pages
+    gc.collect()
+    gc.freeze()
+    for name, size in shared.items():
+        logger.info(f"Preloaded {name}: {size / 1e6:.1f} MB of weights in shared memory")
+    return shared
+
+
+def process_memory(pid="self") -> dict:
+    """
+    Resident memory of a process split into unique (private) and shared
+    pages, from /proc/<pid>/smaps_rollup. PSS charges shared pages
+    proportionally to every process mapping them. Values in MB.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) * 1024
+    except OSError:
+        return {"pid": os.getpid() if pid == "self" else pid, "available": False}
+
+    def mb(*keys):
+        return round(sum(fields.get(k, 0) for k in keys) / 1e6, 1)
+
+    return {
+        "pid": os.getpid() if pid == "self" else pid,
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "unique_mb": mb("Private_Clean", "Private_Dirty"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+    }
+
+
+def memory_report(pids) -> str:
+    rows = [process_memory(pid) for pid in pids]
+    lines = [f"{'pid':>8} {'rss MB':>9} {'unique MB':>10} {'shared MB':>10} {'pss MB':>9}"]
+    for r in rows:
+        if r.get("available") is False:
+            lines.append(f"{r['pid']:>8} (no /proc data)")
+            continue
+        lines.append(f"{r['pid']:>8} {r['rss_mb']:9.1f} {r['unique_mb']:10.1f} {r['shared_mb']:10.1f} {r['pss_mb']:9.1f}")
+    total_pss = sum(r.get("pss_mb", 0) for r in rows)
+    lines.append(f"total PSS {total_pss:.1f} MB across {len(rows)} process(es)")
+    return "\n".join(lines)
@@ -1,9 +1,121 @@
-import trimesh
 import numpy as np
 from PIL import Image
 import os
 from skimage import measure
-from trimesh.visual.material import PBRMaterial
+from .mesh import Mesh, boundary_edges
+
+ALPHA_THRESHOLD = 100
+# Vertex budget for caps + walls; the grid spacing is derived from it
+TARGET_VERTICES = 4000
+MIN_VERTICES = 1000
+# Slab thickness as a fraction of the silhouette's larger side (20 px on a 512 px image)
+THICKNESS_RATIO = 20.0 / 512.0
+
+
+def _bilinear(field: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Samples `field` at float pixel coordinates (x = column, y = row), clamped to the image."""
+    h, w = field.shape
+    x = np.clip(x, 0, w - 1.001)
+    y = np.clip(y, 0, h - 1.001)
+    x0, y0 = x.astype(np.intp), y.astype(np.intp)
+    fx, fy = x - x0, y - y0
+    top = field[y0, x0] * (1 - fx) + field[y0, x0 + 1] * fx
+    bottom = field[y0 + 1, x0] * (1 - fx) + field[y0 + 1, x0 + 1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def _cap(field: np.ndarray, bbox: tuple, step: float, threshold: float) -> tuple[np.ndarray, np.ndarray]:
+    """Triangulated cap on a `step`-pixel grid: two triangles per cell whose corners are all inside."""
+    r0, c0, r1, c1 = bbox
+    xs = np.arange(c0 - step, c1 + step, step)
+    ys = np.arange(r0 - step, r1 + step, step)
+    gx, gy = np.meshgrid(xs, ys)
+    inside = _bilinear(field, gx, gy) > threshold
+    cells = inside[:-1, :-1] & inside[:-1, 1:] & inside[1:, :-1] & inside[1:, 1:]
+    cols = len(xs)
+    r, c = np.nonzero(cells)
+    i = r * cols + c
+    # Image rows grow downwards, so (i, i+cols, i+1) is counter-clockwise once y is flipped
+    faces = np.concatenate([np.column_stack([i, i + cols, i + 1]),
+                            np.column_stack([i + 1, i + cols, i + cols + 1])])
+    used, faces = np.unique(faces, return_inverse=True)
+    vertices = np.column_stack([gx.ravel()[used], gy.ravel()[used]])
+    return vertices, faces.reshape(-1, 3)
+
+
+def extrude_silhouette(alpha: np.ndarray, target_vertices: int = TARGET_VERTICES, min_vertices: int = MIN_VERTICES,
+                       threshold: float = ALPHA_THRESHOLD, thickness_ratio: float = THICKNESS_RATIO) -> Mesh:
+    """
+    Extrudes the largest alpha silhouette (inner contours kept as holes) into a
+    closed slab. Front and back caps are an even grid of about
+    `target_vertices` in total whose outline vertices are snapped onto the
+    alpha iso-line; side walls are split into rings at the same spacing.
+    Deterministic; fails only if the silhouette cannot reach `min_vertices`.
+    Coordinates are in pixels, y up.
+    """
+    mask = alpha > threshold
+    labels = measure.label(mask, connectivity=2)
+    if labels.max() == 0:
+        raise ValueError("No contours found in image")
+    keep = np.bincount(labels.ravel())[1:].argmax() + 1
+    # Other blobs must not pull the outline towards them
+    field = np.where((labels == keep) | (labels == 0), alpha.astype(np.float32), 0.0)
+    rows, cols = np.nonzero(labels == keep)
+    bbox = (rows.min(), cols.min(), rows.max(), cols.max())
+    thickness = thickness_ratio * max(bbox[2] - bbox[0], bbox[3] - bbox[1], 1)
+
+    # Caps hold ~80% of the budget: two caps of area / step^2 vertices each.
+    # Thin shapes lose more cells to the outline, so refine until the floor is met.
+    step = max(np.sqrt(len(rows) / (0.4 * target_vertices)), 0.5)
+    while True:
+        cap_vertices, cap_faces = _cap(field, bbox, step, threshold)
+        boundary = boundary_edges(cap_faces, len(cap_vertices))
+        outline = len(np.unique(boundary))
+        # Wall rings at the grid spacing, but never more than ~1/4 of the budget (long thin chains)
+        layers = int(np.clip(round(thickness / step), 1, max(1, target_vertices // (4 * max(outline, 1)) + 1)))
+        total = 2 * len(cap_vertices) + (layers - 1) * outline
+        if (total >= min_vertices and len(cap_faces)) or step <= 0.5:
+            break
+        step = max(step / np.sqrt(2.0), 0.5)
+    if total < min_vertices:
+        raise ValueError(f"Mesh rejected: insufficient geometry ({total} vertices)")
+
+    # Snap outline vertices outwards onto the iso-line (two Newton steps along the
+    # alpha gradient, each capped below the grid spacing so no cell folds over)
+    ring = np.unique(boundary)
+    xy = cap_vertices[ring]
+    h = 0.5 * step
+    for _ in range(2):
+        x, y = xy[:, 0], xy[:, 1]
+        grad = np.column_stack([_bilinear(field, x + h, y) - _bilinear(field, x - h, y),
+                                _bilinear(field, x, y + h) - _bilinear(field, x, y - h)]) / (2 * h)
+        norm2 = (grad ** 2).sum(axis=1)
+        move = np.where(norm2[:, None] > 1e-6, grad * ((threshold - _bilinear(field, x, y)) / np.maximum(norm2, 1e-6))[:, None], 0.0)
+        length = np.linalg.norm(move, axis=1, keepdims=True)
+        xy = xy + move * np.minimum(1.0, 0.35 * step / np.maximum(length, 1e-9))
+    cap_vertices[ring] = xy
+
+    # Vertices: front cap, back cap, then (layers - 1) wall rings of the outline
+    n = len(cap_vertices)
+    xy3 = np.column_stack([cap_vertices[:, 0], -cap_vertices[:, 1]])
+    ring_xy = xy3[ring]
+    depths = thickness / 2.0 - thickness * np.arange(1, layers) / layers
+    vertices = np.vstack([np.column_stack([xy3, np.full(n, thickness / 2.0)]),
+                          np.column_stack([xy3, np.full(n, -thickness / 2.0)])] +
+                         [np.column_stack([ring_xy, np.full(len(ring), z)]) for z in depths])
+
+    # Wall quads between consecutive layers; layer 0 is the front cap, layer `layers` the back
+    slot = np.searchsorted(ring, boundary)
+    def layer(k, v, s):
+        return v if k == 0 else v + n if k == layers else 2 * n + (k - 1) * len(ring) + s
+    walls = []
+    for k in range(layers):
+        a0, b0 = layer(k, boundary[:, 0], slot[:, 0]), layer(k, boundary[:, 1], slot[:, 1])
+        a1, b1 = layer(k + 1, boundary[:, 0], slot[:, 0]), layer(k + 1, boundary[:, 1], slot[:, 1])
+        walls += [np.column_stack([a0, b1, b0]), np.column_stack([a0, a1, b1])]
+    faces = np.vstack([cap_faces, np.fliplr(cap_faces) + n] + walls)
+    return Mesh(vertices, faces)
+
 
 def generate_simple_mesh(image_path: str, output_dir: str, product_id: str):
     """
@@ -17,77 +129,38 @@ def generate_simple_mesh(image_path: str, output_dir: str, product_id: str):
         img = Image.open(image_path).convert('RGBA')
         img.thumbnail((512, 512)) # Moderate resolution
         
-        # 2. Get alpha mask & contours
-        arr = np.array(img)
-        alpha = arr[:, :, 3]
-        contours = measure.find_contours(alpha, 100) # Threshold
-        
-        if not contours:
-            raise ValueError("No contours found in image")
-            
-        # 3. Process largest contour
-        longest_c = max(contours, key=len)
-        vertices_2d = np.fliplr(longest_c) # (row, col) -> (x, y)
-        vertices_2d[:, 1] *= -1 # Flip Y
-        
-        # 4. Create Base Mesh via Extrusion
-        # Use a relative logical thickness before scaling
-        path = trimesh.load_path(vertices_2d)
-        
-        # Extrude to create volume (guaranteed thickness)
-        # Using a sufficient amount relative to pixel coords
-        mesh = path.extrude(amount=20.0)
-
-        # 5. Fix Geometry (Up-sample if too simple)
-        # Three.js needs enough vertices for proper lighting/shading
-        # and checking the 1000 vertices rule
-        target_faces = 2500
-        while len(mesh.faces) < target_faces:
-            mesh = mesh.subdivide()
-            if len(mesh.faces) > 10000: # Safety break
-                break
-
-        # 6. Apply PBR Material (NO TEXTURES)
-        # Use a fresh visual object to clear any previous texture/color data
-        mesh.visual = trimesh.visual.ColorVisuals(mesh=mesh)
-        
-        # Assign solid metal-like PBR material
-        # This prevents "TexCoord missing" errors in GLTF validator
-        mesh.visual.material = PBRMaterial(
-            baseColorFactor=[0.92, 0.92, 0.92, 1.0], # Silver/White
-            metallicFactor=0.85,
-            roughnessFactor=0.25,
-            alphaMode='OPAQUE'
-        )
-
-        # 7. Center and Scale
-        mesh.apply_translation(-mesh.centroid)
-        extents = mesh.extents
+        # 2. Alpha mask
+        alpha = np.array(img)[:, :, 3]
+
+        # 3-5. Extrude the silhouette (holes kept) straight at the target density:
+        # even caps and walls, no subdivision passes, vertex floor met by construction
+        mesh = extrude_silhouette(alpha)
+
+        # 6. Center and Scale
+        mesh.apply_translation(-mesh.centroid())
+        extents = mesh.extents()
         if extents[0] > 0:
             # Scale to approx 0.15 meters (15cm) max dimension for AR
             # This ensures it fits in the view
             scale_factor = 0.15 / max(extents)
             mesh.apply_scale(scale_factor)
 
-        # 8. HARD VALIDATION (As requested)
+        # 7. HARD VALIDATION (As requested)
         # Reject if geometry is still insufficient
-        if len(mesh.vertices) < 1000:
+        if len(mesh.vertices) < MIN_VERTICES:
              raise ValueError(f"Mesh rejected: insufficient geometry ({len(mesh.vertices)} vertices)")
-        
-        # Verify material is PBR and has no texture
-        if not isinstance(mesh.visual.material, PBRMaterial):
-            mesh.visual.material = PBRMaterial(baseColorFactor=[0.8, 0.8, 0.8, 1.0])
             
-        # 9. Export
+        # 8. Export with a solid metal-like PBR material (NO TEXTURES, no vertex colours)
+        # This prevents "TexCoord missing" errors in GLTF validator
         out_path = os.path.join(output_dir, f"{product_id}.glb")
-        
-        # Export with explicit flags to ensure buffers are written correctly
-        mesh.export(
-            out_path,
-            file_type="glb",
-            include_normals=True,
-            include_color=False # We rely on material, not vertex colors
-        )
+        mesh.export_glb(out_path, material={
+            "pbrMetallicRoughness": {
+                "baseColorFactor": [0.92, 0.92, 0.92, 1.0], # Silver/White
+                "metallicFactor": 0.85,
+                "roughnessFactor": 0.25,
+            },
+            "alphaMode": "OPAQUE",
+        })
         
         print(f"✅ Robust Mesh Generated: {out_path} | Verts: {len(mesh.vertices)} | Faces: {len(mesh.faces)}")
         return out_path
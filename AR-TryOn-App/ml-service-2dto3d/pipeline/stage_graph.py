@@ -0,0 +1,76 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .metrics import maybe_stage
+from . import profiler
+
+logger = logging.getLogger("StageGraph")
+
+# Shared by every pipeline job. Stages never submit to the pool themselves,
+# so concurrent jobs cannot deadlock on it.
+STAGE_THREADS = int(os.getenv("STAGE_THREADS", str(min(4, os.cpu_count() or 1))))
+_pool = None
+
+
+def get_stage_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=max(1, STAGE_THREADS), thread_name_prefix="stage")
+    return _pool
+
+
+class StageGraph:
+    """
+    Minimal stage DAG. Each stage is called with the results of its
+    dependencies (in declaration order) and starts as soon as they are done.
+    """
+
+    def __init__(self):
+        self._stages = {}
+
+    def add(self, name: str, fn, deps=(), timed: bool = True) -> "StageGraph":
+        """`timed=False` for stages that record their own sub-stages on the timer."""
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage {name!r} depends on unknown stage {dep!r}")
+        self._stages[name] = (fn, tuple(deps), timed)
+        return self
+
+    def _call(self, name: str, timer, args):
+        fn, _, timed = self._stages[name]
+        with maybe_stage(timer if timed else None, name):
+            return fn(*args)
+
+    def run(self, timer=None, pool: ThreadPoolExecutor | None = None) -> dict:
+        """
+        Runs every stage; returns {name: result}. If stages fail, waits for the
+        ones already running and re-raises the failure of the earliest-declared
+        stage, so errors match what sequential execution would have reported.
+        """
+        pool = pool or get_stage_pool()
+        # Stages run on pool threads; keep them inside a ?profile=1 capture
+        call = profiler.propagate(self._call)
+        results, errors, running = {}, {}, {}
+        pending = list(self._stages)
+
+        while pending or running:
+            if not errors:
+                for name in list(pending):
+                    deps = self._stages[name][1]
+                    if all(d in results for d in deps):
+                        pending.remove(name)
+                        running[pool.submit(call, name, timer, [results[d] for d in deps])] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    errors[name] = e
+
+        if errors:
+            first = next(name for name in self._stages if name in errors)
+            raise errors[first]
+        return results
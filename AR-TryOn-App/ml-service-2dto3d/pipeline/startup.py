@@ -0,0 +1,138 @@
+"""
+Startup helpers: deferred imports of heavy libraries, an import-time
+breakdown for the log, and background model warm-up behind /readyz.
+"""
+import sys
+import time
+import types
+import logging
+import importlib
+import importlib.util
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("Startup")
+
+# {label: seconds} for every timed import, in the order they happened
+IMPORT_TIMES = {}
+_times_lock = threading.Lock()
+# One placeholder per module, so every importer sees the same object
+_placeholders = {}
+
+
+def _record(label: str, seconds: float) -> None:
+    with _times_lock:
+        IMPORT_TIMES[label] = IMPORT_TIMES.get(label, 0.0) + seconds
+
+
+@contextmanager
+def timed(label: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(label, time.perf_counter() - start)
+
+
+def import_breakdown(limit: int = 12) -> str:
+    with _times_lock:
+        items = sorted(IMPORT_TIMES.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+    return ", ".join(f"{label} {seconds * 1000:.0f} ms" for label, seconds in items)
+
+
+class _LazyModule(types.ModuleType):
+    """Module placeholder that imports the real module on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self.__name__)  # import lock makes this thread-safe
+            if self.__dict__["_module"] is None:
+                self.__dict__["_module"] = module
+                seconds = time.perf_counter() - start
+                _record(f"lazy {self.__name__}", seconds)
+                logger.info(f"Imported {self.__name__} on first use in {seconds * 1000:.0f} ms")
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name: str):
+    """
+    Returns `name` if it is already imported, otherwise a shared placeholder
+    that imports it on first use. Attributes set on the placeholder (test
+    stubs) shadow the real module's.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _times_lock:
+        placeholder = _placeholders.get(name)
+        if placeholder is None:
+            if importlib.util.find_spec(name) is None:
+                raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+            placeholder = _placeholders[name] = _LazyModule(name)
+        return placeholder
+
+
+class Warmup:
+    """
+    Runs model loaders once, in order, on a background thread and tracks
+    their state for the readiness probe. Optional components may fail
+    without keeping the service unready.
+    """
+
+    def __init__(self):
+        self._steps = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self.status = {}
+
+    def add(self, name: str, fn, required: bool = True) -> "Warmup":
+        self._steps.append((name, fn, required))
+        self.status[name] = {"state": "pending", "required": required, "seconds": None, "error": None}
+        return self
+
+    def run(self) -> None:
+        for name, fn, _ in self._steps:
+            self._set(name, state="running")
+            start = time.perf_counter()
+            try:
+                fn()
+                self._set(name, state="ready", seconds=round(time.perf_counter() - start, 3))
+            except Exception as e:
+                self._set(name, state="failed", seconds=round(time.perf_counter() - start, 3), error=str(e))
+                logger.error(f"Warm-up of {name} failed: {e}")
+        logger.info("Warm-up finished: " + ", ".join(
+            f"{name} {s['state']} ({s['seconds']} s)" for name, s in self.snapshot()["components"].items()))
+        logger.info(f"Import breakdown: {import_breakdown()}")
+
+    def start(self) -> threading.Thread:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+                self._thread.start()
+        return self._thread
+
+    def _set(self, name: str, **fields) -> None:
+        with self._lock:
+            self.status[name].update(fields)
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(s["state"] == "ready" for s in self.status.values() if s["required"])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            components = {name: dict(s) for name, s in self.status.items()}
+        return {
+            "ready": all(s["state"] == "ready" for s in components.values() if s["required"]),
+            "components": components,
+        }
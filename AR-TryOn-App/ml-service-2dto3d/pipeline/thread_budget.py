@@ -0,0 +1,135 @@
+"""
+Central thread budget. Every library in the pipeline (torch, ONNX Runtime,
+OpenCV, BLAS via numpy/scipy) sizes its own pool to all cores by default;
+with concurrent jobs, or several worker processes, that oversubscribes the
+machine. configure() gives this process a slice of the cores and sizes each
+library's pool from it.
+
+    THREAD_BUDGET     cores for this process (default: available cores / WEB_WORKERS; "off" disables)
+    WEB_WORKERS       worker processes sharing the machine (serve_prefork.py)
+    PIPELINE_WORKERS  concurrent pipeline jobs per process (see admission)
+    ATLAS_WORKERS     concurrent background atlas renders per process (see impostor.AtlasBuilder)
+    CPU_AFFINITY=1    pin the process to its core slice
+
+configure() must run before numpy/torch are imported for the BLAS and OpenMP
+environment variables to take effect; explicitly set variables are kept.
+"""
+import os
+import sys
+import logging
+import threading
+
+logger = logging.getLogger("ThreadBudget")
+
+BLAS_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                 "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+_lock = threading.Lock()
+_plan = None
+_torch_applied = False
+
+
+def _available_cores() -> list[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def plan(cores: int, jobs: int) -> dict:
+    """
+    Splits `cores` over `jobs` concurrent pipeline jobs. Within a job, depth
+    (torch) and rembg (ORT) run in parallel (see stage_graph), so ORT gets
+    half the job's share; OpenCV and BLAS calls are short and stay serial
+    whenever jobs run concurrently.
+    """
+    per_job = max(1, cores // max(1, jobs))
+    return {
+        "cores": cores,
+        "jobs": jobs,
+        "torch_intra": per_job,
+        "torch_inter": 1,
+        "ort_intra": max(1, per_job // 2),
+        "ort_inter": 1,
+        "cv2": per_job if jobs == 1 else 1,
+        "blas": 1,
+    }
+
+
+def configure(worker_index: int | None = None, worker_count: int | None = None) -> dict | None:
+    """
+    Computes and applies this process's plan. worker_index/worker_count
+    select the core slice (forked workers call this again after fork).
+    Returns the plan, or None when THREAD_BUDGET=off.
+    """
+    global _plan, _torch_applied
+    budget = os.getenv("THREAD_BUDGET", "auto").lower()
+    if budget == "off":
+        return None
+
+    available = _available_cores()
+    worker_count = max(1, worker_count or int(os.getenv("WEB_WORKERS", "1")))
+    if budget == "auto":
+        cores = max(1, len(available) // worker_count)
+    else:
+        cores = max(1, int(budget))
+    jobs = max(1, int(os.getenv("PIPELINE_WORKERS", "1")))
+
+    with _lock:
+        _plan = plan(cores, jobs)
+        _torch_applied = False
+
+        for var in BLAS_ENV_VARS:
+            os.environ.setdefault(var, str(_plan["blas"] if var != "OMP_NUM_THREADS" else _plan["torch_intra"]))
+
+        if os.getenv("CPU_AFFINITY", "").lower() in ("1", "true", "yes") and worker_index is not None:
+            start = (worker_index * cores) % len(available)
+            pinned = [available[(start + i) % len(available)] for i in range(cores)]
+            try:
+                os.sched_setaffinity(0, pinned)
+                _plan["affinity"] = pinned
+            except (AttributeError, OSError) as e:
+                logger.warning(f"CPU affinity not applied: {e}")
+
+        try:
+            import cv2
+            cv2.setNumThreads(_plan["cv2"])
+        except ImportError:
+            pass
+
+    # Already-imported torch (pre-forked parent) is resized now, otherwise on first load
+    if "torch" in sys.modules and hasattr(sys.modules["torch"], "set_num_threads"):
+        apply_torch()
+    logger.info(f"Thread budget: {_plan}")
+    return _plan
+
+
+def apply_torch() -> None:
+    """Sizes torch's pools from the plan. Call after importing torch, before inference."""
+    global _torch_applied
+    if _plan is None or _torch_applied:
+        return
+    import torch
+    with _lock:
+        torch.set_num_threads(_plan["torch_intra"])
+        try:
+            torch.set_num_interop_threads(_plan["torch_inter"])
+        except RuntimeError:
+            # Only settable before the first inter-op parallel work in this process
+            pass
+        _torch_applied = True
+
+
+def ort_session_options():
+    """onnxruntime.SessionOptions sized from the plan (library defaults when unmanaged)."""
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    if _plan is not None:
+        opts.intra_op_num_threads = _plan["ort_intra"]
+        opts.inter_op_num_threads = _plan["ort_inter"]
+    return opts
+
+
+def snapshot() -> dict | None:
+    with _lock:
+        return dict(_plan) if _plan is not None else None
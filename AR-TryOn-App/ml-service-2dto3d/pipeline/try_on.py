@@ -0,0 +1,218 @@
+import json
+import math
+import time
+import struct
+import cv2
+import numpy as np
+
+# Face detection runs on an area-downscaled copy of frames larger than this;
+# the frame itself (annotated / composited / returned) keeps its size
+FRAME_MAX_SIDE = 1280
+GOLD_BGR = (212, 175, 55)
+
+# Streaming protocol (binary WebSocket messages, little-endian):
+#   client -> server: uint32 seq | encoded frame (JPEG/PNG)
+#   server -> client: uint32 seq | uint32 dropped | float32 decode_ms | float32 detect_ms | float32 total_ms | payload
+STREAM_IN_HEADER = struct.Struct("<I")
+STREAM_OUT_HEADER = struct.Struct("<IIfff")
+
+# Response modes for /ar/try-on: annotated JPEG, anchor JSON, or packed anchors
+RESPONSE_MODES = ("image", "anchors", "packed")
+
+# MediaPipe FaceDetection keypoint order
+KEYPOINT_NAMES = ("right_eye", "left_eye", "nose_tip", "mouth_center", "right_ear", "left_ear")
+ANCHOR_NAMES = ("neck", "right_ear", "left_ear")
+
+# Packed anchors (little-endian), all coordinates normalised to [0, 1]:
+#   header: uint16 version | uint16 face_count | uint16 frame_w | uint16 frame_h
+#   face:   float32 box[4] | float32 score | float32 keypoints[6][2]
+#           | per anchor (neck, right_ear, left_ear): float32 x, y, roll, scale
+PACKED_VERSION = 1
+PACKED_HEADER = struct.Struct("<HHHH")
+PACKED_FACE = struct.Struct("<" + "f" * (4 + 1 + 12 + 4 * len(ANCHOR_NAMES)))
+
+
+def decode_frame(data: bytes) -> np.ndarray:
+    """Decodes an encoded camera frame to BGR. Raises ValueError on garbage input."""
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image bytes")
+    return img
+
+
+def detection_view(img: np.ndarray, max_side: int = FRAME_MAX_SIDE) -> tuple[np.ndarray, float]:
+    """Detector input for a frame: the frame itself, or an INTER_AREA copy bounded by `max_side`. Returns (view, scale)."""
+    h, w = img.shape[:2]
+    if max(w, h) <= max_side:
+        return img, 1.0
+    scale = max_side / float(max(w, h))
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+
+def scale_faces(faces: list[dict], scale: float) -> list[dict]:
+    """Copies of `faces` with box and keypoints mapped from detection_view pixels back to frame pixels."""
+    if scale == 1.0:
+        return faces
+    return [{**face,
+             "box": [int(round(v / scale)) for v in face["box"]],
+             "keypoints": [[x / scale, y / scale] for x, y in face["keypoints"]]}
+            for face in faces]
+
+
+def detect_on_frame(detector, img: np.ndarray, tracker=None) -> list[dict]:
+    """
+    Detects faces (through `tracker` if given) on detection_view(img) and
+    returns them in frame pixels. The tracker keeps its state in view pixels.
+    """
+    view, scale = detection_view(img)
+    faces = tracker.detect(detector, view) if tracker is not None else detect_faces(detector, view)
+    return scale_faces(faces, scale)
+
+
+def detect_faces(detector, img: np.ndarray) -> list[dict]:
+    """
+    Runs a MediaPipe FaceDetection instance on a BGR frame.
+    Returns one dict per face with a pixel box [x, y, w, h], score and the six
+    MediaPipe keypoints in pixels.
+    """
+    ih, iw = img.shape[:2]
+    results = detector.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    faces = []
+    for detection in results.detections or []:
+        bboxC = detection.location_data.relative_bounding_box
+        x, y, w, h = int(bboxC.xmin * iw), int(bboxC.ymin * ih), int(bboxC.width * iw), int(bboxC.height * ih)
+        keypoints = [[kp.x * iw, kp.y * ih] for kp in detection.location_data.relative_keypoints]
+        faces.append({
+            "box": [x, y, w, h],
+            "score": float(detection.score[0]) if detection.score else 0.0,
+            "keypoints": keypoints,
+        })
+    return faces
+
+
+def compute_anchors(face: dict) -> dict:
+    """
+    Derives jewelry anchor transforms (pixels) from a detection.
+    `roll` is the eye-line angle in radians, `scale` the ear-to-ear width, so the
+    client can place and size the GLB without any image data.
+    """
+    x, y, w, h = face["box"]
+    kp = np.asarray(face["keypoints"], dtype=np.float64)
+    if len(kp) < 6:
+        # Box-only detection: assume an upright face
+        cx = x + w / 2.0
+        anchors = {
+            "neck": [cx, y + h * 1.45],
+            "right_ear": [x, y + h * 0.7],
+            "left_ear": [x + w, y + h * 0.7],
+        }
+        return {name: {"position": pos, "roll": 0.0, "scale": float(w)} for name, pos in anchors.items()}
+
+    right_eye, left_eye, _nose, mouth, right_ear, left_ear = kp[:6]
+    eye_vec = left_eye - right_eye
+    roll = math.atan2(eye_vec[1], eye_vec[0])
+    across = eye_vec / max(np.linalg.norm(eye_vec), 1e-6)
+    down = np.array([-across[1], across[0]])  # eye line rotated 90 deg towards the chin
+    width = float(max(np.linalg.norm(left_ear - right_ear), w * 0.8))
+
+    chin = mouth + down * (0.3 * h)
+    anchors = {
+        "neck": chin + down * (0.6 * h),
+        "right_ear": right_ear + down * (0.18 * h),
+        "left_ear": left_ear + down * (0.18 * h),
+    }
+    return {
+        name: {"position": [float(p[0]), float(p[1])], "roll": float(roll), "scale": width}
+        for name, p in anchors.items()
+    }
+
+
+def build_anchor_response(faces: list[dict], frame_size: tuple[int, int]) -> dict:
+    """Anchor-only payload with every coordinate normalised by the frame size."""
+    iw, ih = frame_size
+    out = []
+    for face in faces:
+        x, y, w, h = face["box"]
+        anchors = compute_anchors(face)
+        out.append({
+            "box": [x / iw, y / ih, w / iw, h / ih],
+            "score": face["score"],
+            "landmarks": {name: [p[0] / iw, p[1] / ih] for name, p in zip(KEYPOINT_NAMES, face["keypoints"])},
+            "anchors": {
+                name: {
+                    "position": [a["position"][0] / iw, a["position"][1] / ih],
+                    "roll": a["roll"],
+                    "scale": a["scale"] / iw,
+                }
+                for name, a in anchors.items()
+            },
+        })
+    return {"frame": [iw, ih], "faces": out}
+
+
+def pack_anchor_response(response: dict) -> bytes:
+    """Binary form of build_anchor_response (layout documented at PACKED_FACE)."""
+    iw, ih = response["frame"]
+    chunks = [PACKED_HEADER.pack(PACKED_VERSION, len(response["faces"]), iw, ih)]
+    for face in response["faces"]:
+        values = list(face["box"]) + [face["score"]]
+        for name in KEYPOINT_NAMES:
+            values.extend(face["landmarks"].get(name, (0.0, 0.0)))
+        for name in ANCHOR_NAMES:
+            a = face["anchors"][name]
+            values.extend([a["position"][0], a["position"][1], a["roll"], a["scale"]])
+        chunks.append(PACKED_FACE.pack(*values))
+    return b"".join(chunks)
+
+
+def encode_anchor_response(response: dict, mode: str) -> bytes:
+    if mode == "packed":
+        return pack_anchor_response(response)
+    return json.dumps(response, separators=(",", ":")).encode("utf-8")
+
+
+def annotate_frame(img: np.ndarray, faces: list[dict]) -> np.ndarray:
+    for face in faces:
+        x, y, w, h = face["box"]
+        cv2.rectangle(img, (x, y), (x + w, y + h), GOLD_BGR, 2)
+        cv2.putText(img, "Jewelry Applied", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, GOLD_BGR, 2)
+    return img
+
+
+def annotate_unavailable(img: np.ndarray) -> np.ndarray:
+    cv2.putText(img, "AR Service (MP Missing)", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    return img
+
+
+def encode_frame(img: np.ndarray, quality: int = 95) -> bytes:
+    ok, encoded_img = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return encoded_img.tobytes()
+
+
+def run_detection(pool, img: np.ndarray, tracker=None) -> tuple[list[dict], float]:
+    """
+    Checks a detector out of `pool` and runs it, through `tracker` if given.
+    Returns (faces, detection_ms).
+    """
+    with pool.checkout() as detector:
+        start = time.perf_counter()
+        if tracker is not None:
+            with tracker.lock:
+                faces = detect_on_frame(detector, img, tracker)
+        else:
+            faces = detect_on_frame(detector, img)
+        return faces, (time.perf_counter() - start) * 1000.0
+
+
+def unpack_stream_frame(message: bytes) -> tuple[int, bytes]:
+    if len(message) <= STREAM_IN_HEADER.size:
+        raise ValueError("Stream frame too short")
+    (seq,) = STREAM_IN_HEADER.unpack_from(message)
+    return seq, message[STREAM_IN_HEADER.size:]
+
+
+def pack_stream_result(seq: int, dropped: int, decode_ms: float, detect_ms: float, total_ms: float, payload: bytes) -> bytes:
+    return STREAM_OUT_HEADER.pack(seq, dropped, decode_ms, detect_ms, total_ms) + payload
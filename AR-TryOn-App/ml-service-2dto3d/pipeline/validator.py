@@ -2,30 +2,68 @@ import numpy as np
 import cv2
 import logging
 import os
-import requests
+import hashlib
+import threading
+from collections import OrderedDict
 from PIL import Image
+from .ingest import imread_bounded
+from .metrics import maybe_stage, CACHE_REQUESTS, VALIDATION_PATH
+from . import model_registry
+from . import thread_budget
 
 logger = logging.getLogger("Validator")
 
+# SAM only runs when the geometric statistics are inconclusive (see _geometry_verdict).
+# MobileSAM resizes its input to a 1024 longest side anyway; a smaller cap saves no
+# encoder time and only blurs the ambiguous masks SAM has to decide.
+SAM_MAX_SIDE = int(os.getenv("SAM_MAX_SIDE", "1024"))
+SAM_EMBEDDING_CACHE = 8
+
+# "Confidently good" region for a cleaned product shot
+GOOD_COVERAGE = (0.05, 0.85)
+GOOD_SOLIDITY = 0.2
+GOOD_LARGEST_SHARE = 0.9
+GOOD_MAX_COMPONENTS = 3
+GOOD_MAX_SOFT_EDGE = 0.15
+
 class SegmentationValidator:
     def __init__(self):
         self.points_limit = 200 # Minimum points for a valid mask
+        # SamPredictor keeps per-image state; one caller at a time
+        self._sam_lock = threading.Lock()
+        self._embeddings = OrderedDict()
         
-        # Try to initialize MobileSAM
+        # MobileSAM is loaded on first ambiguous mask or by the startup warm-up
+        self.sam_predictor = None
+        self._sam_loaded = False
+        self._sam_load_lock = threading.Lock()
+
+    def load_sam(self):
+        """Loads MobileSAM once; returns the predictor, or None if it is unavailable."""
+        if self._sam_loaded:
+            return self.sam_predictor
+        with self._sam_load_lock:
+            if not self._sam_loaded:
+                self._load_sam()
+                self._sam_loaded = True
+        return self.sam_predictor
+
+    def disable_sam(self) -> None:
+        """Geometric validation only (benchmarks, tests)."""
         self.sam_predictor = None
+        self._sam_loaded = True
+
+    def _load_sam(self) -> None:
         try:
            from mobile_sam import sam_model_registry, SamPredictor
-           # Download weights if needed
-           weights_path = os.path.join(os.path.dirname(__file__), "..", "models", "mobile_sam.pt")
-           if not os.path.exists(weights_path):
-               logger.info("Downloading MobileSAM weights...")
-               os.makedirs(os.path.dirname(weights_path), exist_ok=True)
-               url = "https://github.com/ChaoningZhang/MobileSAM/raw/master/weights/mobile_sam.pt"
-               response = requests.get(url)
-               with open(weights_path, "wb") as f:
-                   f.write(response.content)
-           
-           mobile_sam = sam_model_registry["vit_t"](checkpoint=weights_path)
+           # Local weights only; see pipeline.model_registry provision
+           weights_path = model_registry.require("mobile_sam")
+           thread_budget.apply_torch()
+           if weights_path.endswith(".safetensors"):
+               mobile_sam = sam_model_registry["vit_t"](checkpoint=None)
+               mobile_sam.load_state_dict(model_registry.load_safetensors(weights_path))
+           else:
+               mobile_sam = sam_model_registry["vit_t"](checkpoint=weights_path)
            # Force CPU for safety
            mobile_sam.to(device='cpu')
            self.sam_predictor = SamPredictor(mobile_sam)
@@ -35,7 +73,7 @@ class SegmentationValidator:
             logger.warning(f"MobileSAM not available ({e}). using geometric fallback.")
             self.sam_predictor = None
 
-    def validate_mask(self, image_path: str, mask_path: str = None) -> bool:
+    def validate_mask(self, image_path: str, mask_path: str = None, timer=None, use_sam: bool = True) -> bool:
         """
         Validates if the segmented object is a plausible jewelry item.
         Checks:
@@ -43,78 +81,167 @@ class SegmentationValidator:
         2. Area Coverage (Is it visible?)
         3. Aspect Ratio (Is it extreme?)
         4. SAM Confirmation (Does SAM find an object?)
+        Geometric and SAM checks are timed separately on `timer` when given;
+        `use_sam=False` skips the SAM confirmation (see presets).
         """
         try:
+            checked = self.check_geometry(image_path, timer=timer)
+            if checked is None:
+                return False
+            return self.confirm(*checked, timer=timer, use_sam=use_sam)
+
+        except Exception as e:
+            logger.error(f"Validation Error: {e}")
+            raise e
+
+    def check_geometry(self, image_path: str, timer=None):
+        """
+        Cheap first half of validate_mask: raises on masks that clearly fail.
+        Returns (img, alpha, verdict) for confirm(), or None when the image
+        has no alpha channel.
+        """
+        with maybe_stage(timer, "validate_geometric"):
             # Load cleaned image (RGBA)
-            img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-            if img is None:
-                raise ValueError("Could not read image for validation")
-            
+            img, _ = imread_bounded(image_path, flags=cv2.IMREAD_UNCHANGED)
+
             # Extract Alpha
-            if img.shape[2] == 4:
+            if img.ndim == 3 and img.shape[2] == 4:
                 alpha = img[:, :, 3]
             else:
                 # If RGB, assume black is background? No, pipeline gives RGBA.
-                return False 
-
-            # 1. Coverage Check
-            total_pixels = alpha.size
-            object_pixels = np.count_nonzero(alpha > 10)
-            coverage = object_pixels / total_pixels
-            
-            logger.info(f"Object coverage: {coverage:.4f}")
-            if coverage < 0.01: # < 1% of screen
-                raise ValueError("Validation Failed: Object too small or empty.")
-            
-            # 2. Geometric Checks (Contours)
-            contours, _ = cv2.findContours(alpha, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if not contours:
-                 raise ValueError("Validation Failed: No contours found.")
-            
-            largest_contour = max(contours, key=cv2.contourArea)
-            area = cv2.contourArea(largest_contour)
-            
-            # Solidity = Area / ConvexHullArea
-            hull = cv2.convexHull(largest_contour)
-            hull_area = cv2.contourArea(hull)
-            if hull_area > 0:
-                solidity = area / hull_area
-            else:
-                solidity = 0
-            
-            logger.info(f"Object Solidity: {solidity:.2f}")
-            
-            # Jewelry (rings, necklaces) often has LOW solidity (holes).
-            # If solidity is 1.0, it's a solid block (box?). 
-            # If solidity is < 0.1, it's just scattered noise.
-            if solidity < 0.1:
-                 raise ValueError(f"Validation Failed: Object too fragmented (Solidity {solidity:.2f}).")
-            
-            # 3. SAM Validation (Verify Objectness)
-            if self.sam_predictor:
-                # Run SAM on the RGB part to see if it segment's something similar
-                rgb = cv2.cvtColor(img, cv2.COLOR_BGRA2RGB)
-                self.sam_predictor.set_image(rgb)
-                
-                # Prompt with center point
-                h, w = rgb.shape[:2]
-                input_point = np.array([[w//2, h//2]])
-                input_label = np.array([1])
-                
+                return None
+
+            stats = self._validate_geometry(alpha)
+            return img, alpha, self._geometry_verdict(stats)
+
+    def confirm(self, img: np.ndarray, alpha: np.ndarray, verdict: str, timer=None, use_sam: bool = True) -> bool:
+        """Second half of validate_mask: SAM decides masks check_geometry found ambiguous. Raises on failure."""
+        # 3. SAM Validation (Verify Objectness), only where geometry is inconclusive
+        if verdict == "ambiguous" and use_sam and self.load_sam():
+            VALIDATION_PATH.inc(path="sam")
+            with maybe_stage(timer, "validate_sam"):
+                self._validate_sam(img, alpha)
+        else:
+            VALIDATION_PATH.inc(path=f"geometric_{verdict}")
+        return True
+
+    def _validate_geometry(self, alpha: np.ndarray) -> dict:
+        """Hard geometric checks (raise on failure). Returns the statistics for the cascade."""
+        # 1. Coverage Check
+        total_pixels = alpha.size
+        object_pixels = np.count_nonzero(alpha > 10)
+        coverage = object_pixels / total_pixels
+        
+        logger.info(f"Object coverage: {coverage:.4f}")
+        if coverage < 0.01: # < 1% of screen
+            raise ValueError("Validation Failed: Object too small or empty.")
+        
+        # 2. Geometric Checks (Contours)
+        contours, _ = cv2.findContours(alpha, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+             raise ValueError("Validation Failed: No contours found.")
+        
+        largest_contour = max(contours, key=cv2.contourArea)
+        area = cv2.contourArea(largest_contour)
+        
+        # Solidity = Area / ConvexHullArea
+        hull = cv2.convexHull(largest_contour)
+        hull_area = cv2.contourArea(hull)
+        if hull_area > 0:
+            solidity = area / hull_area
+        else:
+            solidity = 0
+        
+        logger.info(f"Object Solidity: {solidity:.2f}")
+        
+        # Jewelry (rings, necklaces) often has LOW solidity (holes).
+        # If solidity is 1.0, it's a solid block (box?). 
+        # If solidity is < 0.1, it's just scattered noise.
+        if solidity < 0.1:
+             raise ValueError(f"Validation Failed: Object too fragmented (Solidity {solidity:.2f}).")
+
+        # Connected components of the foreground (ignoring specks)
+        fg = (alpha > 10).astype(np.uint8)
+        n, _, cc_stats, _ = cv2.connectedComponentsWithStats(fg, connectivity=8)
+        areas = cc_stats[1:, cv2.CC_STAT_AREA]
+        significant = areas[areas >= max(1, 0.005 * object_pixels)]
+        largest_share = float(areas.max()) / object_pixels if len(areas) else 0.0
+
+        # Share of the foreground that is semi-transparent: a clean matte has a thin soft edge
+        soft_edge = np.count_nonzero((alpha > 10) & (alpha < 245)) / max(object_pixels, 1)
+
+        return {
+            "coverage": coverage,
+            "solidity": solidity,
+            "components": int(len(significant)),
+            "largest_share": largest_share,
+            "soft_edge": soft_edge,
+        }
+
+    def _geometry_verdict(self, stats: dict) -> str:
+        """
+        "pass" when every statistic sits in the confidently good region,
+        else "ambiguous" (SAM decides). Confidently bad masks have already
+        raised in _validate_geometry.
+        """
+        confident = (
+            GOOD_COVERAGE[0] <= stats["coverage"] <= GOOD_COVERAGE[1]
+            and stats["solidity"] >= GOOD_SOLIDITY
+            and stats["largest_share"] >= GOOD_LARGEST_SHARE
+            and stats["components"] <= GOOD_MAX_COMPONENTS
+            and stats["soft_edge"] <= GOOD_MAX_SOFT_EDGE
+        )
+        verdict = "pass" if confident else "ambiguous"
+        logger.info(f"Geometric verdict: {verdict} ({', '.join(f'{k}={v:.3f}' for k, v in stats.items())})")
+        return verdict
+
+    def _set_sam_image(self, rgb: np.ndarray) -> None:
+        """set_image() with an LRU of encoder outputs keyed by image content."""
+        key = hashlib.sha1(rgb.tobytes()).hexdigest()
+        cached = self._embeddings.get(key)
+        if cached is not None:
+            self._embeddings.move_to_end(key)
+            CACHE_REQUESTS.inc(cache="sam_embedding", result="hit")
+            p = self.sam_predictor
+            p.features, p.original_size, p.input_size = cached
+            p.is_image_set = True
+            return
+        CACHE_REQUESTS.inc(cache="sam_embedding", result="miss")
+        self.sam_predictor.set_image(rgb)
+        p = self.sam_predictor
+        self._embeddings[key] = (p.features, p.original_size, p.input_size)
+        while len(self._embeddings) > SAM_EMBEDDING_CACHE:
+            self._embeddings.popitem(last=False)
+
+    def _validate_sam(self, img: np.ndarray, alpha: np.ndarray) -> None:
+        # Run SAM on the RGB part to see if it segment's something similar
+        h, w = img.shape[:2]
+        scale = min(1.0, SAM_MAX_SIDE / float(max(h, w)))
+        if scale < 1.0:
+            size = (max(1, int(w * scale)), max(1, int(h * scale)))
+            img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+            alpha = cv2.resize(alpha, size, interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(img, cv2.COLOR_BGRA2RGB)
+        h, w = rgb.shape[:2]
+
+        # Prompts: image centre (the original check) and the most interior object
+        # pixel, which stays on the piece when the centre falls in a ring's hole
+        dist = cv2.distanceTransform((alpha > 10).astype(np.uint8), cv2.DIST_L2, 3)
+        iy, ix = np.unravel_index(int(np.argmax(dist)), dist.shape)
+        prompts = [[w // 2, h // 2], [int(ix), int(iy)]]
+
+        best_score = 0.0
+        with self._sam_lock:
+            self._set_sam_image(rgb)
+            for point in prompts:
                 masks, scores, logits = self.sam_predictor.predict(
-                    point_coords=input_point,
-                    point_labels=input_label,
+                    point_coords=np.array([point]),
+                    point_labels=np.array([1]),
                     multimask_output=True,
                 )
-                
-                best_score = max(scores)
-                logger.info(f"SAM Object Score: {best_score:.2f}")
-                
-                if best_score < 0.8:
-                     raise ValueError(f"SAM Validation Failed: Low confidence object ({best_score:.2f})")
+                best_score = max(best_score, float(max(scores)))
 
-            return True
-
-        except Exception as e:
-            logger.error(f"Validation Error: {e}")
-            raise e
+        logger.info(f"SAM Object Score: {best_score:.2f}")
+        
+        if best_score < 0.8:
+             raise ValueError(f"SAM Validation Failed: Low confidence object ({best_score:.2f})")
@@ -0,0 +1,116 @@
+"""
+Preload-then-fork server: models load once in this parent process, then
+the workers are forked and share the weight pages (copy-on-write plus torch
+shared memory) instead of each loading private copies.
+
+    python serve_prefork.py --workers 8 --port 8000
+
+Every --report-interval seconds the per-worker unique vs shared RSS is logged;
+GET /memory on any worker returns its own numbers.
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+import argparse
+
+logger = logging.getLogger("Prefork")
+
+
+def spawn_worker(sock: socket.socket, log_level: str, index: int, count: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    # Child: uvicorn installs its own SIGINT/SIGTERM handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 0
+    try:
+        import uvicorn
+        import app
+        from pipeline import thread_budget
+        thread_budget.configure(worker_index=index, worker_count=count)
+        uvicorn.Server(uvicorn.Config(app.app, log_level=log_level)).run(sockets=[sock])
+    except BaseException as e:
+        logger.error(f"Worker {os.getpid()} crashed: {e}")
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Preload-then-fork ML service")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", "2")))
+    parser.add_argument("--report-interval", type=float, default=300.0,
+                        help="seconds between memory reports (0: only once after start-up)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    workers_wanted = max(1, args.workers)
+    # Each worker's thread budget is its share of the cores (pipeline.thread_budget)
+    os.environ["WEB_WORKERS"] = str(workers_wanted)
+    start = time.perf_counter()
+    import app
+    from pipeline import shared_models
+    shared_models.preload(app.generator)
+    logger.info(f"Parent ready in {time.perf_counter() - start:.1f} s; "
+                f"{shared_models.process_memory()['rss_mb']} MB resident before fork")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # {pid: worker index}; a replacement reuses the index (and core slice) of the worker it replaces
+    workers = {spawn_worker(sock, args.log_level, i, workers_wanted): i for i in range(workers_wanted)}
+    logger.info(f"Serving on {args.host}:{args.port} with {len(workers)} forked workers")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # First report once the workers have warmed up and touched their per-worker state
+    next_report = time.monotonic() + 30.0
+    while not stopping:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid and pid in workers:
+            index = workers.pop(pid)
+            logger.warning(f"Worker {pid} exited ({status}); forking a replacement")
+            workers[spawn_worker(sock, args.log_level, index, workers_wanted)] = index
+        if time.monotonic() >= next_report:
+            logger.info("Memory per process (parent first):\n"
+                        + shared_models.memory_report([os.getpid(), *sorted(workers)]))
+            next_report = time.monotonic() + args.report_interval if args.report_interval > 0 else float("inf")
+        time.sleep(0.5)
+
+    logger.info("Stopping workers...")
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Test script for the compact Mesh path (pipeline/mesh.py, mesh_generator,
+glb.write / glb.validate): counts must match the trimesh-based path it
+replaced, and every solid must be watertight and wound outwards.
+"""
+import sys
+import os
+import tempfile
+import numpy as np
+import trimesh
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+from pipeline import mesh_generator, glb
+from pipeline.mesh import Mesh, index_dtype
+
+print("=" * 60)
+print("TESTING COMPACT MESH PATH")
+print("=" * 60)
+
+failures = []
+
+
+def check(label: str, ok: bool, detail: str = "") -> None:
+    print(f"{'✅' if ok else '❌'} {label}{f' ({detail})' if detail else ''}")
+    if not ok:
+        failures.append(label)
+
+
+# Synthetic depth + alpha (512 px): a domed disc, a ring with a hole, an asymmetric pendant
+yy, xx = np.mgrid[:512, :512]
+r = np.hypot(xx - 256, yy - 256)
+CASES = {
+    "disc": ((255 - r).clip(0, 255).astype(np.float32), np.where(r < 200, 255, 0).astype(np.uint8)),
+    "ring": ((255 - np.abs(r - 150) * 2).clip(0, 255).astype(np.float32),
+             np.where((r < 200) & (r > 90), 255, 0).astype(np.uint8)),
+    "pendant": ((xx * 0.3 + yy * 0.2).astype(np.float32),
+                np.where((np.hypot(xx - 200, yy - 300) < 150) | ((abs(xx - 330) < 40) & (yy < 250) & (yy > 60)),
+                         255, 0).astype(np.uint8)),
+}
+
+# (vertices, faces) the trimesh-based surface/solidify path produced for these inputs
+EXPECTED = {
+    ("disc", 128): (15650, 31296), ("disc", 256): (62794, 125584),
+    ("ring", 128): (12456, 24912), ("ring", 256): (50072, 100144),
+    ("pendant", 128): (10452, 20900), ("pendant", 256): (41598, 83192),
+}
+EXPECTED_DECIMATED = {"disc": (4132, 8260), "ring": (4228, 8456), "pendant": (4080, 8156)}
+
+
+def solid_checks(label: str, solid: Mesh) -> trimesh.Trimesh:
+    tm = solid.to_trimesh()
+    check(f"{label}: watertight", bool(tm.is_watertight))
+    check(f"{label}: winding consistent", bool(tm.is_winding_consistent))
+    check(f"{label}: volume positive and matches trimesh", solid.volume() > 0 and np.isclose(solid.volume(), tm.volume),
+          f"{solid.volume():.4e}")
+    check(f"{label}: largest extent 0.15 m", np.isclose(solid.extents().max(), 0.15, atol=1e-6))
+    return tm
+
+
+# Test 1: counts and watertightness against the previous path
+print("\n--- Surface + solidify ---")
+for (name, resolution), (vertices, faces) in EXPECTED.items():
+    depth, alpha = CASES[name]
+    surface, _ = mesh_generator.surface_from_grids(depth, alpha, resolution)
+    solid = mesh_generator.solidify(surface)
+    label = f"{name} @ {resolution}"
+    check(f"{label}: counts", (len(solid.vertices), len(solid.faces)) == (vertices, faces),
+          f"{len(solid.vertices)} v / {len(solid.faces)} f")
+    check(f"{label}: float32 / uint32 arrays", solid.vertices.dtype == np.float32 and solid.faces.dtype == np.uint32)
+    solid_checks(label, solid)
+
+# Test 2: decimation goes through trimesh; float32 input may move a few collapses
+print("\n--- Decimated surface ---")
+for name, (vertices, faces) in EXPECTED_DECIMATED.items():
+    depth, alpha = CASES[name]
+    surface, _ = mesh_generator.surface_from_grids(depth, alpha, 128, decimate_faces=4000)
+    solid = mesh_generator.solidify(surface)
+    check(f"{name} decimated: counts within 1%", abs(len(solid.faces) - faces) <= 0.01 * faces,
+          f"{len(solid.faces)} f, previously {faces}")
+    solid_checks(f"{name} decimated", solid)
+
+# Test 3: mirrored half (symmetry) is closed and matches the full build
+print("\n--- Mirror symmetry ---")
+depth, alpha = CASES["disc"]
+full, _ = mesh_generator.surface_from_grids(depth, alpha, 128)
+full = mesh_generator.solidify(full)
+half, info = mesh_generator.surface_from_grids(depth, alpha, 128, symmetry=True)
+check("disc: detected as symmetric", info["symmetric"], str({k: v for k, v in info.items() if k != "mirror_x"}))
+if info["symmetric"]:
+    mirrored = mesh_generator.solidify(half, mirror_x=info["mirror_x"])
+    check("disc mirrored: same counts as full build",
+          (len(mirrored.vertices), len(mirrored.faces)) == (len(full.vertices), len(full.faces)),
+          f"{len(mirrored.vertices)} v / {len(mirrored.faces)} f")
+    solid_checks("disc mirrored", mirrored)
+    check("disc mirrored: bounds match full build", np.allclose(mirrored.bounds(), full.bounds(), atol=1e-5))
+depth, alpha = CASES["pendant"]
+_, info = mesh_generator.surface_from_grids(depth, alpha, 128, symmetry=True)
+check("pendant: not mirrored", not info["symmetric"])
+# A 20 px clasp on one side of an otherwise symmetric ring must survive
+depth, alpha = CASES["ring"]
+alpha = alpha.copy()
+alpha[(abs(yy - 256) < 10) & (xx > 446) & (xx < 476)] = 255
+depth = np.where(alpha > 0, np.maximum(depth, 100), depth).astype(np.float32)
+for resolution in (128, 256):
+    _, info = mesh_generator.surface_from_grids(depth, alpha, resolution, symmetry=True)
+    check(f"ring with clasp @ {resolution}: not mirrored", not info["symmetric"],
+          f"mask_residual={info.get('mask_residual')}")
+
+# Test 4: GLB round trip (glb.write + glb.validate + trimesh loader)
+print("\n--- GLB export ---")
+with tempfile.TemporaryDirectory() as tmp:
+    for resolution in (128, 256):
+        depth, alpha = CASES["ring"]
+        surface, _ = mesh_generator.surface_from_grids(depth, alpha, resolution)
+        solid = mesh_generator.solidify(surface)
+        path = os.path.join(tmp, f"ring_{resolution}.glb")
+        mesh_generator.export_mesh(solid, path)
+        info = glb.validate(path)
+        check(f"ring @ {resolution}: validator counts",
+              (info["vertices"], info["triangles"]) == (len(solid.vertices), len(solid.faces)))
+        gltf, _ = glb.read_json(path)
+        index_type = gltf["accessors"][gltf["meshes"][0]["primitives"][0]["indices"]]["componentType"]
+        check(f"ring @ {resolution}: index type", index_type == (5123 if index_dtype(len(solid.vertices)) == np.uint16 else 5125))
+        loaded = trimesh.load(path, force="mesh", process=False)
+        check(f"ring @ {resolution}: trimesh round trip",
+              np.array_equal(np.asarray(loaded.faces), solid.faces) and np.allclose(loaded.vertices, solid.vertices))
+
+    # The validator rejects a truncated file
+    with open(path, "rb") as f:
+        data = f.read()
+    broken = os.path.join(tmp, "broken.glb")
+    with open(broken, "wb") as f:
+        f.write(data[:-1024])
+    try:
+        glb.validate(broken)
+        check("truncated GLB rejected", False)
+    except glb.InvalidGLB as e:
+        check("truncated GLB rejected", True, str(e))
+
+print("\n" + "=" * 60)
+if failures:
+    print(f"❌ {len(failures)} check(s) failed")
+    sys.exit(1)
+print("✅ All mesh checks passed")